@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+"""
+Benchmarks for the toolaudit pipeline
+
+Generates synthetic kitlists backed by stub executables and input files,
+times each stage of an audit and saves the results as JSON.  Two result
+files can be compared to find regressions::
+
+    python benchmarks/run_benchmarks.py run -o before.json
+    python benchmarks/run_benchmarks.py run -o after.json
+    python benchmarks/run_benchmarks.py compare before.json after.json
+"""
+
+from __future__ import print_function
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import os.path
+import platform
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import toolaudit  # noqa: E402
+from toolaudit import readers  # noqa: E402
+from toolaudit.application import ToolauditApp  # noqa: E402
+from toolaudit.kitlist import KitList  # noqa: E402
+from toolaudit.session import AuditSession  # noqa: E402
+
+
+STUB = """#!/bin/sh
+if [ "$1" = "--version" ]; then
+    echo "stub{index} version 1.{index}"
+else
+    cat "$@"
+fi
+"""
+
+
+def main():
+    """The main function"""
+    parser = create_parser()
+    args = parser.parse_args()
+    if args.command == 'run':
+        results = run(args)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print_results(results)
+    else:
+        with open(args.before) as f:
+            before = json.load(f)
+        with open(args.after) as f:
+            after = json.load(f)
+        regressions = compare(before, after, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+def create_parser():
+    """
+    Create a configured instance of :class:`argparse.ArgumentParser`
+    """
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('-o', '--output', default='benchmarks.json',
+                            help='file to write results to')
+    run_parser.add_argument('--sizes', default='10,1000,50000',
+                            help='comma separated numbers of tools')
+    run_parser.add_argument('--max-check-tools', type=int, default=1000,
+                            help='only run ToolauditApp.check for kitlists '
+                                 'with at most this many tools')
+    run_parser.add_argument('--input-size', type=int, default=4096,
+                            help='size in bytes of each test input file')
+    run_parser.add_argument('--hash-size', type=int, default=256,
+                            help='size in MiB of the file used to measure '
+                                 'hashing throughput')
+    run_parser.add_argument('--repeat', type=int, default=3,
+                            help='number of times each benchmark is run')
+    run_parser.add_argument('-j', '--jobs', type=int, default=1,
+                            help='jobs used by ToolauditApp.check')
+    compare_parser = commands.add_parser(
+        'compare', help='compare two result files'
+    )
+    compare_parser.add_argument('before')
+    compare_parser.add_argument('after')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='fractional slowdown reported as a '
+                                     'regression (default: %(default)s)')
+    return parser
+
+
+def run(args):
+    """
+    Run every benchmark and return the results
+    """
+
+    results = {
+        'meta': {
+            'toolaudit': toolaudit.__version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'date': datetime.datetime.now().isoformat(),
+            'repeat': args.repeat,
+            'jobs': args.jobs,
+            'input_size': args.input_size,
+        },
+        'benchmarks': {}
+    }
+    benchmarks = results['benchmarks']
+    work_dir = tempfile.mkdtemp(prefix='toolaudit-bench-')
+    orig_dir = os.getcwd()
+    try:
+        os.chdir(work_dir)
+        for size in [int(s) for s in args.sizes.split(',')]:
+            kitlist_path = make_kitlist(work_dir, size, args.input_size)
+            bench_kitlist(benchmarks, kitlist_path, size, args)
+        benchmarks['sha1_file'] = bench_hashing(work_dir, args)
+    finally:
+        os.chdir(orig_dir)
+        shutil.rmtree(work_dir)
+    return results
+
+
+def make_kitlist(work_dir, size, input_size):
+    """
+    Write a kitlist of *size* stub tools, each with its own executable and
+    test input, and return its path
+    """
+
+    kit_dir = os.path.join(work_dir, str(size))
+    os.mkdir(kit_dir)
+    pattern = bytes(bytearray(range(256)))
+    data = (pattern * (input_size // 256 + 1))[:input_size]
+    lines = ['---', 'tools:']
+    for i in range(size):
+        exe = os.path.join(kit_dir, 'stub{0}'.format(i))
+        with open(exe, 'w') as f:
+            f.write(STUB.format(index=i))
+        os.chmod(exe, 0o755)
+        input_path = os.path.join(kit_dir, 'input{0}.dat'.format(i))
+        with open(input_path, 'wb') as f:
+            f.write(data)
+        lines.extend([
+            '  - name: stub{0}'.format(i),
+            '    path: {0}'.format(exe),
+            '    reader:',
+            '      name: command_line',
+            '      option: --version',
+            '      regex: "version\\\\s([0-9\\\\.]*)$"',
+            '    test:',
+            '      name: stdout',
+            '      command: "{exe} {data}"',
+            '      inputs:',
+            '        data: {0}'.format(input_path),
+        ])
+    kitlist_path = os.path.join(kit_dir, 'kitlist.yaml')
+    with open(kitlist_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return kitlist_path
+
+
+def bench_kitlist(benchmarks, kitlist_path, size, args):
+    """
+    Time reading, checking, comparing and saving a kitlist of *size* tools
+    """
+
+    def record(name, func):
+        key = '{0}/{1}'.format(name, size)
+        benchmarks[key] = time_function(func, args.repeat)
+        print('{0:<24} {1:10.4f} s'.format(key, benchmarks[key]['median']),
+              file=sys.__stdout__)
+
+    record('read', lambda: KitList.from_file(kitlist_path))
+    if size <= args.max_check_tools:
+        record('check_skip_tests', lambda: ToolauditApp.check(
+            kitlist_path, True, jobs=args.jobs, session=AuditSession()
+        ))
+        record('check', lambda: ToolauditApp.check(
+            kitlist_path, False, jobs=args.jobs, session=AuditSession()
+        ))
+    checked = fake_results(KitList.from_file(kitlist_path))
+    reference = fake_results(KitList.from_file(kitlist_path))
+    reference.tools.reverse()
+    with redirected('stderr'):
+        record('compare', lambda: ToolauditApp.compare(reference, checked))
+    record('save', lambda: checked.save(kitlist_path + '.out'))
+    with redirected('stdout'):
+        record('to_stdout', checked.to_stdout)
+
+
+def fake_results(kitlist):
+    """
+    Fill in plausible results without running any tools
+    """
+
+    for i, tool in enumerate(kitlist.tools):
+        tool.version = '1.{0}'.format(i)
+        tool.checksum = '{0:040x}'.format(i)
+        tool.output_checksum = '{0:040x}'.format(i * 7)
+        tool.hash_algorithm = 'sha1'
+    return kitlist
+
+
+def bench_hashing(work_dir, args):
+    """
+    Time hashing a large file
+    """
+
+    path = os.path.join(work_dir, 'hash.dat')
+    block = bytes(bytearray(range(256))) * 4096
+    with open(path, 'wb') as f:
+        for _ in range(args.hash_size):
+            f.write(block)
+    result = time_function(lambda: readers.sha1_file(path), args.repeat)
+    result['bytes'] = args.hash_size * len(block)
+    result['throughput_mib_s'] = args.hash_size / result['median']
+    print('{0:<24} {1:10.4f} s ({2:.0f} MiB/s)'.format(
+        'sha1_file', result['median'], result['throughput_mib_s']
+    ))
+    os.remove(path)
+    return result
+
+
+def time_function(func, repeat):
+    """
+    Call *func* *repeat* times and summarise the wall clock times
+    """
+
+    runs = timeit.repeat(func, number=1, repeat=repeat)
+    ordered = sorted(runs)
+    return {
+        'runs': runs,
+        'min': ordered[0],
+        'median': ordered[len(ordered) // 2],
+    }
+
+
+@contextlib.contextmanager
+def redirected(stream):
+    """
+    Discard writes to ``sys.stdout`` or ``sys.stderr`` inside the context
+    """
+
+    saved = getattr(sys, stream)
+    with open(os.devnull, 'w') as devnull:
+        setattr(sys, stream, devnull)
+        try:
+            yield
+        finally:
+            setattr(sys, stream, saved)
+
+
+def print_results(results):
+    """
+    Print a summary of a results file
+    """
+
+    print('\ntoolaudit {toolaudit}, Python {python}, {platform}'.format(
+        **results['meta']
+    ))
+
+
+def compare(before, after, threshold):
+    """
+    Print the change in median time of each benchmark in both result sets
+    and return the names of those that slowed down by more than *threshold*
+    """
+
+    regressions = []
+    names = sorted(set(before['benchmarks']) & set(after['benchmarks']))
+    print('{0:<24} {1:>10} {2:>10} {3:>8}'.format(
+        'benchmark', 'before', 'after', 'change'
+    ))
+    for name in names:
+        old = before['benchmarks'][name]['median']
+        new = after['benchmarks'][name]['median']
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{0:<24} {1:10.4f} {2:10.4f} {3:+7.1%}{4}'.format(
+            name, old, new, change, flag
+        ))
+    missing = sorted(set(before['benchmarks']) ^ set(after['benchmarks']))
+    for name in missing:
+        print('{0:<24} only in one result file'.format(name))
+    return regressions
+
+
+if __name__ == '__main__':
+    main()
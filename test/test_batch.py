@@ -0,0 +1,142 @@
+"""
+Tests for auditing several kitlists together
+"""
+
+import os.path
+import pytest
+import toolaudit
+import yaml
+
+
+KITLIST = """---
+tools:
+  - name: {name}
+    path: {path}
+    reader:
+      name: command_line
+      option: --version
+      regex: "^version\\\\s(.*)$"
+    test:
+      name: stdout
+      command: "{{exe}} {{data}}"
+      inputs:
+        data: ../shared.dat
+"""
+
+
+@pytest.fixture()
+def kitlists(tmpdir):
+    log = tmpdir.join('calls.log')
+    exe = tmpdir.join('stub')
+    exe.write('#!/bin/sh\necho "$1" >> {0}\n[ "$1" = --version ] && '
+              'echo "version 1" || cat "$1"\n'.format(log))
+    exe.chmod(0o755)
+    tmpdir.join('shared.dat').write('data')
+    paths = []
+    for name in ('first', 'second'):
+        d = tmpdir.mkdir(name)
+        k = d.join(name + '.yaml')
+        k.write(KITLIST.format(name=name, path=str(exe)))
+        paths.append(str(k))
+    return paths, log
+
+
+def test_shared_work_runs_once(kitlists, tmpdir, monkeypatch):
+    """
+    Tools in different kitlists share their reader, checksums and test
+    """
+    paths, log = kitlists
+    monkeypatch.chdir(str(tmpdir))
+    session = toolaudit.session.AuditSession()
+    checked = toolaudit.application.ToolauditApp.check_batch(
+        paths, False, jobs=4, session=session
+    )
+    assert len(log.readlines()) == 2
+    assert session.probe_cache.reused == 1
+    assert session.shared_tests.reused == 1
+    first, second = [k.tools[0] for k in checked]
+    assert first.version == second.version == '1'
+    assert first.output_checksum == second.output_checksum is not None
+    assert first.tester.args['inputs']['data'] == '../shared.dat'
+    assert '../shared.dat' in first.file_stats
+
+
+def test_batch_outputs(kitlists, tmpdir, monkeypatch):
+    """
+    Each kitlist is written to its own output
+    """
+    paths, log = kitlists
+    monkeypatch.chdir(str(tmpdir))
+    out_dir = tmpdir.mkdir('out')
+    app = toolaudit.application.ToolauditApp()
+    pytest.raises(SystemExit, app.batch, paths, str(out_dir))
+    for name in ('first', 'second'):
+        with open(str(out_dir.join(name + '.yaml'))) as f:
+            tools = yaml.safe_load(f)['tools']
+        assert [t['name'] for t in tools] == [name]
+    assert sorted(os.listdir(str(out_dir))) == ['first.yaml', 'second.yaml']
+
+
+def test_batch_needs_distinct_names(kitlists, tmpdir):
+    paths, log = kitlists
+    app = toolaudit.application.ToolauditApp()
+    pytest.raises(ValueError, app.batch, [paths[0], paths[0]], str(tmpdir))
+
+
+def test_batch_command_line():
+    args = toolaudit.create_batch_parser().parse_args(
+        ['-d', 'out', 'a.yaml', 'b.yaml']
+    )
+    assert args.kitlist_files == ['a.yaml', 'b.yaml']
+    pytest.raises(SystemExit, toolaudit.main, ['batch', 'a.yaml'])
+
+
+def test_batch_matches_single_run(tmpdir, monkeypatch):
+    """
+    A batch audits a kitlist exactly as a run from its own directory does,
+    with the staged copies of relative inputs, so results are comparable and
+    cached results are reused
+    """
+    exe = tmpdir.join('show')
+    exe.write('#!/bin/sh\necho "$1"\ncat "$1"\n')
+    exe.chmod(0o755)
+    d = tmpdir.mkdir('kit')
+    d.join('data.txt').write('data')
+    k = d.join('kit.yaml')
+    k.write("""---
+tools:
+  - name: show
+    path: {0}
+    reader:
+      name: manual
+      value: "1"
+    test:
+      name: stdout
+      command: "{{exe}} {{data}}"
+      inputs:
+        data: data.txt
+""".format(exe))
+    cache = toolaudit.resultcache.ResultCache(str(tmpdir.join('r.json')))
+    app = toolaudit.application.ToolauditApp
+    monkeypatch.chdir(str(d))
+    single = app.check(
+        str(k), False,
+        session=toolaudit.session.AuditSession(result_cache=cache)
+    ).tools[0]
+    monkeypatch.chdir(str(tmpdir))
+    batched = app.check_batch([str(k)], False)[0].tools[0]
+    assert batched.output_checksum == single.output_checksum == \
+        toolaudit.testers.sha1_string(b'data.txt\ndata')
+    assert batched.file_stats == single.file_stats
+    session = toolaudit.session.AuditSession(result_cache=cache)
+    app.check_batch([str(k)], False, session=session)
+    assert (session.tests_run, session.tests_cached) == (0, 1)
+
+
+def test_batch_makes_output_dir(kitlists, tmpdir, monkeypatch):
+    paths, log = kitlists
+    monkeypatch.chdir(str(tmpdir))
+    out_dir = tmpdir.join('new', 'out')
+    app = toolaudit.application.ToolauditApp()
+    pytest.raises(SystemExit, app.batch, paths, str(out_dir))
+    assert sorted(os.listdir(str(out_dir))) == ['first.yaml', 'second.yaml']
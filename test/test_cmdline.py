@@ -2,6 +2,9 @@
 Tests of command line argument handling
 """
 
+import os.path
+import subprocess
+import sys
 import pytest
 import toolaudit
 
@@ -39,3 +42,74 @@ def test_no_args_exits():
     Supplying no arguments should exit
     """
     pytest.raises(SystemExit, toolaudit.main)
+
+
+@pytest.mark.parametrize('value', ['0', '-2', 'many'])
+def test_jobs_must_be_positive(value):
+    """
+    -j only accepts positive integers
+    """
+    parser = toolaudit.create_parser()
+    pytest.raises(SystemExit, parser.parse_args, ['-j', value, 'k.yaml'])
+
+
+def test_jobs_default():
+    """
+    Tools are audited one at a time unless -j is given
+    """
+    parser = toolaudit.create_parser()
+    assert parser.parse_args(['k.yaml']).jobs == 1
+    assert parser.parse_args(['-j', '8', 'k.yaml']).jobs == 8
+
+
+@pytest.mark.parametrize('argv', [
+    ['k.yaml'],
+    ['watch', '-o', 'o.yaml', 'k.yaml'],
+    ['batch', '-d', 'out', 'k.yaml'],
+])
+def test_result_cache_is_opt_in(monkeypatch, argv):
+    """
+    Test results are only cached with --result-cache
+    """
+    from toolaudit import application
+    calls = []
+    for method in ('run', 'watch', 'batch'):
+        monkeypatch.setattr(
+            application.ToolauditApp, method,
+            lambda self, *args, **kwargs: calls.append(kwargs)
+        )
+    toolaudit.main(argv)
+    toolaudit.main(argv + ['--result-cache'])
+    assert calls[0]['result_cache_file'] is None
+    assert calls[1]['result_cache_file'].endswith('results.db')
+
+
+def test_import_is_lazy():
+    """
+    Importing toolaudit and making the parser doesn't import any submodules
+    or multiprocessing, the submodules are imported when first used
+    """
+    # Python 2 leaves None in sys.modules for the implicit relative imports
+    # it tried, such as toolaudit.sys, these aren't modules.
+    code = ("import sys, toolaudit; toolaudit.create_parser(); "
+            "loaded = [m for m, module in sys.modules.items() "
+            "if module is not None and (m.startswith('toolaudit.') "
+            "or m == 'multiprocessing')]; "
+            "toolaudit.application.ToolauditApp; "
+            "sys.exit(loaded or 'toolaudit.application' not in sys.modules)")
+    package_root = os.path.dirname(os.path.dirname(toolaudit.__file__))
+    assert subprocess.call([sys.executable, '-c', code],
+                           cwd=package_root) == 0
+
+
+def test_choices_match_modules():
+    """
+    The choices of options are the same as the modules they are used by
+    """
+    assert toolaudit._DIFF_FORMATS == toolaudit.compare.DIFF_FORMATS
+    assert toolaudit._OUTPUT_FORMATS == toolaudit.ndjson.FORMATS
+    assert toolaudit._HASH_ALGORITHMS == \
+        toolaudit.hashing.SUPPORTED_ALGORITHMS
+    assert toolaudit._hash_algorithms() == toolaudit.hashing.ALGORITHMS
+    args = toolaudit.create_parser().parse_args(['k.yaml'])
+    assert args.hash_algorithm == toolaudit.hashing.DEFAULT_ALGORITHM
@@ -0,0 +1,138 @@
+"""
+Tests for comparing KitLists
+"""
+
+import json
+from six import StringIO
+from toolaudit import kitlist, testers
+from toolaudit.compare import KitListDiff
+
+
+def make_kitlist(*tools):
+    kl = kitlist.KitList()
+    reader = kitlist.Reader('manual', None, {'value': 'x'})
+    for name, version in tools:
+        kl.tools.append(kitlist.AuditJob(name, '/bin/' + name, reader,
+                                         version=version))
+    return kl
+
+
+def test_diff():
+    """
+    Added, removed and changed tools are all reported
+    """
+    reference = make_kitlist(('a', '1'), ('b', '1'), ('c', '1'))
+    comparison = make_kitlist(('d', '1'), ('c', '2'), ('a', '1'))
+    diff = KitListDiff.between(reference, comparison)
+    assert diff
+    assert diff.added == ['d']
+    assert diff.removed == ['b']
+    assert diff.changed == [('c', 'version', '1', '2')]
+
+
+def test_added_tools_are_not_mismatches():
+    """
+    Tools only in the comparison are reported without being a mismatch
+    """
+    diff = KitListDiff.between(make_kitlist(('a', '1')),
+                               make_kitlist(('a', '1'), ('b', '1')))
+    assert diff.added == ['b']
+    assert not diff
+    f = StringIO()
+    diff.print_report(f)
+    assert f.getvalue() == "b\n\tnot in reference\nNo mismatches found\n"
+
+
+def test_no_differences():
+    """
+    Identical KitLists have no differences
+    """
+    diff = KitListDiff.between(make_kitlist(('a', '1')),
+                               make_kitlist(('a', '1')))
+    assert not diff
+
+
+def test_save_json(tmpdir):
+    """
+    The diff can be saved as JSON
+    """
+    diff = KitListDiff.between(make_kitlist(('a', '1')),
+                               make_kitlist(('a', '2')))
+    path = str(tmpdir.join("diff.json"))
+    diff.save(path, 'json')
+    with open(path) as f:
+        assert json.load(f) == {
+            'added': [],
+            'removed': [],
+            'changed': [{'name': 'a', 'field': 'version',
+                         'reference': '1', 'comparison': '2'}]
+        }
+
+
+def test_index_follows_tools():
+    """
+    get_tool finds tools added after the index was built
+    """
+    kl = make_kitlist(('a', '1'))
+    assert kl.get_tool('b') is None
+    kl.tools.append(make_kitlist(('b', '1')).tools[0])
+    assert kl.get_tool('b').name == 'b'
+
+
+def test_changed_tree_files():
+    """
+    The files that differ are listed when tree outputs don't match
+    """
+    ref = make_kitlist(('a', '1'))
+    comp = make_kitlist(('a', '1'))
+    ref.tools[0].output_checksum = '1'
+    ref.tools[0].test_report = {'files': {'x': 'file 1', 'y': 'file 2'}}
+    comp.tools[0].output_checksum = '2'
+    comp.tools[0].test_report = {'files': {'x': 'file 1', 'y': 'exec 2',
+                                           'z': 'file 3'}}
+    diff = KitListDiff.between(ref, comp)
+    assert diff.changed == [
+        ('a', 'output_checksum', '1', '2'),
+        ('a', 'output_file:y', 'file 2', 'exec 2'),
+        ('a', 'output_file:z', None, 'file 3'),
+    ]
+
+
+def test_resource_regressions():
+    """
+    Resource use is only compared when a threshold is given, and small or
+    proportionally small increases are ignored
+    """
+    ref = make_kitlist(('a', '1'), ('b', '1'))
+    comp = make_kitlist(('a', '1'), ('b', '1'))
+    ref.tools[0].resources = {'user': 2.0, 'system': 0.01, 'wall': 3.0,
+                              'max_rss': 100000}
+    comp.tools[0].resources = {'user': 2.5, 'system': 0.03, 'wall': 6.5,
+                               'max_rss': 250000}
+    comp.tools[1].resources = {'user': 10.0, 'wall': 10.0}
+    assert not KitListDiff.between(ref, comp)
+    diff = KitListDiff.between(ref, comp, resource_threshold=0.5)
+    assert diff.changed == [
+        ('a', 'resources:wall', 3.0, 6.5),
+        ('a', 'resources:max_rss', 100000, 250000),
+    ]
+    assert KitListDiff.between(ref, comp, resource_threshold=0.2).changed[0] \
+        == ('a', 'resources:user', 2.0, 2.5)
+
+
+def test_benchmark_slowdown():
+    """
+    A benchmark is only a mismatch when it is significantly slower
+    """
+    def kit(times):
+        k = make_kitlist(('a', '1'))
+        k.tools[0].test_report = {
+            'benchmark': testers.summarise_times(times)
+        }
+        return k
+    ref = kit([1.0, 1.1, 0.9, 1.0, 1.05])
+    assert not KitListDiff.between(ref, kit([1.02, 1.08, 0.95, 1.0, 1.1]))
+    assert not KitListDiff.between(ref, kit([0.6, 0.7, 0.6, 0.65, 0.7]))
+    assert not KitListDiff.between(ref, kit([0.5, 2.5, 0.9, 3.0, 1.0]))
+    diff = KitListDiff.between(ref, kit([1.3, 1.35, 1.3, 1.4, 1.3]))
+    assert diff.changed == [('a', 'benchmark:median', 1.0, 1.3)]
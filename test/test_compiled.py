@@ -0,0 +1,58 @@
+"""
+Tests for the compiled KitList cache
+"""
+
+import os.path
+import shutil
+from toolaudit import kitlist
+from toolaudit.compiled import CompiledKitListCache
+
+
+EXAMPLE_KITLIST = os.path.join(os.path.dirname(__file__), 'example.yaml')
+
+
+def test_cached_kitlist_matches_parsed(tmpdir, monkeypatch):
+    """
+    A KitList loaded from the cache is the same as a parsed one
+    """
+    cache = CompiledKitListCache(str(tmpdir.join("kitlists")))
+    parsed = kitlist.KitList.from_file(EXAMPLE_KITLIST)
+    assert [t.as_dict() for t in cache.load(EXAMPLE_KITLIST).tools] == \
+        [t.as_dict() for t in parsed.tools]
+
+    def fail(*args):
+        raise AssertionError("kitlist was parsed again")
+    monkeypatch.setattr(kitlist.KitList, 'read_stream', fail)
+    cached = cache.load(EXAMPLE_KITLIST)
+    assert [t.as_dict() for t in cached.tools] == \
+        [t.as_dict() for t in parsed.tools]
+    assert cached.tools[0].tester.func is parsed.tools[0].tester.func
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_edited_kitlist_is_parsed(tmpdir):
+    """
+    Changing the KitList source means it is parsed again
+    """
+    source = str(tmpdir.join("kitlist.yaml"))
+    shutil.copy(EXAMPLE_KITLIST, source)
+    cache = CompiledKitListCache(str(tmpdir.join("kitlists")))
+    cache.load(source)
+    with open(source, 'a') as f:
+        f.write("      option: --help\n")
+    assert cache.load(source).tools[1].reader.args['option'] == '--help'
+    assert cache.misses == 2
+
+
+def test_changed_code_is_parsed(tmpdir, monkeypatch):
+    """
+    A pickle made by different KitList code isn't loaded, even if the
+    toolaudit version is the same
+    """
+    cache = CompiledKitListCache(str(tmpdir.join("kitlists")))
+    cache.load(EXAMPLE_KITLIST)
+    monkeypatch.setattr(CompiledKitListCache, '_code_digest', None)
+    monkeypatch.setattr(kitlist.AuditJob, '__slots__',
+                        kitlist.AuditJob.__slots__ + ('notes',))
+    cache.load(EXAMPLE_KITLIST)
+    assert (cache.hits, cache.misses) == (0, 2)
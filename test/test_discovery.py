@@ -0,0 +1,100 @@
+"""
+Tests for finding tools by searching directories
+"""
+
+import pytest
+import toolaudit
+from toolaudit import discovery
+from toolaudit.kitlist import KitList
+
+
+@pytest.fixture()
+def install(tmpdir):
+    bin_dir = tmpdir.mkdir('bin')
+    for name in ('bet', 'flirt', 'fsl_sub', 'notes.txt'):
+        p = bin_dir.join(name)
+        p.write('#!/bin/sh\necho "{0} v1.0"\n'.format(name))
+        if name != 'notes.txt':
+            p.chmod(0o755)
+    bin_dir.mkdir('sub').join('fast').write('#!/bin/sh\n')
+    bin_dir.join('sub', 'fast').chmod(0o755)
+    return tmpdir
+
+
+def test_expand_directory(install):
+    """
+    Executables in a directory are found, filtered by name
+    """
+    found = discovery.expand(
+        {'path': 'bin', 'exclude': ['fsl_*']}, str(install)
+    )
+    assert found == [('bet', 'bin/bet'), ('flirt', 'bin/flirt')]
+
+
+def test_expand_recursive_glob(install):
+    """
+    Globs and subdirectories can be searched and tools named by template
+    """
+    found = discovery.expand(
+        {'path': 'b*', 'recursive': True, 'include': ['f*'],
+         'name': 'fsl/{relpath}'},
+        str(install)
+    )
+    assert found == [('fsl/flirt', 'bin/flirt'),
+                     ('fsl/fsl_sub', 'bin/fsl_sub'),
+                     ('fsl/sub/fast', 'bin/sub/fast')]
+
+
+def test_expand_absolute(install):
+    found = discovery.expand({'path': str(install.join('bin', 'b*'))})
+    assert found == [('bet', str(install.join('bin', 'bet')))]
+
+
+def test_expand_needs_path():
+    pytest.raises(KeyError, discovery.expand, {'include': '*'})
+
+
+def test_discover_element(install, monkeypatch):
+    """
+    A discover element becomes one tool per file sharing the reader
+    """
+    kitlist_path = install.join('kitlist.yaml')
+    kitlist_path.write("""---
+tools:
+  - discover:
+      path: bin
+      exclude: fsl_*
+    reader:
+      name: command_line
+      regex: "v([0-9\\\\.]*)$"
+    hash_algorithm: sha256
+""")
+    kitlist = KitList.from_file(str(kitlist_path))
+    assert kitlist.discovered
+    assert [t.name for t in kitlist.tools] == ['bet', 'flirt']
+    assert kitlist.tools[0].reader is kitlist.tools[1].reader
+    monkeypatch.chdir(str(install))
+    session = toolaudit.session.AuditSession()
+    checked = toolaudit.application.ToolauditApp.check(
+        str(kitlist_path), True, session=session, hash_jobs=4
+    )
+    assert [t.version for t in checked.tools] == ['1.0', '1.0']
+    assert all(len(t.checksum) == 64 for t in checked.tools)
+    assert session.shared_checksums.run == 2
+    assert session.shared_checksums.reused == 2
+
+
+def test_discovered_kitlists_not_compiled(install, tmpdir):
+    """
+    The compiled kitlist cache doesn't store kitlists whose tools depend on
+    the files present
+    """
+    kitlist_path = install.join('kitlist.yaml')
+    kitlist_path.write("---\ntools:\n  - discover: {path: bin}\n"
+                       "    reader: {name: manual, value: '1'}\n")
+    cache = toolaudit.compiled.CompiledKitListCache(str(tmpdir.join('c')))
+    assert len(cache.load(str(kitlist_path)).tools) == 3
+    install.join('bin', 'new').write('')
+    install.join('bin', 'new').chmod(0o755)
+    assert len(cache.load(str(kitlist_path)).tools) == 4
+    assert cache.hits == 0
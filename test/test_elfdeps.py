@@ -0,0 +1,104 @@
+"""
+Tests for finding and hashing the shared libraries of tools
+"""
+
+import os.path
+import subprocess
+import pytest
+from toolaudit import elfdeps, kitlist
+from toolaudit.compare import KitListDiff
+from toolaudit.session import AuditSession
+
+
+def _compile(args):
+    try:
+        subprocess.check_call(['cc'] + args)
+    except (OSError, subprocess.CalledProcessError):
+        pytest.skip("can't compile test binaries")
+
+
+@pytest.fixture()
+def linked(tmpdir):
+    """
+    An executable which loads lib/libfoo.so through an $ORIGIN run path
+    """
+    lib_dir = tmpdir.mkdir('lib')
+    src = tmpdir.join('foo.c')
+    src.write('int foo(void) { return 1; }\n')
+    _compile(['-shared', '-fPIC', '-o', str(lib_dir.join('libfoo.so')),
+              str(src)])
+    main = tmpdir.join('main.c')
+    main.write('int foo(void);\nint main(void) { return foo(); }\n')
+    exe = str(tmpdir.join('main'))
+    _compile(['-o', exe, str(main), '-L' + str(lib_dir), '-lfoo',
+              "-Wl,-rpath,$ORIGIN/lib"])
+    return exe, str(lib_dir.join('libfoo.so'))
+
+
+def test_read_elf(linked):
+    exe, lib = linked
+    info = elfdeps.read_elf(exe)
+    assert 'libfoo.so' in info.needed
+    assert (info.rpath or info.runpath) == ('$ORIGIN/lib',)
+    assert info.interpreter
+    assert elfdeps.read_elf(__file__) is None
+
+
+def test_closure_follows_origin(linked):
+    """
+    Libraries are found through $ORIGIN and their own dependencies followed
+    """
+    exe, lib = linked
+    resolver = elfdeps.DependencyResolver(library_path='')
+    libraries, missing = resolver.closure(exe)
+    assert lib in libraries
+    assert any(os.path.basename(l).startswith('libc.') for l in libraries)
+    assert missing == []
+    os.remove(lib)
+    assert elfdeps.DependencyResolver().closure(exe)[1] == ['libfoo.so']
+
+
+def test_read_config(tmpdir):
+    conf_d = tmpdir.mkdir('ld.so.conf.d')
+    conf_d.join('a.conf').write('/opt/a/lib\n# comment\n/usr/lib\n')
+    conf = tmpdir.join('ld.so.conf')
+    conf.write('include ld.so.conf.d/*.conf\n/usr/local/lib\n')
+    resolver = elfdeps.DependencyResolver(config=str(conf))
+    assert resolver.system_dirs()[:3] == \
+        ('/opt/a/lib', '/usr/lib', '/usr/local/lib')
+
+
+def test_dependency_checksum(linked, tmpdir):
+    """
+    Changing a library changes the tool's dependency checksum and its
+    recorded file metadata
+    """
+    exe, lib = linked
+    tool = kitlist.AuditJob('main', exe, None, hash_algorithm='sha1')
+    session = AuditSession(hash_dependencies=True)
+    before = session.dependency_checksum(tool)
+    assert lib in session.file_stats(tool)
+    with open(lib, 'ab') as f:
+        f.write(b'\0')
+    after = AuditSession(hash_dependencies=True).dependency_checksum(tool)
+    assert before != after
+    script = tmpdir.join('script.sh')
+    script.write('#!/bin/sh\n')
+    tool.path = str(script)
+    assert session.dependency_checksum(tool) is None
+    assert AuditSession().dependency_checksum(tool) is None
+
+
+def test_compare_optional_dependency_checksum():
+    """
+    Dependency checksums are only compared when both audits recorded one
+    """
+    def kit(value):
+        k = kitlist.KitList()
+        k.tools = [kitlist.AuditJob('a', '/bin/a', None,
+                                    dependency_checksum=value)]
+        return k
+    assert not KitListDiff.between(kit('x'), kit(None))
+    assert not KitListDiff.between(kit(None), kit('x'))
+    assert KitListDiff.between(kit('x'), kit('y')).changed == \
+        [('a', 'dependency_checksum', 'x', 'y')]
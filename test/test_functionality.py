@@ -2,11 +2,23 @@
 Tests of overall functionality
 """
 
+import json
+import os.path
 import pytest
 import toolaudit
 import yaml
 
 
+EXAMPLE_KITLIST = os.path.join(os.path.dirname(__file__), 'example.yaml')
+
+
+def _results(kitlist):
+    """
+    The tools of *kitlist* as dicts
+    """
+    return [t.as_dict() for t in kitlist.tools]
+
+
 def test_simple_audit(capsys, monkeypatch):
     """
     Check simple audit gives the expected output
@@ -20,5 +32,61 @@ def test_simple_audit(capsys, monkeypatch):
     except SystemExit:
         pass
     out, err = capsys.readouterr()
-    returned_yaml = yaml.load(out)
+    returned_yaml = yaml.load(out, Loader=yaml.SafeLoader)
     assert returned_yaml['tools'][0]['checksum'] == '9c3bb3efa8095f36aafd9bf3a698efe439505021'
+
+
+def test_parallel_audit_matches_serial(monkeypatch):
+    """
+    Auditing with several jobs gives the same results in the same order
+    """
+    monkeypatch.chdir(os.path.dirname(EXAMPLE_KITLIST))
+    app = toolaudit.application.ToolauditApp
+    serial = app.check(EXAMPLE_KITLIST, False, jobs=1)
+    parallel = app.check(EXAMPLE_KITLIST, False, jobs=4)
+    assert _results(parallel) == _results(serial)
+
+
+def test_incremental_audit(tmpdir, monkeypatch):
+    """
+    Tools unchanged since the previous audit aren't audited again
+    """
+    monkeypatch.chdir(os.path.dirname(EXAMPLE_KITLIST))
+    app = toolaudit.application.ToolauditApp
+    first = app.check(EXAMPLE_KITLIST, False)
+    output = str(tmpdir.join("previous.yaml"))
+    first.save(output)
+    first.save_file_stats(toolaudit.kitlist.KitList.stats_path(output))
+    with open(output) as f:
+        assert 'file_stats' not in f.read()
+    previous = toolaudit.kitlist.KitList.from_file(output)
+    previous.read_file_stats(toolaudit.kitlist.KitList.stats_path(output))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("tool was audited again")
+    monkeypatch.setattr(toolaudit.readers, 'file_checksum', fail)
+    session = toolaudit.session.AuditSession(previous=previous)
+    second = app.check(EXAMPLE_KITLIST, False, session=session)
+    assert session.tools_unchanged == len(first.tools)
+    for a, b in zip(first.tools, second.tools):
+        assert (a.version, a.checksum, a.output_checksum) == \
+            (b.version, b.checksum, b.output_checksum)
+
+
+def test_ndjson_output(tmpdir, monkeypatch):
+    """
+    NDJSON output can be read back as a KitList
+    """
+    output = str(tmpdir.join("output.ndjson"))
+    app = toolaudit.application.ToolauditApp()
+    monkeypatch.chdir(os.path.dirname(EXAMPLE_KITLIST))
+    pytest.raises(SystemExit, app.run, EXAMPLE_KITLIST, output_file=output,
+                  output_format='ndjson')
+    with open(output) as f:
+        records = [json.loads(line) for line in f]
+    assert [r['record'] for r in records] == \
+        ['kitlist', 'tool', 'tool', 'summary']
+    assert records[-1]['tools'] == 2
+    streamed = toolaudit.kitlist.KitList.from_file(output)
+    expected = app.check(EXAMPLE_KITLIST, False)
+    assert _results(streamed) == _results(expected)
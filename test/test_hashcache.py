@@ -0,0 +1,103 @@
+"""
+Tests for the persistent checksum cache
+"""
+
+import os
+import pytest
+from toolaudit import cache as cache_module
+from toolaudit import readers
+from toolaudit.hashcache import HashCache
+
+
+@pytest.fixture()
+def binary(tmpdir):
+    p = tmpdir.join("tool")
+    p.write("#!/bin/sh\necho 1.0\n")
+    old = 1000000000
+    os.utime(str(p), (old, old))
+    return str(p)
+
+
+def test_unchanged_file_is_not_rehashed(tmpdir, binary, monkeypatch):
+    """
+    A saved checksum is reused while the file's metadata is unchanged
+    """
+    cache_file = str(tmpdir.join("cache", "hashes.db"))
+    cache = HashCache.from_file(cache_file)
+    digest = cache.checksum(binary)
+    assert digest == readers.sha1_file(binary)
+    cache.save()
+
+    def fail(path):
+        raise AssertionError("file was rehashed")
+    monkeypatch.setattr(readers, 'sha1_file', fail)
+    cache = HashCache.from_file(cache_file)
+    assert cache.checksum(binary) == digest
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_changed_file_is_rehashed(tmpdir, binary):
+    """
+    Changing a file invalidates its cached checksum
+    """
+    cache = HashCache(str(tmpdir.join("hashes.db")))
+    first = cache.checksum(binary)
+    with open(binary, 'a') as f:
+        f.write("echo 2.0\n")
+    assert cache.checksum(binary) != first
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_eviction(tmpdir, monkeypatch):
+    """
+    Old and least recently used entries are dropped on save
+    """
+    path = str(tmpdir.join("hashes.db"))
+    cache = HashCache(path, max_entries=1, max_age=100)
+    for key, used in (('/expired', 0), ('/older', 10 ** 10),
+                      ('/newer', 10 ** 10 + 1)):
+        monkeypatch.setattr(cache_module.time, 'time', lambda: used)
+        with cache._lock:
+            cache._put(key, {'stat': [], 'digests': {}})
+    monkeypatch.setattr(cache_module.time, 'time', lambda: 10 ** 10 + 50)
+    cache.save()
+    cache = HashCache.from_file(path)
+    assert [k for k in ('/expired', '/older', '/newer')
+            if cache._get(k) is not None] == ['/newer']
+
+
+def test_unchanged_cache_is_not_written(tmpdir, binary):
+    """
+    Entries are read as they are needed and saving a cache that hasn't
+    changed doesn't write anything
+    """
+    path = str(tmpdir.join("hashes.db"))
+    cache = HashCache.from_file(path)
+    cache.save()
+    assert not os.path.exists(path)
+    cache.checksum(binary)
+    cache.save()
+
+    cache = HashCache.from_file(path)
+    assert cache.entries == {}
+    os.utime(path, (1000000000, 1000000000))
+    cache.checksum(binary)
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert not cache._dirty
+    cache.save()
+    assert os.stat(path).st_mtime == 1000000000
+
+
+def test_unreadable_cache_is_replaced(tmpdir, binary):
+    """
+    A cache file in an old format is treated as empty and replaced
+    """
+    path = tmpdir.join("hashes.db")
+    path.write('{"version": 1, "entries": {}}')
+    cache = HashCache.from_file(str(path))
+    cache.checksum(binary)
+    assert cache.misses == 1
+    cache.save()
+    cache = HashCache.from_file(str(path))
+    cache.checksum(binary)
+    assert cache.hits == 1
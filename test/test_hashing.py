@@ -0,0 +1,50 @@
+"""
+Tests for the hashing module
+"""
+
+import hashlib
+import pytest
+from toolaudit import hashing, readers
+
+
+@pytest.fixture()
+def data_file(tmpdir):
+    p = tmpdir.join("data.bin")
+    p.write_binary(bytes(bytearray(range(256))) * 5000)
+    return str(p)
+
+
+@pytest.mark.parametrize('algorithm', hashing.ALGORITHMS)
+def test_hash_file(data_file, algorithm):
+    """
+    hash_file() agrees with hashlib for each algorithm
+    """
+    with open(data_file, 'rb') as f:
+        expected = hashlib.new(algorithm, f.read()).hexdigest()
+    assert hashing.hash_file(data_file, algorithm) == expected
+
+
+def test_hash_file_mapped(data_file, monkeypatch):
+    """
+    Memory mapped files give the same checksum as read ones
+    """
+    expected = hashing.hash_file(data_file)
+    monkeypatch.setattr(hashing, 'MMAP_THRESHOLD', 4096)
+    assert hashing.hash_file(data_file) == expected
+    assert readers.sha1_file(data_file) == expected
+
+
+def test_unknown_algorithm():
+    """
+    Unsupported algorithms are rejected
+    """
+    pytest.raises(ValueError, hashing.hash_string, b'foo', 'crc32')
+
+
+def test_unavailable_algorithm(monkeypatch):
+    """
+    Supported algorithms that hashlib doesn't provide can't be used
+    """
+    assert set(hashing.ALGORITHMS) <= set(hashing.SUPPORTED_ALGORITHMS)
+    monkeypatch.setattr(hashing, 'ALGORITHMS', ('sha1',))
+    pytest.raises(ValueError, hashing.hash_string, b'foo', 'sha256')
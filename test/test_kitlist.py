@@ -0,0 +1,115 @@
+"""
+Tests for reading and writing KitLists
+"""
+
+import os.path
+import pytest
+from six import StringIO
+import yaml
+from toolaudit import kitlist
+
+
+EXAMPLE_KITLIST = os.path.join(os.path.dirname(__file__), 'example.yaml')
+
+
+def test_tools_share_specs():
+    """
+    Tools with the same reader or tester definition share one instance
+    """
+    text = """---
+tools:
+  - name: a
+    path: /bin/cat
+    reader: &reader
+      name: manual
+      version: "1.0"
+    test: {name: stdout, command: "{exe} --version", inputs: {}}
+  - name: b
+    path: /bin/grep
+    reader: *reader
+    test: {name: stdout, command: "{exe} --version", inputs: {}}
+  - name: c
+    path: /bin/ls
+    reader:
+      name: manual
+      version: "2.0"
+"""
+    kl = kitlist.KitList()
+    kl.read_stream(StringIO(text))
+    a, b, c = kl.tools
+    assert a.reader is b.reader
+    assert a.tester is b.tester
+    assert a.reader is not c.reader
+    assert c.reader.args == {'version': '2.0'}
+    with pytest.raises(AttributeError):
+        a.notes = "tools only have their own fields"
+
+
+def test_read_without_tools():
+    """
+    A document without a tools sequence is rejected
+    """
+    for text in ("", "--- [1, 2]\n", "---\nstaging: []\n"):
+        pytest.raises(
+            KeyError, kitlist.KitList().read_stream, StringIO(text)
+        )
+
+
+def test_dump_matches_whole_document():
+    """
+    dump() writes the same YAML as dumping the KitList in one go
+    """
+    kl = kitlist.KitList.from_file(EXAMPLE_KITLIST)
+    for tool in kl.tools:
+        tool.version = '1.0'
+    expected = yaml.dump(
+        {'tools': [t.as_dict() for t in kl.tools]},
+        Dumper=kitlist.Dumper, explicit_start=True
+    )
+    out = StringIO()
+    kl.dump(out)
+    assert out.getvalue() == expected
+
+    reread = kitlist.KitList()
+    reread.read_stream(StringIO(out.getvalue()))
+    assert [t.as_dict() for t in reread.tools] == \
+        [t.as_dict() for t in kl.tools]
+
+    out = StringIO()
+    kitlist.KitList().dump(out)
+    assert yaml.safe_load(out.getvalue()) == {'tools': []}
+
+
+def test_as_dict_leaves_out_empty_fields():
+    """
+    Fields without a value and file metadata aren't written, so identical
+    audits give identical output
+    """
+    reader = kitlist.Reader('manual', None, {'value': '1.0'})
+    job = kitlist.AuditJob('a', '/bin/a', reader, version='1.0',
+                           output_cached=False, file_stats={'/bin/a': [1]})
+    assert job.as_dict() == {
+        'name': 'a', 'path': '/bin/a', 'version': '1.0',
+        'reader': {'name': 'manual', 'value': '1.0'}
+    }
+
+
+def test_file_stats_sidecar(tmpdir):
+    """
+    File metadata is saved next to the output and read back from there
+    """
+    reader = kitlist.Reader('manual', None, {'value': '1.0'})
+    kl = kitlist.KitList()
+    kl.tools = [
+        kitlist.AuditJob('a', '/bin/a', reader, file_stats={'/bin/a': [1]}),
+        kitlist.AuditJob('b', '/bin/b', reader)
+    ]
+    output = str(tmpdir.join('out.yaml'))
+    kl.save(output)
+    kl.save_file_stats(kitlist.KitList.stats_path(output))
+    reread = kitlist.KitList.from_file(output)
+    assert [t.file_stats for t in reread.tools] == [None, None]
+    reread.read_file_stats(kitlist.KitList.stats_path(output))
+    assert [t.file_stats for t in reread.tools] == [{'/bin/a': [1]}, None]
+    reread.read_file_stats(str(tmpdir.join('missing.json')))
+    assert reread.tools[0].file_stats == {'/bin/a': [1]}
@@ -0,0 +1,45 @@
+"""
+Tests for sharing reader results between tools
+"""
+
+import pytest
+from toolaudit.kitlist import Reader
+from toolaudit.probes import ProbeCache
+
+
+def test_identical_probes_run_once():
+    """
+    Readers with the same name, path and arguments are only called once
+    """
+    calls = []
+
+    def reader_func(path, option=None, inputs=None):
+        calls.append((path, option))
+        return '1.0'
+
+    cache = ProbeCache()
+    first = Reader('command_line', reader_func, {'option': '--version',
+                                                 'inputs': {'a': [1, 2]}})
+    same = Reader('command_line', reader_func, {'option': '--version',
+                                                'inputs': {'a': [1, 2]}})
+    other = Reader('command_line', reader_func, {'option': '-v'})
+    assert cache.read(first, '/bin/tool') == '1.0'
+    assert cache.read(same, '/bin/tool') == '1.0'
+    assert cache.read(other, '/bin/tool') == '1.0'
+    assert cache.read(first, '/bin/other') == '1.0'
+    assert len(calls) == 3
+    assert (cache.run, cache.reused) == (3, 1)
+
+
+def test_errors_are_shared():
+    """
+    A failed probe raises for every tool that uses it
+    """
+    def reader_func(path):
+        raise ValueError(path)
+
+    cache = ProbeCache()
+    reader = Reader('broken', reader_func, {})
+    pytest.raises(ValueError, cache.read, reader, '/bin/tool')
+    pytest.raises(ValueError, cache.read, reader, '/bin/tool')
+    assert cache.run == 1
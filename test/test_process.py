@@ -0,0 +1,120 @@
+"""
+Tests for running programs with a time limit
+"""
+
+import os
+import time
+import pytest
+from toolaudit import kitlist, process, readers, testers
+from toolaudit.session import AuditSession
+
+
+@pytest.fixture()
+def hanging_tool(tmpdir):
+    p = tmpdir.join("hang.sh")
+    pid_file = tmpdir.join("child.pid")
+    p.write("#!/bin/sh\nsleep 60 &\necho $! > {0}\nwait\n".format(pid_file))
+    p.chmod(0o755)
+    return str(p), str(pid_file)
+
+
+def test_command_line_timeout(hanging_tool):
+    """
+    A reader that runs too long is killed along with its children
+    """
+    path, pid_file = hanging_tool
+    start = time.time()
+    with process.time_limit(0.5):
+        pytest.raises(process.ToolTimeout, readers.command_line, path)
+    assert time.time() - start < 10
+    with open(pid_file) as f:
+        child = int(f.read())
+    time.sleep(0.1)
+    assert not _running(child)
+
+
+def _running(pid):
+    """
+    Whether *pid* is a live process, killed but unreaped processes aren't
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    stat_path = '/proc/{0}/stat'.format(pid)
+    if os.path.exists(stat_path):
+        with open(stat_path) as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    return True
+
+
+def test_no_limit():
+    """
+    Without a limit programs run normally
+    """
+    assert readers.command_line('/bin/echo', 'hello') == 'hello'
+
+
+def test_session_records_timeout(hanging_tool):
+    """
+    A timed out tool has its status set instead of stopping the audit
+    """
+    path, _ = hanging_tool
+    reader = kitlist.KitList.reader_functions['command_line']
+    tool = kitlist.AuditJob(
+        'hang', path, kitlist.Reader('command_line', reader, {}),
+        hash_algorithm='sha1', timeout=0.5
+    )
+    session = AuditSession()
+    session.audit(tool, False)
+    assert tool.status == 'timeout'
+    assert tool.version is None
+    assert tool.checksum is not None
+    assert session.tools_timed_out == 1
+
+
+def test_tester_resources_recorded(tmpdir):
+    """
+    The resources used by a tester's programs are stored on the tool when
+    requested and kept with a cached result
+    """
+    if not hasattr(os, 'wait4'):
+        pytest.skip("os.wait4 isn't available")
+    from toolaudit.resultcache import ResultCache
+    tmpdir.chdir()
+    script = tmpdir.join("busy.sh")
+    script.write("#!/bin/sh\ni=0\nwhile [ $i -lt 20000 ]; do i=$((i+1)); "
+                 "done\necho $i\n")
+    script.chmod(0o755)
+    tool = kitlist.AuditJob(
+        'busy', str(script), kitlist.Reader('manual', readers.manual,
+                                            {'value': '1'}),
+        kitlist.Tester('stdout', testers.stdout,
+                       {'command': '{exe}', 'inputs': {}}),
+        hash_algorithm='sha1'
+    )
+    cache = ResultCache(str(tmpdir.join("results.db")))
+    AuditSession(result_cache=cache).audit(tool, False)
+    assert tool.resources is None
+    AuditSession(result_cache=cache, force_tests=True,
+                 record_resources=True).audit(tool, False)
+    measured = tool.resources
+    assert set(measured) == set(['user', 'system', 'wall', 'max_rss',
+                                 'blocks_in', 'blocks_out'])
+    assert measured['user'] + measured['system'] > 0
+    assert measured['max_rss'] > 0
+    AuditSession(result_cache=cache, record_resources=True).audit(tool,
+                                                                  False)
+    assert tool.output_cached is True
+    assert tool.resources == measured
+    AuditSession(record_resources=True).audit(tool, True)
+    assert tool.resources is None
+
+
+def test_wait_without_accounting():
+    """
+    wait() behaves like Popen.wait() when resources aren't being measured
+    """
+    proc = process.spawn(['sh', '-c', 'exit 3'])
+    assert process.wait(proc) == 3
+    assert proc.returncode == 3
@@ -2,6 +2,9 @@
 Tests for the functions in the readers module
 """
 
+import os.path
+import subprocess
+import sys
 import pytest
 from toolaudit import readers
 
@@ -41,3 +44,102 @@ def test_regex_line(example_input_file):
         example_input_file,
         5
     )
+
+
+@pytest.fixture()
+def example_binary(tmpdir):
+    p = tmpdir.join("tool.bin")
+    p.write_binary(b"\0\x01junk version 1.0\0" + b"\xff" * 4096 +
+                   b"\0mytool version 2.3.4 (build 7)\0")
+    return str(p)
+
+
+def test_binary_string(example_binary):
+    """
+    binary_string() finds the first match in the file, returning group 1 if
+    there is one
+    """
+    assert readers.binary_string(
+        example_binary, r"mytool version ([0-9.]+)") == "2.3.4"
+    assert readers.binary_string(
+        example_binary, r"version [0-9.]+") == "version 1.0"
+    pytest.raises(
+        readers.InputError,
+        readers.binary_string,
+        example_binary,
+        r"other version ([0-9.]+)"
+    )
+
+
+def test_binary_string_range(example_binary):
+    """
+    binary_string() only searches from offset for length bytes
+    """
+    assert readers.binary_string(
+        example_binary, r"version ([0-9.]+)", offset=20) == "2.3.4"
+    pytest.raises(
+        readers.InputError,
+        readers.binary_string,
+        example_binary,
+        r"version ([0-9.]+)",
+        offset=20,
+        length=4096
+    )
+    pytest.raises(
+        readers.InputError,
+        readers.binary_string,
+        example_binary,
+        r"version",
+        offset=10**6
+    )
+
+
+def test_binary_string_section(example_binary):
+    """
+    binary_string() can search a single section of an ELF file
+    """
+    path = sys.executable
+    with open(path, 'rb') as f:
+        if f.read(4) != b"\x7fELF":
+            pytest.skip("the Python executable isn't an ELF file")
+    assert readers.binary_string(path, r"\x7fELF") == "\x7fELF"
+    pytest.raises(
+        readers.InputError,
+        readers.binary_string,
+        path,
+        r"\x7fELF",
+        section=".rodata"
+    )
+    pytest.raises(
+        readers.InputError,
+        readers.binary_string,
+        example_binary,
+        r"version",
+        section=".rodata"
+    )
+
+
+def test_binary_string_truncated_elf(tmpdir):
+    """
+    binary_string() reports a truncated ELF file as an InputError
+    """
+    p = tmpdir.join("truncated")
+    p.write_binary(b"\x7fELF\x02\x01\x01" + b"\0" * 9 + b"\x02\0")
+    pytest.raises(
+        readers.InputError,
+        readers.binary_string,
+        str(p),
+        r"version",
+        section=".rodata"
+    )
+
+
+def test_import_is_light():
+    """
+    Importing the readers doesn't import the ELF parser
+    """
+    code = ("import sys, toolaudit.readers; "
+            "sys.exit('toolaudit.elfdeps' in sys.modules)")
+    package_root = os.path.dirname(os.path.dirname(readers.__file__))
+    assert subprocess.call([sys.executable, '-c', code],
+                           cwd=package_root) == 0
@@ -0,0 +1,95 @@
+"""
+Tests for the reader and tester plugin registries
+"""
+
+import pytest
+from toolaudit import readers, registry
+from toolaudit.kitlist import KitList
+
+
+class FakeEntryPoint(object):
+    def __init__(self, name, func):
+        self.name = name
+        self.func = func
+        self.loaded = False
+
+    def load(self):
+        self.loaded = True
+        return self.func
+
+
+def test_builtins():
+    """
+    The built in readers are found by name
+    """
+    assert 'line_in_file' in KitList.reader_functions
+    assert KitList.reader_functions['line_in_file'] is readers.line_in_file
+    assert 'file' in KitList.tester_functions
+
+
+def test_plugins_are_loaded_when_used(monkeypatch):
+    """
+    Entry points are only loaded when their name is looked up
+    """
+    plugin = FakeEntryPoint('custom', lambda path: '1.0')
+    other = FakeEntryPoint('other', lambda path: '2.0')
+    monkeypatch.setattr(registry, '_entry_points',
+                        lambda group: [plugin, other])
+    reg = registry.PluginRegistry('toolaudit.readers', {
+        'manual': 'toolaudit.readers:manual'
+    })
+    assert 'custom' in reg
+    assert reg['custom']('x') == '1.0'
+    assert plugin.loaded and not other.loaded
+    assert reg.names() == ['custom', 'manual', 'other']
+    pytest.raises(KeyError, reg.__getitem__, 'missing')
+
+
+def test_register_function():
+    """
+    Functions can be registered directly
+    """
+    reg = registry.PluginRegistry('toolaudit.testers', {})
+    reg['mine'] = len
+    assert reg['mine'] is len
+
+
+def test_plugin_tester_signatures(tmpdir):
+    """
+    Testers are only passed the optional arguments they declare
+    """
+    from toolaudit import kitlist
+    from toolaudit.session import AuditSession
+    tmpdir.join("tool").write("")
+    calls = []
+
+    def baseline(executable_path, command, inputs):
+        calls.append((command, inputs))
+        return 'abc'
+
+    def everything(executable_path, command, inputs, **kwargs):
+        calls.append(sorted(kwargs))
+        return 'def'
+
+    reader = kitlist.Reader('manual', readers.manual, {'value': '1.0'})
+    for name, func in (('baseline', baseline), ('everything', everything)):
+        tester = kitlist.Tester(name, func, {'command': '{exe}', 'inputs': {}})
+        job = kitlist.AuditJob(name, 'tool', reader, tester,
+                               hash_algorithm='sha1')
+        AuditSession().audit(job, False, staging={'strategy': 'copy'},
+                             base_dir=str(tmpdir))
+    assert calls == [
+        ('{exe}', {}), ['base_dir', 'hash_algorithm', 'report', 'staging']
+    ]
+
+
+def test_supported_kwargs():
+    """
+    Keyword arguments are filtered by the function's signature
+    """
+    optional = {'report': {}, 'hash_algorithm': 'sha1'}
+    assert registry.supported_kwargs(lambda path: None, optional) == {}
+    assert registry.supported_kwargs(
+        lambda path, report=None: None, optional) == {'report': {}}
+    assert registry.supported_kwargs(
+        lambda path, **kwargs: None, optional) == optional
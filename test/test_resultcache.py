@@ -0,0 +1,86 @@
+"""
+Tests for caching tester results between runs
+"""
+
+import pytest
+from toolaudit import kitlist
+from toolaudit.resultcache import ResultCache
+from toolaudit.session import AuditSession
+
+
+@pytest.fixture()
+def tool(tmpdir):
+    tmpdir.chdir()
+    tmpdir.join("tool").write("#!/bin/sh\n")
+    tmpdir.join("input.txt").write("foo")
+    calls = []
+
+    def tester_func(path, command, inputs, hash_algorithm, report):
+        calls.append(path)
+        return 'abc'
+
+    reader = kitlist.Reader('manual', lambda path, value: value, {'value': '1.0'})
+    tester = kitlist.Tester('stdout', tester_func, {
+        'command': '{exe} {data}', 'inputs': {'data': 'input.txt'}
+    })
+    job = kitlist.AuditJob('tool', 'tool', reader, tester, hash_algorithm='sha1')
+    tester_func.calls = calls
+    return job
+
+
+def test_cached_result_is_reused(tmpdir, tool):
+    """
+    A test whose tool and inputs are unchanged isn't run again
+    """
+    cache = ResultCache(str(tmpdir.join("results.json")))
+    AuditSession(result_cache=cache).audit(tool, False)
+    assert tool.output_cached is False
+    session = AuditSession(result_cache=cache)
+    session.audit(tool, False)
+    assert tool.output_checksum == 'abc'
+    assert tool.output_cached is True
+    assert len(tool.tester.func.calls) == 1
+    assert (session.tests_run, session.tests_cached) == (0, 1)
+
+
+def test_force_tests(tmpdir, tool):
+    """
+    force_tests runs the test even if it is cached
+    """
+    cache = ResultCache(str(tmpdir.join("results.json")))
+    AuditSession(result_cache=cache).audit(tool, False)
+    AuditSession(result_cache=cache, force_tests=True).audit(tool, False)
+    assert len(tool.tester.func.calls) == 2
+    assert tool.output_cached is False
+
+
+def test_changed_input_invalidates(tmpdir, tool):
+    """
+    Changing an input file means the test is run again
+    """
+    cache = ResultCache(str(tmpdir.join("results.json")))
+    AuditSession(result_cache=cache).audit(tool, False)
+    tmpdir.join("input.txt").write("bar")
+    AuditSession(result_cache=cache).audit(tool, False)
+    assert len(tool.tester.func.calls) == 2
+
+
+def test_benchmark_is_never_cached(tmpdir, tool):
+    """
+    Benchmarks are run every time, even if the result cache or the previous
+    audit has a result for them
+    """
+    tool.tester = tool.tester._replace(name='benchmark')
+    cache = ResultCache(str(tmpdir.join("results.json")))
+    AuditSession(result_cache=cache).audit(tool, False)
+    AuditSession(result_cache=cache).audit(tool, False)
+    assert len(tool.tester.func.calls) == 2
+    assert tool.output_cached is False
+    previous = kitlist.KitList()
+    previous.tools = [tool]
+    session = AuditSession(previous=previous)
+    session.audit(kitlist.AuditJob(
+        'tool', 'tool', tool.reader, tool.tester, hash_algorithm='sha1'
+    ), False)
+    assert session.tools_unchanged == 0
+    assert len(tool.tester.func.calls) == 3
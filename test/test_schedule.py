@@ -0,0 +1,143 @@
+"""
+Tests for ordering tools by how long they took in earlier runs
+"""
+
+import pytest
+import toolaudit
+from toolaudit import kitlist, readers, schedule, testers, timing
+from toolaudit.resultcache import ResultCache
+from toolaudit.session import AuditSession
+
+
+KITLIST = """---
+tools:
+{0}
+"""
+
+TOOL = """  - name: {0}
+    path: {1}
+    reader:
+      name: command_line
+      option: "{0}"
+"""
+
+
+def _job(name, path='/bin/true'):
+    reader = kitlist.Reader('manual', None, {'value': '1'})
+    tester = kitlist.Tester('stdout', None, {'command': '{exe}'})
+    return kitlist.AuditJob(name, path, reader, tester)
+
+
+def _timings(**wall):
+    timings = timing.Timings()
+    for phase, seconds in wall.items():
+        timings.add(phase, seconds, 0.0)
+    return timings
+
+
+def test_longest_first():
+    """
+    Jobs without history come first in their own order, then the longest
+    """
+    assert schedule.longest_first([1.0, None, 5.0, 3.0, None]) == \
+        [1, 4, 2, 3, 0]
+    assert schedule.longest_first([]) == []
+
+
+def test_makespan():
+    assert schedule.makespan([5.0, 3.0, 3.0, 1.0], 2) == 6.0
+    assert schedule.makespan([1.0, 3.0, 3.0, 5.0], 2) == 8.0
+    assert schedule.makespan([2.0, 2.0], 1) == 4.0
+    assert schedule.makespan([], 4) == 0.0
+
+
+def test_history(tmpdir):
+    """
+    Durations are smoothed, kept for phases that weren't run and saved
+    """
+    path = str(tmpdir.join('durations.db'))
+    history = schedule.DurationHistory(path)
+    job = _job('a')
+    assert history.expected(job, False) is None
+    history.record(job, _timings(reader=1.0, tester=4.0))
+    history.record(job, _timings(reader=3.0))
+    assert history.expected(job, False) == pytest.approx(6.0)
+    assert history.expected(job, True) == pytest.approx(2.0)
+    history.save()
+    loaded = schedule.DurationHistory.from_file(path)
+    assert loaded.expected(job, False) == pytest.approx(6.0)
+    assert loaded.expected(_job('a', '/bin/false'), False) is None
+
+
+def test_check_starts_slowest_first(tmpdir, monkeypatch):
+    """
+    With several jobs tools are audited longest expected first, with one
+    job they are audited in kitlist order, and the makespan is reported
+    """
+    log = tmpdir.join('calls.log')
+    exe = tmpdir.join('stub')
+    exe.write('#!/bin/sh\necho "$1" >> {0}\n'.format(log))
+    exe.chmod(0o755)
+    k = tmpdir.join('kitlist.yaml')
+    k.write(KITLIST.format(''.join(
+        TOOL.format(name, str(exe)) for name in ('a', 'b', 'c', 'd')
+    )))
+    monkeypatch.chdir(str(tmpdir))
+    history = schedule.DurationHistory(str(tmpdir.join('durations.db')))
+    tools = kitlist.KitList.from_file(str(k)).tools
+    for tool, seconds in zip(tools, (1.0, 5.0, 3.0)):
+        history.record(tool, _timings(reader=seconds))
+    session = toolaudit.session.AuditSession(durations=history)
+    assert session.schedule(tools, True, 2) == [3, 1, 2, 0]
+    assert session.predicted_makespan == pytest.approx(5.0)
+    session = toolaudit.session.AuditSession(durations=history)
+    toolaudit.application.ToolauditApp.check(
+        str(k), True, session=session
+    )
+    assert log.read().split() == ['a', 'b', 'c', 'd']
+    assert session.predicted_makespan == pytest.approx(9.0)
+    assert session.tools_with_history == 3
+    assert session.makespan is not None
+    assert any(l.startswith('Makespan:') for l in session.summary())
+    assert history.expected(tools[3], True) is not None
+
+
+def test_reused_tests_keep_history(tmpdir):
+    """
+    The test time isn't recorded when the result comes from the result
+    cache or another tool, and nothing is when it comes from a previous
+    audit
+    """
+    tmpdir.join('input.txt').write('data')
+    reader = kitlist.Reader('manual', readers.manual, {'value': '1'})
+    tester = kitlist.Tester('stdout', testers.stdout, {
+        'command': '{exe} {data}',
+        'inputs': {'data': str(tmpdir.join('input.txt'))}
+    })
+
+    def job(name):
+        return kitlist.AuditJob(name, '/bin/cat', reader, tester,
+                                hash_algorithm='sha1')
+    history = schedule.DurationHistory(str(tmpdir.join('durations.db')))
+    history.record(job('a'), _timings(tester=100.0))
+    cache = ResultCache(str(tmpdir.join('results.json')))
+    session = AuditSession(result_cache=cache, durations=history)
+    session.audit(job('a'), False)
+    expected = history.expected(job('a'), False)
+    assert 50.0 < expected < 60.0
+    session.audit(job('b'), False)
+    assert session.shared_tests.reused == 1
+    assert history.expected(job('a'), False) == pytest.approx(expected, abs=1)
+
+    cached = job('a')
+    AuditSession(result_cache=cache, durations=history).audit(cached, False)
+    assert cached.output_cached is True
+    assert history.expected(job('a'), False) == pytest.approx(expected, abs=1)
+
+    previous = kitlist.KitList()
+    previous.tools = [cached]
+    before = history.expected(job('a'), False)
+    session = AuditSession(previous=previous, durations=history)
+    session.audit(job('a'), False)
+    assert session.tools_unchanged == 1
+    assert history.expected(job('a'), False) == before
@@ -0,0 +1,82 @@
+"""
+Tests for staging test inputs
+"""
+
+import os
+import shutil
+import pytest
+from toolaudit import staging
+
+
+@pytest.fixture()
+def input_file(tmpdir):
+    p = tmpdir.join("input.nii")
+    p.write("volume")
+    return str(p)
+
+
+@pytest.mark.parametrize('strategy', staging.STRATEGIES)
+def test_stage_inputs(input_file, strategy):
+    """
+    Every strategy makes the input readable in the staging directory
+    """
+    temp_dir = staging.stage_inputs([input_file], strategy)
+    try:
+        with open(os.path.join(temp_dir, 'input.nii')) as f:
+            assert f.read() == "volume"
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_hardlink_shares_inode(input_file):
+    """
+    Hard linked inputs aren't copied
+    """
+    temp_dir = staging.stage_inputs([input_file], 'hardlink')
+    try:
+        staged = os.path.join(temp_dir, 'input.nii')
+        assert os.stat(staged).st_ino == os.stat(input_file).st_ino
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_fallback(input_file, monkeypatch):
+    """
+    A strategy that fails falls back to the next one
+    """
+    def fail(source, dest):
+        open(dest, 'w').close()
+        raise OSError("cross-device link")
+    monkeypatch.setitem(staging._STAGERS, 'hardlink', fail)
+    monkeypatch.setitem(staging._STAGERS, 'reflink', fail)
+    temp_dir = staging.stage_inputs([input_file], 'hardlink')
+    try:
+        staged = os.path.join(temp_dir, 'input.nii')
+        assert not os.path.samefile(staged, input_file)
+        with open(staged) as f:
+            assert f.read() == "volume"
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_unusable_root(input_file, tmpdir):
+    """
+    The default temporary directory is used if the root doesn't exist
+    """
+    temp_dir = staging.stage_inputs(
+        [input_file], root=str(tmpdir.join("missing"))
+    )
+    try:
+        assert os.path.exists(os.path.join(temp_dir, 'input.nii'))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def test_parse_staging():
+    """
+    Staging elements may be a strategy name or a dict
+    """
+    assert staging.parse_staging(None) == ('copy', None)
+    assert staging.parse_staging('symlink') == ('symlink', None)
+    assert staging.parse_staging({'root': '/dev/shm'}) == ('copy', '/dev/shm')
+    pytest.raises(KeyError, staging.parse_staging, 'teleport')
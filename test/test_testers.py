@@ -0,0 +1,198 @@
+"""
+Tests for the functions in the testers module
+"""
+
+import hashlib
+import os
+import os.path
+import subprocess
+import sys
+import pytest
+from toolaudit import readers, testers
+
+
+def test_stdout_streams_large_output(tmpdir):
+    """
+    stdout() gives the same hash as hashing the whole output at once
+    """
+    inp = tmpdir.join("input.txt")
+    inp.write("x" * 3000000)
+    with open(str(inp), 'rb') as f:
+        expected = hashlib.sha1(f.read()).hexdigest()
+    report = {}
+    digest = testers.stdout(
+        '/bin/cat', '{exe} {data}', inputs={'data': str(inp)},
+        report_size=True, report=report
+    )
+    assert digest == expected
+    assert report == {'output_bytes': 3000000}
+
+
+def test_stdout_size_not_reported_by_default(tmpdir):
+    """
+    The byte count is only recorded when asked for
+    """
+    inp = tmpdir.join("input.txt")
+    inp.write("foo")
+    report = {}
+    testers.stdout(sys.executable, '{exe} -c "print(1)"',
+                   inputs={'data': str(inp)},
+                   report=report)
+    assert report == {}
+
+
+def _tree_command(tmpdir, script):
+    exe = tmpdir.join('make_tree.sh')
+    exe.write('#!/bin/sh\nset -e\nmkdir out\n' + script)
+    exe.chmod(0o755)
+    return str(exe)
+
+
+def test_treeout_ignores_write_order(tmpdir):
+    """
+    treeout() gives the same hash for the same tree written in a different
+    order, and records each file
+    """
+    first = _tree_command(tmpdir.mkdir('a'), 'echo 1 > out/x\n'
+                          'mkdir out/sub\necho 2 > out/sub/y\n')
+    second = _tree_command(tmpdir.mkdir('b'), 'mkdir out/sub\n'
+                           'echo 2 > out/sub/y\necho 1 > out/x\n')
+    report = {}
+    digest = testers.treeout(first, '{exe}', inputs={}, output_path='out',
+                             report=report)
+    assert testers.treeout(second, '{exe}', inputs={}, output_path='out',
+                           jobs=1) == digest
+    assert sorted(report['files']) == ['sub/y', 'x']
+    umask = os.umask(0)
+    os.umask(umask)
+    assert report['files']['x'] == 'file {0:04o} {1}'.format(
+        0o666 & ~umask, hashlib.sha1(b'1\n').hexdigest()
+    )
+
+
+def test_treeout_modes_and_filters(tmpdir):
+    """
+    File and directory permissions and links change the hash, excluded
+    files don't
+    """
+    plain = _tree_command(tmpdir.mkdir('a'), 'echo 1 > out/x\n')
+    executable = _tree_command(tmpdir.mkdir('b'),
+                               'echo 1 > out/x\nchmod +x out/x\n')
+    private = _tree_command(tmpdir.mkdir('p'),
+                            'echo 1 > out/x\nchmod 600 out/x\n')
+    nested = _tree_command(tmpdir.mkdir('d'),
+                           'mkdir out/sub\necho 1 > out/sub/x\n')
+    nested_private = _tree_command(
+        tmpdir.mkdir('e'),
+        'mkdir out/sub\necho 1 > out/sub/x\nchmod 700 out/sub\n'
+    )
+    linked = _tree_command(tmpdir.mkdir('c'), 'echo 1 > out/x\n'
+                           'ln -s x out/y\nmkdir out/tmp\necho 3 > out/tmp/z\n'
+                           'echo 4 > out/x.log\n')
+
+    def digest(exe, **kwargs):
+        return testers.treeout(exe, '{exe}', inputs={}, output_path='out',
+                               **kwargs)
+    assert digest(plain) != digest(executable)
+    assert digest(plain) != digest(private)
+    assert digest(nested) != digest(nested_private)
+    assert digest(plain) == digest(linked, include='x')
+    assert digest(plain) != digest(linked, exclude=['tmp', '*.log'])
+    report = {}
+    digest(linked, exclude=['tmp', '*.log'], report=report)
+    assert sorted(report['files']) == ['x', 'y']
+    assert report['files']['y'].startswith('link ')
+
+
+def test_benchmark(tmpdir):
+    """
+    benchmark() times each run after the warm-ups and hashes the output
+    """
+    log = tmpdir.join('runs.log')
+    exe = tmpdir.join('tool.sh')
+    exe.write('#!/bin/sh\necho run >> {0}\necho result\n'.format(log))
+    exe.chmod(0o755)
+    report = {}
+    digest = testers.benchmark(str(exe), '{exe}', inputs={}, runs=4,
+                               warmup=2, report=report)
+    assert digest == hashlib.sha1(b'result\n').hexdigest()
+    assert len(log.readlines()) == 6
+    summary = report['benchmark']
+    assert (summary['runs'], summary['warmup']) == (4, 2)
+    assert len(summary['times']) == 4
+    assert summary['min'] <= summary['median'] <= summary['p90']
+    assert summary['ci_low'] <= summary['mean'] <= summary['ci_high']
+
+
+def test_benchmark_output_must_match(tmpdir):
+    """
+    benchmark() fails if a run prints something different
+    """
+    exe = tmpdir.join('tool.sh')
+    exe.write('#!/bin/sh\ndate +%N\n')
+    exe.chmod(0o755)
+    pytest.raises(readers.InputError, testers.benchmark, str(exe), '{exe}',
+                  inputs={}, runs=3)
+
+
+def test_benchmarks_run_alone(tmpdir):
+    """
+    With several jobs benchmark tests are run one at a time after the other
+    tools have been audited
+    """
+    log = tmpdir.join('runs.log')
+    exe = tmpdir.join('tool.sh')
+    exe.write('#!/bin/sh\necho "start $1" >> {0}\nsleep 0.1\n'
+              'echo "end $1" >> {0}\n'.format(log))
+    exe.chmod(0o755)
+    tool = """  - name: {0}
+    path: {1}
+    reader: {{name: manual, value: "1.0"}}
+    test:
+      name: {2}
+      command: "{{exe}} {0}"
+      inputs: {{}}
+{3}"""
+    k = tmpdir.join('kitlist.yaml')
+    k.write('---\ntools:\n' + ''.join(
+        tool.format(name, exe, tester, options)
+        for name, tester, options in (
+            ('bench1', 'benchmark', '      runs: 2\n      warmup: 0\n'),
+            ('a', 'stdout', ''),
+            ('bench2', 'benchmark', '      runs: 2\n      warmup: 0\n'),
+            ('b', 'stdout', ''),
+            ('c', 'stdout', '')
+        )
+    ))
+    from toolaudit.application import ToolauditApp
+    ToolauditApp.check(str(k), False, jobs=4)
+    events = log.read().split('\n')[:-1]
+    assert len(events) == 14
+    assert sorted(events[:6]) == sorted(
+        '{0} {1}'.format(e, n) for e in ('start', 'end') for n in 'abc'
+    )
+    assert [e.split()[0] for e in events[6:]] == ['start', 'end'] * 4
+
+
+def test_summarise_times():
+    summary = testers.summarise_times([4.0, 1.0, 3.0, 2.0, 5.0])
+    assert (summary['min'], summary['median'], summary['mean']) == \
+        (1.0, 3.0, 3.0)
+    assert summary['p90'] == pytest.approx(4.6)
+    # t(4) = 2.776, standard error = sqrt(2.5 / 5)
+    assert summary['ci_high'] - 3.0 == pytest.approx(2.776 * 0.5 ** 0.5,
+                                                     abs=1e-5)
+    single = testers.summarise_times([2.0])
+    assert single['ci_low'] is None and single['p90'] == 2.0
+
+
+def test_import_is_light():
+    """
+    Importing the testers doesn't import discovery or multiprocessing
+    """
+    code = ("import sys, toolaudit.testers; "
+            "sys.exit('toolaudit.discovery' in sys.modules or "
+            "'multiprocessing' in sys.modules)")
+    package_root = os.path.dirname(os.path.dirname(testers.__file__))
+    assert subprocess.call([sys.executable, '-c', code],
+                           cwd=package_root) == 0
@@ -0,0 +1,95 @@
+"""
+Tests for timing each phase of an audit
+"""
+
+import os.path
+import sys
+import time
+import pytest
+from six import StringIO
+import toolaudit
+from toolaudit import process, timing
+
+
+EXAMPLE_KITLIST = os.path.join(os.path.dirname(__file__), 'example.yaml')
+
+
+def test_nested_phases_are_exclusive():
+    """
+    Time spent in an inner phase isn't counted against the outer phase
+    """
+    with timing.recording(timing.Timings()) as timings:
+        with timing.phase('tester'):
+            with timing.phase('staging'):
+                time.sleep(0.2)
+    assert timings.wall['staging'] >= 0.2
+    assert timings.wall['tester'] < 0.1
+    assert set(timings.as_dict()['staging']) == set(['wall', 'cpu'])
+
+
+def test_child_cpu_time():
+    """
+    The CPU time of the reader and tester phases is that of the programs
+    they ran, other phases count toolaudit's own CPU time
+    """
+    burn = [sys.executable, '-c', 'sum(range(10 ** 7))']
+    with timing.recording(timing.Timings()) as timings:
+        with timing.phase('tester'):
+            process.wait(process.spawn(burn))
+            with timing.phase('staging'):
+                sum(range(10 ** 7))
+    assert timings.cpu['tester'] >= 0.05
+    assert timings.cpu['staging'] >= 0.05
+    assert timings.cpu['tester'] < timings.wall['tester']
+
+
+def test_phase_outside_recording():
+    """
+    Phases are ignored when no tool is being timed
+    """
+    with timing.phase('tester'):
+        pass
+
+
+def test_audit_records_timings(monkeypatch):
+    """
+    Each phase of the audit is timed and written when requested
+    """
+    monkeypatch.chdir(os.path.dirname(EXAMPLE_KITLIST))
+    session = toolaudit.session.AuditSession(record_timings=True)
+    kitlist = toolaudit.application.ToolauditApp.check(
+        EXAMPLE_KITLIST, False, session=session
+    )
+    for tool in kitlist.tools:
+        assert set(['reader', 'hashing']) <= set(tool.timings)
+        assert tool.as_dict()['timings'] == tool.timings
+    assert 'staging' in kitlist.tools[0].timings
+    assert len(session.tool_timings) == len(kitlist.tools)
+    f = StringIO()
+    timing.print_slowest(session.tool_timings, 1, f)
+    lines = f.getvalue().splitlines()
+    assert len(lines) == 4
+    assert lines[-1].startswith('Total for 2 tools')
+
+
+def test_timings_not_written_by_default(monkeypatch):
+    monkeypatch.chdir(os.path.dirname(EXAMPLE_KITLIST))
+    kitlist = toolaudit.application.ToolauditApp.check(EXAMPLE_KITLIST, True)
+    assert all(t.timings is None for t in kitlist.tools)
+
+
+def test_profile_output(tmpdir, monkeypatch, capsys):
+    """
+    --profile prints the slowest tools and --profile-output saves cProfile
+    statistics
+    """
+    import pstats
+    stats_file = str(tmpdir.join('audit.prof'))
+    monkeypatch.chdir(os.path.dirname(EXAMPLE_KITLIST))
+    app = toolaudit.application.ToolauditApp()
+    pytest.raises(SystemExit, app.run, EXAMPLE_KITLIST, skip_tests=True,
+                  output_file=str(tmpdir.join('out.yaml')), profile_top=5,
+                  profile_file=stats_file)
+    out, err = capsys.readouterr()
+    assert 'Slowest tools' in err
+    assert pstats.Stats(stats_file).total_calls > 0
@@ -0,0 +1,116 @@
+"""
+Tests for keeping an audit up to date as tools change
+"""
+
+import os
+import threading
+import time
+import pytest
+import toolaudit
+import yaml
+from toolaudit.watch import KitListWatcher, _InotifyNotifier
+
+
+KITLIST = """---
+tools:
+  - name: {name}
+    path: {path}
+    reader:
+      name: command_line
+      option: --version
+      regex: "^version\\\\s(.*)$"
+    test:
+      name: stdout
+      command: "{{exe}} {{data}}"
+      inputs:
+        data: {name}.dat
+"""
+
+
+@pytest.fixture()
+def watched(tmpdir, monkeypatch):
+    monkeypatch.chdir(str(tmpdir))
+    kitlist = []
+    for name in ('first', 'second'):
+        exe = tmpdir.join(name)
+        exe.write('#!/bin/sh\n[ "$1" = --version ] && echo "version 1" '
+                  '|| cat "$1"\n')
+        exe.chmod(0o755)
+        tmpdir.join(name + '.dat').write(name)
+        kitlist.append(KITLIST.format(name=name, path=str(exe)))
+    kitlist_path = tmpdir.join('kitlist.yaml')
+    kitlist_path.write(kitlist[0] + kitlist[1].split('tools:\n')[1])
+    return KitListWatcher(str(kitlist_path), str(tmpdir.join('out.yaml')))
+
+
+def _bump_mtime(path):
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+
+
+def test_only_changed_tools_are_audited(watched, tmpdir):
+    """
+    Changing a test input re-runs only that tool's test
+    """
+    assert watched.audit()
+    assert watched.tools_audited == 2
+    with open(watched.output_path) as f:
+        before = yaml.safe_load(f)
+    assert watched.changed_paths() == []
+    tmpdir.join('second.dat').write('changed')
+    _bump_mtime(str(tmpdir.join('second.dat')))
+    assert watched.changed_paths() == [str(tmpdir.join('second.dat'))]
+    assert watched.audit()
+    assert watched.tools_audited == 1
+    with open(watched.output_path) as f:
+        after = yaml.safe_load(f)
+    for field in ('version', 'checksum', 'output_checksum'):
+        assert after['tools'][0][field] == before['tools'][0][field]
+    assert after['tools'][0]['output_cached']
+    assert after['tools'][1]['output_checksum'] != \
+        before['tools'][1]['output_checksum']
+    assert watched.changed_paths() == []
+
+
+def test_kitlist_change(watched, tmpdir):
+    """
+    Editing the kitlist is noticed, an unreadable kitlist keeps the last
+    output
+    """
+    assert watched.audit()
+    kitlist = tmpdir.join('kitlist.yaml')
+    kitlist.write('tools: [')
+    _bump_mtime(str(kitlist))
+    assert watched.changed_paths() == [str(kitlist)]
+    assert not watched.audit()
+    assert len(watched.checked.tools) == 2
+    assert os.path.exists(watched.output_path)
+    assert watched.changed_paths() == []
+
+
+def test_inotify_wakes_on_change(tmpdir):
+    """
+    Waiting returns soon after a file in a watched directory changes
+    """
+    notifier = _InotifyNotifier.create([str(tmpdir)])
+    if notifier is None:
+        pytest.skip("inotify isn't available")
+    try:
+        timer = threading.Timer(0.2, tmpdir.join('new').write, ['x'])
+        timer.start()
+        start = time.time()
+        notifier.wait(30)
+        assert time.time() - start < 10
+    finally:
+        notifier.close()
+
+
+def test_watch_requires_output():
+    """
+    toolaudit watch needs somewhere to write the output
+    """
+    pytest.raises(SystemExit, toolaudit.main, ['watch', 'kitlist.yaml'])
+    args = toolaudit.create_watch_parser().parse_args(
+        ['-o', 'out.yaml', '-j', '4', 'kitlist.yaml']
+    )
+    assert (args.outputfile, args.jobs) == ('out.yaml', 4)
@@ -5,18 +5,67 @@ A tool for auditing software pipelines
 """
 
 import argparse
-from . import application
+import sys
+import types
 
 __author__ = "Jon Stutters"
 __copyright__ = "Copyright 2015, Jon Stutters"
 __version__ = '0.0.3'
 __date__ = '2015-04-23'
 
+# Submodules are imported when first used so that starting toolaudit, and
+# particularly ``toolaudit -V``, is quick.
+_SUBMODULES = (
+    'application', 'cache', 'compare', 'compiled', 'discovery', 'elfdeps',
+    'hashcache', 'hashing', 'kitlist', 'ndjson', 'probes', 'readers',
+    'registry', 'resultcache', 'schedule', 'session', 'staging', 'testers',
+    'timing', 'watch'
+)
 
-def main():
-    """The main function"""
+# The choices for command line options, the same as compare.DIFF_FORMATS,
+# ndjson.FORMATS and hashing.SUPPORTED_ALGORITHMS which aren't imported for
+# the same reason.
+_DIFF_FORMATS = ('yaml', 'json')
+_OUTPUT_FORMATS = ('yaml', 'ndjson')
+_HASH_ALGORITHMS = ('sha1', 'sha256', 'sha512', 'blake2b', 'md5')
+
+
+class _LazyModule(types.ModuleType):
+    """
+    The type of the toolaudit package, which imports a submodule when it is
+    first used as an attribute
+    """
+
+    def __getattr__(self, name):
+        if name in _SUBMODULES:
+            __import__(__name__ + '.' + name)
+            return sys.modules[__name__ + '.' + name]
+        raise AttributeError(
+            "module '{0}' has no attribute '{1}'".format(__name__, name)
+        )
+
+
+def main(argv=None):
+    """
+    The main function
+
+    ``toolaudit watch ...`` runs :func:`watch_main` and ``toolaudit batch
+    ...`` runs :func:`batch_main`, to audit a kitlist named ``watch`` or
+    ``batch`` use ``toolaudit ./watch``.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv[:1] == ['watch']:
+        return watch_main(argv[1:])
+    if argv[:1] == ['batch']:
+        return batch_main(argv[1:])
     parser = create_parser()
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    from . import application
+    from .compiled import CompiledKitListCache
+    from .hashcache import HashCache
+    from .resultcache import ResultCache
+    from .schedule import DurationHistory
     if 'compare' in args:
         compare_file = args.compare
     else:
@@ -27,13 +76,97 @@ def main():
         output_file = None
     if 'onlytest' in args:
         only_test = args.onlytest
+    if args.no_hash_cache:
+        hash_cache_file = None
+    else:
+        hash_cache_file = HashCache.default_path()
+    if args.no_kitlist_cache:
+        kitlist_cache_dir = None
+    else:
+        kitlist_cache_dir = CompiledKitListCache.default_path()
+    if args.result_cache:
+        result_cache_file = ResultCache.default_path()
+    else:
+        result_cache_file = None
     app = application.ToolauditApp()
     app.run(
         args.kitlist_file,
         compare_file=compare_file,
         output_file=output_file,
         skip_tests=args.skiptests,
-        only_test=only_test
+        only_test=only_test,
+        jobs=args.jobs,
+        hash_cache_file=hash_cache_file,
+        hash_algorithm=args.hash_algorithm,
+        result_cache_file=result_cache_file,
+        force_tests=args.force_tests,
+        since_file=args.since,
+        diff_file=args.diff_output,
+        diff_format=args.diff_format,
+        output_format=args.format,
+        kitlist_cache_dir=kitlist_cache_dir,
+        timeout=args.timeout,
+        hash_dependencies=args.hash_dependencies,
+        record_timings=args.timings,
+        profile_top=args.profile_top if args.profile else None,
+        profile_file=args.profile_output,
+        hash_jobs=args.hash_jobs,
+        resource_threshold=args.resource_threshold,
+        record_resources=args.resources,
+        duration_history_file=None if args.no_duration_history
+        else DurationHistory.default_path()
+    )
+
+
+def watch_main(argv):
+    """Run ``toolaudit watch`` with the arguments *argv*"""
+    args = create_watch_parser().parse_args(argv)
+    from . import application
+    from .hashcache import HashCache
+    from .resultcache import ResultCache
+    app = application.ToolauditApp()
+    app.watch(
+        args.kitlist_file,
+        args.outputfile,
+        skip_tests=args.skiptests,
+        jobs=args.jobs,
+        hash_cache_file=None if args.no_hash_cache
+        else HashCache.default_path(),
+        hash_algorithm=args.hash_algorithm,
+        result_cache_file=ResultCache.default_path() if args.result_cache
+        else None,
+        timeout=args.timeout,
+        interval=args.interval,
+        hash_dependencies=args.hash_dependencies
+    )
+
+
+def batch_main(argv):
+    """Run ``toolaudit batch`` with the arguments *argv*"""
+    args = create_batch_parser().parse_args(argv)
+    from . import application
+    from .compiled import CompiledKitListCache
+    from .hashcache import HashCache
+    from .resultcache import ResultCache
+    from .schedule import DurationHistory
+    app = application.ToolauditApp()
+    app.batch(
+        args.kitlist_files,
+        args.output_dir,
+        skip_tests=args.skiptests,
+        jobs=args.jobs,
+        hash_cache_file=None if args.no_hash_cache
+        else HashCache.default_path(),
+        hash_algorithm=args.hash_algorithm,
+        result_cache_file=ResultCache.default_path() if args.result_cache
+        else None,
+        force_tests=args.force_tests,
+        kitlist_cache_dir=None if args.no_kitlist_cache
+        else CompiledKitListCache.default_path(),
+        timeout=args.timeout,
+        hash_dependencies=args.hash_dependencies,
+        duration_history_file=None if args.no_duration_history
+        else DurationHistory.default_path()
     )
 
 
@@ -46,18 +179,232 @@ def create_parser():
     parser : :class:`argparse.ArgumentParser`
     """
 
-    parser = argparse.ArgumentParser(prog=__name__)
+    parser = argparse.ArgumentParser(
+        prog=__name__,
+        epilog="run '{0} watch -h' for keeping an audit up to date as tools "
+               "change or '{0} batch -h' for auditing several kitlists "
+               "together".format(__name__)
+    )
     parser.add_argument('-V', '--version',
                         action='version',
                         version='{0:} {1:}'.format(__name__, __version__))
-    parser.add_argument('-S', '--skiptests',
-                        help='just get version numbers and binary hashes',
-                        action='store_true')
     parser.add_argument('-O', '--onlytest',
                         help='only run the specified test')
     parser.add_argument('-c', '--compare',
                         help='reference kitlist for comparison')
+    parser.add_argument('--diff-output',
+                        help='file to write the differences found by '
+                             '--compare to')
+    parser.add_argument('--diff-format',
+                        help='format of the --diff-output file '
+                             '(default: %(default)s)',
+                        choices=_DIFF_FORMATS,
+                        default='yaml')
+    parser.add_argument('--resource-threshold',
+                        help='with --compare, also report tools whose tests '
+                             'used more than this fraction more CPU time, '
+                             'wall time or memory, e.g. 0.5 for 50%%',
+                        type=float)
     parser.add_argument('-o', '--outputfile',
                         help='file to write to')
+    parser.add_argument('--format',
+                        help='output format, ndjson writes each tool as soon '
+                             'as it is audited (default: %(default)s)',
+                        choices=_OUTPUT_FORMATS,
+                        default='yaml')
+    parser.add_argument('--hash-jobs',
+                        help='number of files hashed at once for kitlists '
+                             'with discover elements (default: 4 per CPU, '
+                             'at most 32)',
+                        type=_positive_int)
+    parser.add_argument('--resources',
+                        help="write the resources used by each tool's test "
+                             "to the output",
+                        action='store_true')
+    parser.add_argument('--timings',
+                        help="write the time taken by each phase of each "
+                             "tool's audit to the output",
+                        action='store_true')
+    parser.add_argument('--profile',
+                        help='print a table of the slowest tools',
+                        action='store_true')
+    parser.add_argument('--profile-top',
+                        help='number of tools printed by --profile '
+                             '(default: %(default)s)',
+                        type=_positive_int,
+                        default=10)
+    parser.add_argument('--profile-output',
+                        help='file to write cProfile statistics for '
+                             'toolaudit to')
+    parser.add_argument('--no-kitlist-cache',
+                        help="don't reuse the parsed kitlist from earlier "
+                             "runs",
+                        action='store_true')
+    parser.add_argument('--force-tests',
+                        help='run every test even if its inputs are '
+                             'unchanged since it was last run',
+                        action='store_true')
+    parser.add_argument('--no-duration-history',
+                        help="don't start the tools that took longest in "
+                             "earlier runs first",
+                        action='store_true')
+    parser.add_argument('--since',
+                        help='output of a previous audit to reuse the '
+                             'results of unchanged tools from')
+    _add_audit_arguments(parser)
     parser.add_argument('kitlist_file')
     return parser
+
+
+def create_watch_parser():
+    """
+    Create the :class:`argparse.ArgumentParser` for ``toolaudit watch``
+
+    Returns
+    -------
+    parser : :class:`argparse.ArgumentParser`
+    """
+
+    parser = argparse.ArgumentParser(
+        prog=__name__ + ' watch',
+        description='audit a kitlist then re-audit the tools that change '
+                    'until interrupted'
+    )
+    parser.add_argument('-o', '--outputfile',
+                        help='file to write to, it is replaced after each '
+                             'audit',
+                        required=True)
+    parser.add_argument('--interval',
+                        help='seconds between checks for changed files when '
+                             'inotify is unavailable (default: %(default)s)',
+                        type=float,
+                        default=2.0)
+    _add_audit_arguments(parser)
+    parser.add_argument('kitlist_file')
+    return parser
+
+
+def create_batch_parser():
+    """
+    Create the :class:`argparse.ArgumentParser` for ``toolaudit batch``
+
+    Returns
+    -------
+    parser : :class:`argparse.ArgumentParser`
+    """
+
+    parser = argparse.ArgumentParser(
+        prog=__name__ + ' batch',
+        description='audit several kitlists together, running the readers, '
+                    'checksums and tests they share once'
+    )
+    parser.add_argument('-d', '--output-dir',
+                        help='directory to write the checked kitlists to, '
+                             'each is given the name of its kitlist',
+                        required=True)
+    parser.add_argument('--no-kitlist-cache',
+                        help="don't reuse parsed kitlists from earlier runs",
+                        action='store_true')
+    parser.add_argument('--force-tests',
+                        help='run every test even if its inputs are '
+                             'unchanged since it was last run',
+                        action='store_true')
+    parser.add_argument('--no-duration-history',
+                        help="don't start the tools that took longest in "
+                             "earlier runs first",
+                        action='store_true')
+    _add_audit_arguments(parser)
+    parser.add_argument('kitlist_files', nargs='+')
+    return parser
+
+
+def _add_audit_arguments(parser):
+    """
+    Add the options shared by ``toolaudit`` and its subcommands
+    """
+
+    parser.add_argument('-S', '--skiptests',
+                        help='just get version numbers and binary hashes',
+                        action='store_true')
+    parser.add_argument('-j', '--jobs',
+                        help='number of tools to audit concurrently',
+                        type=_positive_int,
+                        default=1)
+    parser.add_argument('--timeout',
+                        help='seconds a reader or test may run for before '
+                             'it is killed, for tools without a timeout',
+                        type=float)
+    parser.add_argument('--no-hash-cache',
+                        help="don't reuse binary checksums from earlier runs",
+                        action='store_true')
+    parser.add_argument('--result-cache',
+                        help='reuse the results of tests whose tool, test '
+                             'and inputs are unchanged since an earlier run, '
+                             'changes to shared libraries are only noticed '
+                             'with --hash-dependencies',
+                        action='store_true')
+    parser.add_argument('--hash-algorithm',
+                        help='algorithm used for tools without a '
+                             'hash_algorithm (default: %(default)s)',
+                        choices=_hash_algorithms(),
+                        default='sha1')
+    parser.add_argument('--hash-dependencies',
+                        help='also record a checksum of the shared libraries '
+                             'loaded by each tool',
+                        action='store_true')
+
+
+def _hash_algorithms():
+    """
+    The hash algorithms that can be chosen, those of :data:`_HASH_ALGORITHMS`
+    which hashlib provides on this Python
+    """
+
+    import hashlib
+    available = getattr(
+        hashlib, 'algorithms_available',
+        ('md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512')
+    )
+    return tuple(a for a in _HASH_ALGORITHMS if a in available)
+
+
+def _positive_int(value):
+    """
+    Convert a command line argument to an integer greater than zero
+
+    Raises
+    ------
+    argparse.ArgumentTypeError
+        If *value* isn't a positive integer
+    """
+
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            "expected a positive integer, got '{0}'".format(value)
+        )
+    return number
+
+
+def _make_lazy():
+    """
+    Make this module a :class:`_LazyModule`
+    """
+
+    module = sys.modules[__name__]
+    try:
+        module.__class__ = _LazyModule
+    except TypeError:
+        # Before Python 3.5 the class of a module can't be changed, so it is
+        # replaced.  The original is kept because on Python 2 freeing a
+        # module clears the globals of the functions defined in it.
+        lazy = _LazyModule(__name__, __doc__)
+        lazy.__dict__.update(module.__dict__)
+        lazy.__dict__['_original'] = module
+        sys.modules[__name__] = lazy
+
+
+_make_lazy()
@@ -2,16 +2,39 @@
 The toolaudit application
 """
 
+from .compare import KitListDiff
+from .compiled import CompiledKitListCache
+from . import discovery
+from . import hashing
+from .hashcache import HashCache
 from .kitlist import KitList
 import logging
-from . import readers
+from multiprocessing.pool import ThreadPool
+from .ndjson import NdjsonWriter
+from .resultcache import ResultCache
+from .schedule import DurationHistory
+from .session import AuditSession
+from . import timing
 import os
 import os.path
 import sys
+import time
 
 
 class ToolauditApp(object):
     """Class for toolaudit functions"""
+
+    # The AuditJob attributes set by auditing a tool
+    RESULT_FIELDS = (
+        'version', 'checksum', 'output_checksum', 'hash_algorithm',
+        'test_report', 'output_cached', 'file_stats', 'status', 'timings',
+        'dependency_checksum', 'resources'
+    )
+
+    # Tests which measure time and are run after the other tools, one at a
+    # time, when auditing with several jobs.
+    EXCLUSIVE_TESTERS = ('benchmark',)
+
     def __init__(self):
         """
         Initialize the toolaudit class
@@ -27,78 +50,492 @@ class ToolauditApp(object):
         handler.setLevel(logging.INFO)
         log.addHandler(handler)
 
-    def run(self, kitlist_file, compare_file=None, output_file=None, skip_tests=False, only_test=None):
+    def run(self, kitlist_file, compare_file=None, output_file=None,
+            skip_tests=False, only_test=None, jobs=1, hash_cache_file=None,
+            hash_algorithm=hashing.DEFAULT_ALGORITHM, result_cache_file=None,
+            force_tests=False, since_file=None, diff_file=None,
+            diff_format='yaml', output_format='yaml', kitlist_cache_dir=None,
+            timeout=None, record_timings=False, profile_top=None,
+            profile_file=None, hash_jobs=None,
+            hash_dependencies=False, duration_history_file=None,
+            resource_threshold=None, record_resources=False):
         """
         Run the checks
+
+        Parameters
+        ----------
+        hash_cache_file : str or None
+            Where to keep a :class:`~toolaudit.hashcache.HashCache` of file
+            checksums between runs.  If None every file is hashed.
+        hash_algorithm : str
+            The algorithm used for tools that don't specify one
+        result_cache_file : str or None
+            Where to keep a :class:`~toolaudit.resultcache.ResultCache` of
+            test results between runs.  If None every test is run.
+        force_tests : bool
+            Run every test even if its result is in the result cache
+        since_file : str or None
+            The output of a previous audit, results are copied from it for
+            tools which haven't changed according to the file metadata saved
+            alongside it, see :meth:`KitList.save_file_stats`
+        diff_file : str or None
+            Where to write the differences found by comparison
+        diff_format : str
+            'yaml' or 'json', the format of *diff_file*
+        output_format : str
+            'yaml' to write the checked KitList once every tool has been
+            audited or 'ndjson' to write each tool as soon as it is audited
+        kitlist_cache_dir : str or None
+            Where to keep a :class:`~toolaudit.compiled.CompiledKitListCache`
+            of parsed KitLists.  If None the KitList is always parsed.
+        timeout : float or None
+            How many seconds a tool's reader or tester may run for, unless
+            the tool sets its own timeout
+        record_timings : bool
+            Write the time taken by each phase of each tool's audit to the
+            output
+        profile_top : int or None
+            If given print a table of this many of the slowest tools
+        profile_file : str or None
+            Where to write :mod:`cProfile` statistics for toolaudit itself,
+            only the main thread is profiled so use one job for a complete
+            profile
+        hash_jobs : int or None
+            The number of files hashed at once before auditing a KitList with
+            ``discover`` elements, defaults to
+            :data:`~toolaudit.hashing.DEFAULT_HASH_JOBS`
+        hash_dependencies : bool
+            Record a checksum of the shared libraries loaded by each tool
+        duration_history_file : str or None
+            Where to keep a :class:`~toolaudit.schedule.DurationHistory` of
+            how long each tool took to audit, used to start the slowest
+            tools first.  If None tools are audited in KitList order.
+        resource_threshold : float or None
+            When comparing, also report tools whose tests used more than
+            this fraction more CPU time, wall time or memory than in the
+            reference, see
+            :meth:`~toolaudit.compare.KitListDiff.between`.  The resources
+            are recorded when this is given.
+        record_resources : bool
+            Write the resources used by each tool's test to the output
         """
 
         kitlist_path = os.path.abspath(kitlist_file)
         kitlist_dir = os.path.dirname(kitlist_path)
         if compare_file:
             compare_path = os.path.abspath(compare_file)
+            reference = KitList.from_file(compare_path)
+        else:
+            reference = None
         if output_file:
             output_path = os.path.abspath(output_file)
+        if diff_file:
+            diff_file = os.path.abspath(diff_file)
+        if profile_file:
+            profile_file = os.path.abspath(profile_file)
+        if since_file:
+            since_path = os.path.abspath(since_file)
+            previous = KitList.from_file(since_path)
+            previous.read_file_stats(KitList.stats_path(since_path))
+        else:
+            previous = None
         os.chdir(kitlist_dir)
-        checked_kitlist = self.check(kitlist_path, skip_tests, only_test)
+        session = AuditSession(
+            hash_cache=HashCache.from_file(hash_cache_file)
+            if hash_cache_file else None,
+            result_cache=ResultCache.from_file(result_cache_file)
+            if result_cache_file else None,
+            force_tests=force_tests,
+            previous=previous,
+            timeout=timeout,
+            record_timings=record_timings,
+            hash_dependencies=hash_dependencies,
+            durations=DurationHistory.from_file(duration_history_file)
+            if duration_history_file else None,
+            record_resources=record_resources or
+            resource_threshold is not None
+        )
+        if output_format == 'ndjson':
+            if output_file:
+                stream_file = open(output_path, 'w')
+            else:
+                stream_file = sys.stdout
+            stream = NdjsonWriter(stream_file)
+        else:
+            stream = None
+        if kitlist_cache_dir:
+            kitlist_cache = CompiledKitListCache(kitlist_cache_dir)
+        else:
+            kitlist_cache = None
+        if profile_file:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            checked_kitlist = self.check(
+                kitlist_path, skip_tests, only_test, jobs=jobs,
+                hash_algorithm=hash_algorithm, reference=reference,
+                session=session, stream=stream, kitlist_cache=kitlist_cache,
+                hash_jobs=hash_jobs
+            )
+            if stream:
+                stream.trailer(session.totals())
+        finally:
+            if stream and output_file:
+                stream_file.close()
+            if profile_file:
+                profiler.disable()
+                profiler.dump_stats(profile_file)
+        if stream and output_file:
+            checked_kitlist.save_file_stats(KitList.stats_path(output_path))
+        if session.hash_cache:
+            session.hash_cache.save()
+        if session.result_cache:
+            session.result_cache.save()
+        if session.durations:
+            session.durations.save()
+        for line in session.summary():
+            sys.stderr.write(line + "\n")
+        if profile_top:
+            timing.print_slowest(session.tool_timings, profile_top, sys.stderr)
         if compare_file:
-            if self.compare(compare_path, checked_kitlist):
+            if self.compare(reference, checked_kitlist, diff_file,
+                            diff_format, resource_threshold):
                 sys.exit(1)
             else:
                 sys.exit(0)
-        if output_file:
-            checked_kitlist.save(output_path)
+        if stream is None:
+            if output_file:
+                checked_kitlist.save(output_path)
+                checked_kitlist.save_file_stats(
+                    KitList.stats_path(output_path)
+                )
+            else:
+                checked_kitlist.to_stdout()
+        sys.exit(0)
+
+    def watch(self, kitlist_file, output_file, skip_tests=False, jobs=1,
+              hash_cache_file=None, hash_algorithm=hashing.DEFAULT_ALGORITHM,
+              result_cache_file=None, timeout=None, interval=2.0,
+              hash_dependencies=False):
+        """
+        Audit a KitList and keep its output up to date until interrupted, see
+        :class:`~toolaudit.watch.KitListWatcher`
+
+        Parameters
+        ----------
+        kitlist_file : str
+            The KitList to audit
+        output_file : str
+            Where to write the checked KitList
+        interval : float
+            Seconds between checks for changed files when inotify isn't
+            available
+
+        The other parameters are as for :meth:`run`.
+        """
+
+        from .watch import KitListWatcher
+        kitlist_path = os.path.abspath(kitlist_file)
+        watcher = KitListWatcher(
+            kitlist_path, os.path.abspath(output_file),
+            skip_tests=skip_tests,
+            jobs=jobs,
+            hash_algorithm=hash_algorithm,
+            hash_cache=HashCache.from_file(hash_cache_file)
+            if hash_cache_file else None,
+            result_cache=ResultCache.from_file(result_cache_file)
+            if result_cache_file else None,
+            timeout=timeout,
+            interval=interval,
+            hash_dependencies=hash_dependencies
+        )
+        os.chdir(os.path.dirname(kitlist_path))
+        watcher.run()
+        sys.exit(0)
+
+    def batch(self, kitlist_files, output_dir, skip_tests=False, jobs=1,
+              hash_cache_file=None, hash_algorithm=hashing.DEFAULT_ALGORITHM,
+              result_cache_file=None, force_tests=False,
+              kitlist_cache_dir=None, timeout=None, hash_dependencies=False,
+              duration_history_file=None):
+        """
+        Audit several KitLists together, see :meth:`check_batch`, and write
+        each checked KitList to a file with the same name in *output_dir*,
+        which is made if it doesn't exist.
+
+        The other parameters are as for :meth:`run`.
+        """
+
+        output_dir = os.path.abspath(output_dir)
+        output_paths = [
+            os.path.join(output_dir, os.path.basename(k))
+            for k in kitlist_files
+        ]
+        if len(set(output_paths)) != len(output_paths):
+            raise ValueError(
+                "Kitlists in a batch must have different file names"
+            )
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        session = AuditSession(
+            hash_cache=HashCache.from_file(hash_cache_file)
+            if hash_cache_file else None,
+            result_cache=ResultCache.from_file(result_cache_file)
+            if result_cache_file else None,
+            force_tests=force_tests,
+            timeout=timeout,
+            hash_dependencies=hash_dependencies,
+            durations=DurationHistory.from_file(duration_history_file)
+            if duration_history_file else None
+        )
+        if kitlist_cache_dir:
+            kitlist_cache = CompiledKitListCache(kitlist_cache_dir)
         else:
-            checked_kitlist.to_stdout()
+            kitlist_cache = None
+        try:
+            checked = self.check_batch(
+                kitlist_files, skip_tests, jobs=jobs,
+                hash_algorithm=hash_algorithm, session=session,
+                kitlist_cache=kitlist_cache
+            )
+            for kitlist, output_path in zip(checked, output_paths):
+                kitlist.save(output_path)
+        finally:
+            if session.hash_cache:
+                session.hash_cache.save()
+            if session.result_cache:
+                session.result_cache.save()
+            if session.durations:
+                session.durations.save()
+        for line in session.summary():
+            sys.stderr.write(line + "\n")
         sys.exit(0)
 
     @classmethod
-    def check(cls, kitlist_path, skip_tests, only_test=None):
+    def check_batch(cls, kitlist_paths, skip_tests, jobs=1,
+                    hash_algorithm=hashing.DEFAULT_ALGORITHM, session=None,
+                    kitlist_cache=None):
         """
-        Read the KitList specified by the user then run the checks.
+        Read several KitLists and check the tools of all of them in one pool
+        of workers.
+
+        Readers, checksums and tests needed by tools in more than one KitList
+        are only run once, see :class:`~toolaudit.session.AuditSession`.
+        Relative paths in each KitList are relative to the directory it is
+        in and are written unchanged to the results, which are the same as
+        checking each KitList from its own directory with :meth:`check`.
+
+        Parameters
+        ----------
+        kitlist_paths : list of str
+            The KitLists to check
+
+        The other parameters are as for :meth:`check`.
+
+        Returns
+        -------
+        kitlists : list of :class:`KitList`
+            The KitLists with the results filled in, in the order of
+            *kitlist_paths*
         """
 
-        kitlist = KitList.from_file(kitlist_path)
-        for tool in kitlist.tools:
-            if only_test is not None and only_test != tool.name:
-                continue
-            logging.getLogger().info("Testing {0}".format(tool.name))
-            if not os.path.exists(tool.path):
-                err_msg = "The path for '{0}' does not exist: {1}".format(
-                    tool.name, tool.path
-                )
-                raise IOError(err_msg)
-            tool.version = tool.reader.func(tool.path, **tool.reader.args)
-            if tool.tester and not skip_tests:
-                tool.output_checksum = tool.tester.func(
-                    tool.path, **tool.tester.args
-                )
+        if session is None:
+            session = AuditSession()
+        kitlists = []
+        items = []
+        for path in kitlist_paths:
+            if kitlist_cache:
+                kitlist = kitlist_cache.load(path)
             else:
-                tool.output_checksum = None
-            tool.checksum = readers.sha1_file(tool.path)
+                kitlist = KitList.from_file(path)
+            kitlists.append(kitlist)
+            cls._select_hash_algorithms(kitlist.tools, hash_algorithm, None)
+            base_dir = os.path.dirname(os.path.abspath(path))
+            items.extend((kitlist, tool, base_dir) for tool in kitlist.tools)
+
+        def audit(item):
+            kitlist, tool, base_dir = item
+            session.audit(tool, skip_tests, kitlist.staging, base_dir)
+        order = session.schedule(
+            [i[1] for i in items], skip_tests, jobs, [i[2] for i in items]
+        )
+        started = time.time()
+        cls._run_jobs(
+            audit, [items[i] for i in order], jobs,
+            lambda item: cls._runs_alone(item[1], skip_tests)
+        )
+        session.makespan = time.time() - started
+        return kitlists
+
+    @classmethod
+    def check(cls, kitlist_path, skip_tests, only_test=None, jobs=1,
+              hash_algorithm=hashing.DEFAULT_ALGORITHM, reference=None,
+              session=None, stream=None, kitlist_cache=None,
+              hash_jobs=None):
+        """
+        Read the KitList specified by the user then run the checks.
+
+        Parameters
+        ----------
+        kitlist_path : str
+            The KitList to check
+        skip_tests : bool
+            Only read versions and checksums, don't run the testers
+        only_test : str or None
+            If given only the tool with this name is checked
+        jobs : int
+            The number of tools to check concurrently
+        hash_algorithm : str
+            The algorithm used for tools that don't specify one
+        reference : :class:`KitList` or None
+            A KitList that the results will be compared to, tools found in it
+            are hashed with the same algorithm as the reference
+        session : :class:`~toolaudit.session.AuditSession` or None
+            Does the work of auditing each tool, a session without caches is
+            used if None
+        stream : :class:`~toolaudit.ndjson.NdjsonWriter` or None
+            If given the KitList header is written to it once the KitList has
+            been read, then each tool as soon as it has been audited
+        kitlist_cache : :class:`~toolaudit.compiled.CompiledKitListCache`
+            or None
+            Used to load the KitList without parsing it if possible
+        hash_jobs : int or None
+            If the KitList has ``discover`` elements the binaries of the
+            tools are hashed by this many workers before the tools are
+            audited, see :func:`~toolaudit.discovery.hash_tools`.  Not done
+            when there's a previous audit to reuse results from.
+
+        Returns
+        -------
+        kitlist : :class:`KitList`
+            The KitList with the results of the checks filled in
+        """
+
+        if kitlist_cache:
+            kitlist = kitlist_cache.load(kitlist_path)
+        else:
+            kitlist = KitList.from_file(kitlist_path)
+        selected = [
+            t for t in kitlist.tools
+            if only_test is None or only_test == t.name
+        ]
+        cls._select_hash_algorithms(selected, hash_algorithm, reference)
+        if session is None:
+            session = AuditSession()
+        if kitlist.discovered and session.previous is None:
+            discovery.hash_tools(session, selected, hash_jobs)
+        if stream:
+            stream.header(kitlist)
+
+        def audit(tool):
+            session.audit(tool, skip_tests, kitlist.staging)
+            if stream:
+                stream.tool(tool)
+        order = session.schedule(selected, skip_tests, jobs)
+        started = time.time()
+        cls._run_jobs(
+            audit, [selected[i] for i in order], jobs,
+            lambda tool: cls._runs_alone(tool, skip_tests)
+        )
+        session.makespan = time.time() - started
         return kitlist
 
     @classmethod
-    def compare(cls, compare_path, comparison):
+    def _select_hash_algorithms(cls, tools, default, reference):
         """
-        Compare the KitList from the current test session with a reference copy
+        Set the hash algorithm of each tool.
+
+        The algorithm recorded in the reference KitList takes precedence,
+        reference tools without one were hashed with SHA-1.  Otherwise the
+        tool's own setting is used, or *default* if it has none.
         """
 
-        reference = KitList.from_file(compare_path)
-        mismatches = []
-        for ref_tool in reference.tools:
-            comp_tool = comparison.get_tool(ref_tool.name)
-            for k in ('checksum', 'path', 'version', 'output_checksum'):
-                if getattr(ref_tool, k) != getattr(comp_tool, k):
-                    mismatches.append((k, ref_tool, comp_tool))
-        if not mismatches:
-            print >> sys.stderr, "No mismatches found"
-            return False
+        for tool in tools:
+            ref_tool = reference.get_tool(tool.name) if reference else None
+            if ref_tool is not None:
+                tool.hash_algorithm = ref_tool.hash_algorithm or 'sha1'
+            elif tool.hash_algorithm is None:
+                tool.hash_algorithm = default
+
+    @classmethod
+    def _run_jobs(cls, func, items, jobs, exclusive=None):
+        """
+        Call *func* on each of *items* using a pool of *jobs* worker threads.
+
+        Results are returned in the order of *items*.  The first exception
+        raised by *func*, in item order, is re-raised.  With one job the
+        items are processed serially in the calling thread.  Items for which
+        *exclusive* returns True are processed one at a time in the calling
+        thread once the pool has finished, so nothing else runs alongside
+        them.
+        """
+
+        if jobs <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        if exclusive is None:
+            serial = []
         else:
-            for m in mismatches:
-                print >> sys.stderr, '{0}\n\t{1}: {2} - {3}'.format(
-                    m[1].name,
-                    m[0],
-                    getattr(m[1], m[0]),
-                    getattr(m[2], m[0])
+            serial = [i for i, item in enumerate(items) if exclusive(item)]
+        pooled = sorted(set(range(len(items))) - set(serial))
+        results = [None] * len(items)
+        if pooled:
+            pool = ThreadPool(min(jobs, len(pooled)))
+            try:
+                pooled_results = pool.map(
+                    func, [items[i] for i in pooled], chunksize=1
                 )
-            return True
+            finally:
+                pool.close()
+                pool.join()
+            for i, result in zip(pooled, pooled_results):
+                results[i] = result
+        for i in serial:
+            results[i] = func(items[i])
+        return results
+
+    @classmethod
+    def _runs_alone(cls, tool, skip_tests):
+        """
+        Whether *tool* has to be audited with nothing else running, which is
+        the case for tests in :attr:`EXCLUSIVE_TESTERS`
+        """
+
+        return not skip_tests and tool.tester is not None and \
+            tool.tester.name in cls.EXCLUSIVE_TESTERS
+
+    @classmethod
+    def compare(cls, reference, comparison, diff_file=None,
+                diff_format='yaml', resource_threshold=None):
+        """
+        Compare the KitList from the current test session with a reference copy
+
+        Parameters
+        ----------
+        reference : str or :class:`KitList`
+            The reference KitList or the path to read it from
+        comparison : :class:`KitList`
+            The KitList to check
+        diff_file : str or None
+            If given the differences are also written to this file
+        diff_format : str
+            'yaml' or 'json', the format of *diff_file*
+        resource_threshold : float or None
+            Also report tools whose tests used more resources than in the
+            reference by more than this fraction
+
+        Returns
+        -------
+        mismatched : bool
+            True if any differences were found
+        """
+
+        if not isinstance(reference, KitList):
+            reference = KitList.from_file(reference)
+        diff = KitListDiff.between(
+            reference, comparison, resource_threshold=resource_threshold
+        )
+        diff.print_report(sys.stderr)
+        if diff_file:
+            diff.save(diff_file, diff_format)
+        return bool(diff)
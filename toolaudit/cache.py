@@ -0,0 +1,224 @@
+"""
+Base class for caches kept on disk between runs
+"""
+
+import errno
+import json
+import os
+import os.path
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+def cache_home():
+    """
+    The directory toolaudit keeps its caches in
+
+    Returns
+    -------
+    path : str
+        The ``toolaudit`` directory of ``$XDG_CACHE_HOME``, or ``~/.cache``
+        if that isn't set
+    """
+
+    home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache'
+    )
+    return os.path.join(home, 'toolaudit')
+
+
+class JsonCache(object):
+    """
+    Entries saved as JSON in an SQLite database.
+
+    Each entry is a dict with a ``used`` key holding the time it was last
+    used.  Entries are read from the database as they are looked up, and
+    only entries which were added or changed are written back.  Entries
+    which haven't been used for *max_age* seconds are dropped when the cache
+    is saved, as are the least recently used entries beyond *max_entries*.
+
+    Parameters
+    ----------
+    path : str
+        The file the cache is stored in
+    max_entries : int
+        The maximum number of entries to keep
+    max_age : float
+        The number of seconds an unused entry is kept for
+    """
+
+    FORMAT_VERSION = 1
+
+    # The name of the file in the user's cache directory.
+    FILE_NAME = None
+
+    # The time of last use is only updated when it's older than this, so
+    # that looking up an entry doesn't mean writing it back every run.
+    TOUCH_INTERVAL = 24 * 60 * 60
+
+    def __init__(self, path, max_entries=50000, max_age=90 * 24 * 60 * 60):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._db = None
+
+    @classmethod
+    def default_path(cls):
+        """
+        The location of the cache used by the toolaudit command
+
+        Returns
+        -------
+        path : str
+            :attr:`FILE_NAME` in :func:`cache_home`
+        """
+
+        return os.path.join(cache_home(), cls.FILE_NAME)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """
+        Create a cache and open the entries already saved at *path*.
+        """
+
+        instance = cls(path, **kwargs)
+        instance.load()
+        return instance
+
+    def load(self):
+        """
+        Open the saved cache.  A missing, unreadable or outdated cache file
+        is treated as empty, and is replaced when the cache is saved.
+        """
+
+        if not os.path.exists(self.path):
+            return
+        try:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            version = db.execute('PRAGMA user_version').fetchone()[0]
+        except sqlite3.Error:
+            return
+        if version != self.FORMAT_VERSION:
+            db.close()
+            return
+        with self._lock:
+            self._db = db
+
+    def save(self):
+        """
+        Write the entries that were added or changed and evict old entries.
+        Nothing is written if no entries have changed.
+        """
+
+        with self._lock:
+            if not self._dirty:
+                return
+            if self._db is None:
+                self._db = self._create()
+            rows = [
+                (key, self.entries[key]['used'],
+                 json.dumps(self.entries[key]))
+                for key in self._dirty
+            ]
+            with self._db:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO entries (key, used, value) '
+                    'VALUES (?, ?, ?)', rows
+                )
+                self._evict(time.time())
+            self._dirty.clear()
+
+    def _get(self, key):
+        """
+        Get the entry for *key*, reading it from the database if it hasn't
+        been used yet.  Must be called with the lock held.
+
+        Returns
+        -------
+        entry : dict or None
+            None if there isn't an entry for *key*
+        """
+
+        entry = self.entries.get(key)
+        if entry is None and self._db is not None:
+            row = self._db.execute(
+                'SELECT value FROM entries WHERE key = ?', (key,)
+            ).fetchone()
+            if row is not None:
+                entry = self.entries[key] = json.loads(row[0])
+        return entry
+
+    def _put(self, key, entry):
+        """
+        Add or replace the entry for *key*, marking it as used now.  Must be
+        called with the lock held.
+        """
+
+        entry['used'] = time.time()
+        self.entries[key] = entry
+        self._dirty.add(key)
+
+    def _touch(self, key, entry):
+        """
+        Mark the entry for *key* as used now if it was last marked more than
+        :attr:`TOUCH_INTERVAL` ago.  Must be called with the lock held.
+        """
+
+        now = time.time()
+        if entry['used'] < now - self.TOUCH_INTERVAL:
+            entry['used'] = now
+            self._dirty.add(key)
+
+    def _create(self):
+        """
+        Create an empty cache database at :attr:`path`, replacing any
+        existing file atomically.
+        """
+
+        cache_dir = os.path.dirname(self.path)
+        try:
+            os.makedirs(cache_dir)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            db = sqlite3.connect(temp_path)
+            db.execute(
+                'CREATE TABLE entries (key TEXT PRIMARY KEY, '
+                'used REAL NOT NULL, value TEXT NOT NULL)'
+            )
+            db.execute('CREATE INDEX entries_used ON entries (used)')
+            db.execute('PRAGMA user_version = %d' % self.FORMAT_VERSION)
+            db.commit()
+            db.close()
+            os.rename(temp_path, self.path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def _evict(self, now):
+        """
+        Drop entries that are too old, then the least recently used entries
+        until there are no more than *max_entries*.
+        """
+
+        self._db.execute(
+            'DELETE FROM entries WHERE used < ?', (now - self.max_age,)
+        )
+        count = self._db.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                'DELETE FROM entries WHERE key NOT IN '
+                '(SELECT key FROM entries ORDER BY used DESC LIMIT ?)',
+                (self.max_entries,)
+            )
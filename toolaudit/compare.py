@@ -0,0 +1,283 @@
+"""
+Finding the differences between two KitLists
+"""
+
+from __future__ import print_function
+
+
+# The AuditJob attributes compared for tools found in both KitLists.
+FIELDS = ('checksum', 'path', 'version', 'output_checksum')
+
+# AuditJob attributes which are only compared if both tools have a value, as
+# they are only recorded by some audits.
+OPTIONAL_FIELDS = ('dependency_checksum',)
+
+# The resources used by tests which are checked for regressions, see
+# :class:`~toolaudit.process.ResourceUsage`.
+RESOURCE_FIELDS = ('user', 'system', 'wall', 'max_rss')
+
+# Increases smaller than these are too small to be told apart from noise.
+RESOURCE_MINIMUMS = {'user': 0.1, 'system': 0.1, 'wall': 0.1, 'max_rss': 1024}
+
+# Benchmarks whose median time increased by less than this fraction aren't
+# reported, however significant the slowdown.
+BENCHMARK_MIN_SLOWDOWN = 0.05
+
+DIFF_FORMATS = ('yaml', 'json')
+
+
+class KitListDiff(object):
+    """
+    The differences between a reference KitList and a comparison KitList
+
+    A diff is true if it has mismatches, that is tools which were removed
+    or changed.  Tools added since the reference are reported but aren't
+    mismatches.
+
+    Attributes
+    ----------
+    added : list of str
+        Names of tools only in the comparison, in comparison order
+    removed : list of str
+        Names of tools only in the reference, in reference order
+    changed : list of tuple
+        (name, field, reference value, comparison value) for each field
+        that differs, in reference order.  If the output checksums of a tool
+        differ and both test reports list the files hashed, as the ``tree``
+        tester's do, each file that differs follows with the field
+        ``output_file:<path>``.  Resources that regressed have the field
+        ``resources:<name>`` and benchmarks that slowed down significantly
+        have the field ``benchmark:median``.
+    """
+
+    def __init__(self, added=None, removed=None, changed=None):
+        self.added = added or []
+        self.removed = removed or []
+        self.changed = changed or []
+
+    def __bool__(self):
+        return bool(self.removed or self.changed)
+
+    __nonzero__ = __bool__
+
+    @classmethod
+    def between(cls, reference, comparison, fields=FIELDS,
+                optional_fields=OPTIONAL_FIELDS, resource_threshold=None):
+        """
+        Compare two KitLists in a single pass over each.
+
+        A tool tested by a benchmark, see
+        :func:`~toolaudit.testers.benchmark`, has slowed down if the 95%
+        confidence intervals of its mean time don't overlap and its median
+        time increased by more than :data:`BENCHMARK_MIN_SLOWDOWN`.
+
+        Parameters
+        ----------
+        reference : :class:`~toolaudit.kitlist.KitList`
+            The expected results
+        comparison : :class:`~toolaudit.kitlist.KitList`
+            The results to check
+        fields : sequence of str
+            The AuditJob attributes to compare
+        optional_fields : sequence of str
+            AuditJob attributes compared only if neither value is None
+        resource_threshold : float or None
+            If given, tools whose tests used a fraction more than this of
+            any of :data:`RESOURCE_FIELDS` than in the reference are
+            reported, 0.5 reports increases of more than 50%.  Increases
+            below :data:`RESOURCE_MINIMUMS` are ignored.
+
+        Returns
+        -------
+        diff : :class:`KitListDiff`
+        """
+
+        diff = cls()
+        ref_index = reference.index()
+        comp_index = comparison.index()
+        for ref_tool in reference.tools:
+            if ref_index[ref_tool.name] is not ref_tool:
+                continue
+            comp_tool = comp_index.get(ref_tool.name)
+            if comp_tool is None:
+                diff.removed.append(ref_tool.name)
+                continue
+            for k in tuple(fields) + tuple(optional_fields):
+                ref_value = getattr(ref_tool, k)
+                comp_value = getattr(comp_tool, k)
+                if k in optional_fields and \
+                        (ref_value is None or comp_value is None):
+                    continue
+                if ref_value != comp_value:
+                    diff.changed.append(
+                        (ref_tool.name, k, ref_value, comp_value)
+                    )
+                    if k == 'output_checksum':
+                        diff.changed.extend(
+                            (ref_tool.name, 'output_file:' + path, r, c)
+                            for path, r, c in _changed_files(
+                                ref_tool.test_report, comp_tool.test_report
+                            )
+                        )
+            slowdown = _benchmark_slowdown(
+                ref_tool.test_report, comp_tool.test_report
+            )
+            if slowdown is not None:
+                diff.changed.append(
+                    (ref_tool.name, 'benchmark:median') + slowdown
+                )
+            if resource_threshold is not None:
+                diff.changed.extend(
+                    (ref_tool.name, 'resources:' + k, r, c)
+                    for k, r, c in _regressed_resources(
+                        ref_tool.resources, comp_tool.resources,
+                        resource_threshold
+                    )
+                )
+        for comp_tool in comparison.tools:
+            if comp_tool.name not in ref_index and \
+                    comp_index[comp_tool.name] is comp_tool:
+                diff.added.append(comp_tool.name)
+        return diff
+
+    def as_dict(self):
+        """
+        Convert to a dict
+
+        Returns
+        -------
+        dict : dict
+            With ``added``, ``removed`` and ``changed`` keys, each change is
+            a dict with ``name``, ``field``, ``reference`` and ``comparison``
+            keys
+        """
+
+        return {
+            'added': list(self.added),
+            'removed': list(self.removed),
+            'changed': [
+                {
+                    'name': name,
+                    'field': field,
+                    'reference': ref_value,
+                    'comparison': comp_value
+                }
+                for name, field, ref_value, comp_value in self.changed
+            ]
+        }
+
+    def print_report(self, f):
+        """
+        Write a human readable description of the differences to *f*
+        """
+
+        for name, field, ref_value, comp_value in self.changed:
+            print('{0}\n\t{1}: {2} - {3}'.format(
+                name, field, ref_value, comp_value
+            ), file=f)
+        for name in self.removed:
+            print('{0}\n\tmissing from comparison'.format(name), file=f)
+        for name in self.added:
+            print('{0}\n\tnot in reference'.format(name), file=f)
+        if not self:
+            print("No mismatches found", file=f)
+
+    def save(self, path, diff_format='yaml'):
+        """
+        Write the differences to *path* as YAML or JSON.
+
+        Parameters
+        ----------
+        path : str
+            The path to write to
+        diff_format : str
+            One of :data:`DIFF_FORMATS`
+        """
+
+        if diff_format not in DIFF_FORMATS:
+            raise ValueError(
+                "Unknown diff format '{0}'".format(diff_format)
+            )
+        with open(path, 'w') as f:
+            if diff_format == 'json':
+                import json
+                json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+                f.write('\n')
+            else:
+                from .kitlist import yaml, Dumper
+                yaml.dump(
+                    self.as_dict(), f, explicit_start=True, Dumper=Dumper
+                )
+
+
+def _benchmark_slowdown(ref_report, comp_report):
+    """
+    Check whether the benchmark in *comp_report* is significantly slower
+    than that in *ref_report*
+
+    Returns
+    -------
+    medians : tuple or None
+        (reference median, comparison median) if it is slower
+    """
+
+    ref = (ref_report or {}).get('benchmark')
+    comp = (comp_report or {}).get('benchmark')
+    if not isinstance(ref, dict) or not isinstance(comp, dict):
+        return None
+    if None in (ref.get('ci_high'), comp.get('ci_low'), ref.get('median'),
+                comp.get('median')):
+        return None
+    if comp['ci_low'] > ref['ci_high'] and \
+            comp['median'] > ref['median'] * (1 + BENCHMARK_MIN_SLOWDOWN):
+        return ref['median'], comp['median']
+    return None
+
+
+def _regressed_resources(ref_resources, comp_resources, threshold):
+    """
+    Find the :data:`RESOURCE_FIELDS` which increased by more than
+    *threshold*
+
+    Returns
+    -------
+    regressed : list of tuple
+        (name, reference value, comparison value) in the order of
+        :data:`RESOURCE_FIELDS`
+    """
+
+    if not ref_resources or not comp_resources:
+        return []
+    regressed = []
+    for k in RESOURCE_FIELDS:
+        ref_value = ref_resources.get(k)
+        comp_value = comp_resources.get(k)
+        if ref_value is None or comp_value is None:
+            continue
+        if comp_value - ref_value >= RESOURCE_MINIMUMS[k] and \
+                comp_value > ref_value * (1 + threshold):
+            regressed.append((k, ref_value, comp_value))
+    return regressed
+
+
+def _changed_files(ref_report, comp_report):
+    """
+    Find the files whose descriptions differ between the ``files`` of two
+    test reports
+
+    Returns
+    -------
+    changed : list of tuple
+        (path, reference description, comparison description), sorted by
+        path, a description is None if the file is only in one report
+    """
+
+    ref_files = (ref_report or {}).get('files')
+    comp_files = (comp_report or {}).get('files')
+    if not isinstance(ref_files, dict) or not isinstance(comp_files, dict):
+        return []
+    return [
+        (path, ref_files.get(path), comp_files.get(path))
+        for path in sorted(set(ref_files) | set(comp_files))
+        if ref_files.get(path) != comp_files.get(path)
+    ]
@@ -0,0 +1,200 @@
+"""
+A cache of parsed KitLists so that large KitLists load quickly
+"""
+
+import errno
+import hashlib
+import io
+import logging
+import os
+import os.path
+import pickle
+import sys
+import tempfile
+import time
+from .cache import cache_home
+from .kitlist import KitList
+
+
+class CompiledKitListCache(object):
+    """
+    Stores parsed and validated KitLists as pickles.
+
+    A pickle is named after a hash of the KitList source, the toolaudit
+    version, :attr:`FORMAT_VERSION` and the code that parses KitLists, see
+    :meth:`code_digest`, so an edited KitList or a different toolaudit never
+    loads a stale entry.  Pickles which haven't been used for *max_age*
+    seconds are deleted when a new one is stored.  KitLists with
+    ``discover`` elements aren't stored because the tools found depend on
+    the files present when the KitList is read.
+
+    Parameters
+    ----------
+    directory : str
+        The directory pickles are kept in
+    max_age : float
+        The number of seconds an unused pickle is kept for
+    """
+
+    FORMAT_VERSION = 6
+
+    _code_digest = None
+
+    def __init__(self, directory, max_age=30 * 24 * 60 * 60):
+        self.directory = directory
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def default_path(cls):
+        """
+        The directory used by the toolaudit command
+
+        Returns
+        -------
+        path : str
+            ``kitlists`` in :func:`~toolaudit.cache.cache_home`
+        """
+
+        return os.path.join(cache_home(), 'kitlists')
+
+    def load(self, path):
+        """
+        Get the KitList at *path*, from the cache if it has been parsed
+        before.
+
+        Parameters
+        ----------
+        path : str
+            The KitList to read
+
+        Returns
+        -------
+        kitlist : :class:`~toolaudit.kitlist.KitList`
+        """
+
+        with open(path, 'rb') as f:
+            source = f.read()
+        cached_path = os.path.join(self.directory, self._key(source))
+        kitlist = self._load_pickle(cached_path)
+        if kitlist is not None:
+            self.hits += 1
+            return kitlist
+        self.misses += 1
+        kitlist = KitList()
+        kitlist.read_stream(
+            io.StringIO(source.decode('utf-8')),
+            os.path.dirname(os.path.abspath(path))
+        )
+        if kitlist.discovered:
+            return kitlist
+        try:
+            self._store(cached_path, kitlist)
+        except (IOError, OSError, pickle.PicklingError) as e:
+            logging.getLogger(__name__).warning(
+                "Can't cache the parsed kitlist: {0}".format(e)
+            )
+        return kitlist
+
+    def _key(self, source):
+        """
+        The file name of the pickle for the KitList *source*
+        """
+
+        from . import __version__
+        digest = hashlib.sha256()
+        digest.update('{0}:{1}:{2}:'.format(
+            self.FORMAT_VERSION, __version__, self.code_digest()
+        ).encode('utf-8'))
+        digest.update(source)
+        return digest.hexdigest() + '.pickle'
+
+    @classmethod
+    def code_digest(cls):
+        """
+        A hash of the code a pickle depends on: the source of
+        :mod:`toolaudit.kitlist`, the attributes of
+        :class:`~toolaudit.kitlist.AuditJob` and the Python version, so
+        changing how KitLists are parsed or stored invalidates the cache
+        even if the toolaudit version isn't changed.
+
+        Returns
+        -------
+        hexdigest : str
+        """
+
+        if cls._code_digest is None:
+            from . import kitlist
+            digest = hashlib.sha256()
+            digest.update('{0}:{1}:'.format(
+                sys.version_info[:2], kitlist.AuditJob.__slots__
+            ).encode('utf-8'))
+            source_path = kitlist.__file__
+            if source_path.endswith(('.pyc', '.pyo')):
+                source_path = source_path[:-1]
+            try:
+                with open(source_path, 'rb') as f:
+                    digest.update(f.read())
+            except (IOError, OSError):
+                pass
+            cls._code_digest = digest.hexdigest()
+        return cls._code_digest
+
+    @classmethod
+    def _load_pickle(cls, cached_path):
+        """
+        Unpickle a KitList, returning None if there's no usable pickle
+        """
+
+        try:
+            with open(cached_path, 'rb') as f:
+                kitlist = pickle.load(f)
+            os.utime(cached_path, None)
+        except (IOError, OSError):
+            return None
+        except Exception as e:  # pylint: disable=W0703
+            logging.getLogger(__name__).warning(
+                "Ignoring unreadable cached kitlist {0}: {1}".format(
+                    cached_path, e
+                )
+            )
+            return None
+        if not isinstance(kitlist, KitList):
+            return None
+        return kitlist
+
+    def _store(self, cached_path, kitlist):
+        """
+        Pickle *kitlist* atomically and delete old pickles
+        """
+
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(kitlist, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, cached_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+        self._prune(time.time())
+
+    def _prune(self, now):
+        """
+        Delete pickles which haven't been used for *max_age* seconds
+        """
+
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pickle'):
+                continue
+            p = os.path.join(self.directory, name)
+            try:
+                if os.stat(p).st_mtime < now - self.max_age:
+                    os.remove(p)
+            except OSError:
+                pass
@@ -0,0 +1,156 @@
+"""
+Finding tools by searching directories
+"""
+
+import fnmatch
+import glob
+import os
+import os.path
+from multiprocessing.pool import ThreadPool
+from six import string_types
+from . import hashing
+
+
+def expand(element, base_dir=None):
+    """
+    Find the files described by a ``discover`` element of a KitList.
+
+    The element's ``path`` is a directory or a glob pattern.  Files matching
+    the pattern and files in matching directories, or in their
+    subdirectories if ``recursive`` is true, are found.  A file is kept if
+    its name matches one of the ``include`` patterns and none of the
+    ``exclude`` patterns, and unless ``executable`` is false, if it is an
+    executable regular file.
+
+    Each tool is named using the ``name`` template, which may refer to
+    ``{name}``, the file name, and ``{relpath}``, the path relative to the
+    directory searched.  The default is ``{name}``.
+
+    Parameters
+    ----------
+    element : dict
+        The ``discover`` element
+    base_dir : str or None
+        The directory relative paths are relative to, the tool paths are
+        still relative.  Defaults to the working directory.
+
+    Returns
+    -------
+    tools : list of tuple
+        (name, path) for each file found, sorted by path
+    """
+
+    if not isinstance(element, dict) or 'path' not in element:
+        raise(KeyError('A discover element must give a path'))
+    include = _patterns(element.get('include', '*'))
+    exclude = _patterns(element.get('exclude', []))
+    recursive = element.get('recursive', False)
+    executable = element.get('executable', True)
+    template = element.get('name', '{name}')
+    pattern = element['path']
+    if base_dir is not None and not os.path.isabs(pattern):
+        prefix = base_dir
+    else:
+        prefix = ''
+    found = {}
+    for match in glob.glob(os.path.join(prefix, pattern)):
+        if os.path.isdir(match):
+            candidates = _walk(match, recursive)
+        else:
+            candidates = [(match, os.path.dirname(match))]
+        for full_path, top in candidates:
+            file_name = os.path.basename(full_path)
+            if not any(fnmatch.fnmatch(file_name, p) for p in include):
+                continue
+            if any(fnmatch.fnmatch(file_name, p) for p in exclude):
+                continue
+            if executable and not _is_executable(full_path):
+                continue
+            if prefix:
+                path = os.path.relpath(full_path, prefix)
+            else:
+                path = full_path
+            name = template.format(
+                name=file_name, relpath=os.path.relpath(full_path, top)
+            )
+            found[path] = name
+    return [(found[p], p) for p in sorted(found)]
+
+
+def _patterns(value):
+    if isinstance(value, string_types):
+        return [value]
+    return list(value)
+
+
+def _walk(directory, recursive):
+    """
+    List the files in *directory*, with the directory
+    """
+
+    if not recursive:
+        return [
+            (os.path.join(directory, f), directory)
+            for f in os.listdir(directory)
+            if not os.path.isdir(os.path.join(directory, f))
+        ]
+    files = []
+    for root, _, names in os.walk(directory):
+        files.extend((os.path.join(root, f), directory) for f in names)
+    return files
+
+
+def _is_executable(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def hash_tools(session, tools, jobs=None):
+    """
+    Calculate the checksums of the binaries of *tools* in parallel so they
+    are ready when each tool is audited.
+
+    Files are hashed in inode order, which on most filesystems is close to
+    the order they are stored in, to reduce seeking.
+
+    Parameters
+    ----------
+    session : :class:`~toolaudit.session.AuditSession`
+        The session the tools will be audited in, the checksums are shared
+        through it
+    tools : list of :class:`~toolaudit.kitlist.AuditJob`
+        Tools with their hash algorithms set
+    jobs : int or None
+        The number of files to hash at once, defaults to
+        :data:`~toolaudit.hashing.DEFAULT_HASH_JOBS`
+    """
+
+    if jobs is None:
+        jobs = hashing.DEFAULT_HASH_JOBS
+
+    keyed = []
+    for tool in tools:
+        try:
+            stat = os.stat(tool.path)
+        except OSError:
+            continue
+        keyed.append(((stat.st_dev, stat.st_ino), tool))
+    keyed.sort(key=lambda k: k[0])
+
+    def checksum(tool):
+        # Errors are stored by the session and raised when the tool is
+        # audited.
+        try:
+            session.checksum(tool.path, tool.hash_algorithm)
+        except Exception:  # pylint: disable=W0703
+            pass
+    ordered = [tool for _, tool in keyed]
+    if jobs <= 1 or len(ordered) <= 1:
+        for tool in ordered:
+            checksum(tool)
+        return
+    pool = ThreadPool(min(jobs, len(ordered)))
+    try:
+        pool.map(checksum, ordered, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
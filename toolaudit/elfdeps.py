@@ -0,0 +1,411 @@
+"""
+Finding the shared libraries an ELF binary loads, without running it
+"""
+
+from collections import namedtuple
+import glob
+import os
+import os.path
+import struct
+import threading
+from .probes import SharedWork
+
+
+ELF_MAGIC = b'\x7fELF'
+
+_PT_LOAD = 1
+_PT_DYNAMIC = 2
+_PT_INTERP = 3
+
+_DT_NULL = 0
+_DT_NEEDED = 1
+_DT_STRTAB = 5
+_DT_RPATH = 15
+_DT_RUNPATH = 29
+
+_SHT_NOBITS = 8
+
+# Searched after the directories in ld.so.conf, as by the dynamic linker
+DEFAULT_DIRS = ('/lib64', '/usr/lib64', '/lib', '/usr/lib')
+
+
+class ElfInfo(namedtuple(
+    'ElfInfo',
+    ['elf_class', 'machine', 'interpreter', 'needed', 'rpath', 'runpath']
+)):
+    """
+    The dynamic linking information of an ELF file
+
+    Attributes
+    ----------
+    elf_class : int
+        1 for 32 bit files, 2 for 64 bit
+    machine : int
+        The ``e_machine`` field, the instruction set
+    interpreter : str or None
+        The dynamic linker named by ``PT_INTERP``
+    needed : tuple of str
+        The ``DT_NEEDED`` library names
+    rpath : tuple of str
+        The ``DT_RPATH`` directories
+    runpath : tuple of str
+        The ``DT_RUNPATH`` directories
+    """
+
+    __slots__ = ()
+
+
+def read_elf(path):
+    """
+    Read the dynamic linking information of an ELF file
+
+    Parameters
+    ----------
+    path : str
+        The file to read
+
+    Returns
+    -------
+    info : :class:`ElfInfo` or None
+        None if the file isn't an ELF file
+    """
+
+    with open(path, 'rb') as f:
+        ident = f.read(16)
+        if len(ident) < 16 or ident[:4] != ELF_MAGIC:
+            return None
+        elf_class, formats = _formats(ident)
+        if formats is None:
+            return None
+        header, phdr, dyn = formats[:3]
+        fields = header.unpack(f.read(header.size))
+        machine, phoff, phentsize, phnum = \
+            fields[1], fields[4], fields[8], fields[9]
+        segments = []
+        f.seek(phoff)
+        for _ in range(phnum):
+            entry = phdr.unpack(f.read(phentsize)[:phdr.size])
+            if elf_class == 2:
+                p_type, _, offset, vaddr, _, filesz, _, _ = entry
+            else:
+                p_type, offset, vaddr, _, filesz, _, _, _ = entry
+            segments.append((p_type, offset, vaddr, filesz))
+        interpreter = None
+        dynamic = []
+        for p_type, offset, vaddr, filesz in segments:
+            if p_type == _PT_INTERP:
+                f.seek(offset)
+                interpreter = _decode(f.read(filesz).split(b'\0')[0])
+            elif p_type == _PT_DYNAMIC:
+                f.seek(offset)
+                data = f.read(filesz)
+                for i in range(0, len(data) - dyn.size + 1, dyn.size):
+                    tag, value = dyn.unpack_from(data, i)
+                    if tag == _DT_NULL:
+                        break
+                    dynamic.append((tag, value))
+        strtab = [v for t, v in dynamic if t == _DT_STRTAB]
+        if not strtab:
+            return ElfInfo(elf_class, machine, interpreter, (), (), ())
+        strtab_offset = _file_offset(segments, strtab[0])
+
+        def string(index):
+            f.seek(strtab_offset + index)
+            chunk = b''
+            while b'\0' not in chunk:
+                more = f.read(256)
+                if not more:
+                    break
+                chunk += more
+            return _decode(chunk.split(b'\0')[0])
+
+        def strings(tag):
+            return tuple(string(v) for t, v in dynamic if t == tag)
+
+        def paths(tag):
+            return tuple(
+                d for s in strings(tag) for d in s.split(':') if d
+            )
+        return ElfInfo(elf_class, machine, interpreter, strings(_DT_NEEDED),
+                       paths(_DT_RPATH), paths(_DT_RUNPATH))
+
+
+def find_section(path, name):
+    """
+    Find where a section of an ELF file is stored
+
+    Parameters
+    ----------
+    path : str
+        The ELF file
+    name : str
+        The section name, for example ``.rodata``
+
+    Returns
+    -------
+    location : tuple or None
+        (offset, size) of the section's contents in the file, None if
+        *path* isn't an ELF file or has no section called *name* stored in
+        the file
+    """
+
+    with open(path, 'rb') as f:
+        ident = f.read(16)
+        if len(ident) < 16 or ident[:4] != ELF_MAGIC:
+            return None
+        _, formats = _formats(ident)
+        if formats is None:
+            return None
+        header, shdr = formats[0], formats[3]
+        fields = header.unpack(f.read(header.size))
+        shoff, shentsize, shnum, shstrndx = \
+            fields[5], fields[10], fields[11], fields[12]
+        if not shoff or shstrndx >= shnum:
+            return None
+        f.seek(shoff)
+        sections = [
+            shdr.unpack(f.read(shentsize)[:shdr.size]) for _ in range(shnum)
+        ]
+        names = sections[shstrndx]
+        f.seek(names[4])
+        strings = f.read(names[5])
+    wanted = name.encode('utf-8')
+    for section in sections:
+        sh_name, sh_type, _, _, offset, size = section[:6]
+        if sh_type == _SHT_NOBITS:
+            continue
+        if strings[sh_name:].split(b'\0', 1)[0] == wanted:
+            return offset, size
+    return None
+
+
+def _formats(ident):
+    """
+    Get the ELF class and the structs of the file header, program header,
+    dynamic entry and section header of a file with the identification
+    bytes *ident*
+    """
+
+    elf_class = bytearray(ident)[4]
+    order = '<' if bytearray(ident)[5] == 1 else '>'
+    if elf_class == 2:
+        formats = ('HHIQQQIHHHHHH', 'IIQQQQQQ', 'qQ', 'IIQQQQIIQQ')
+    elif elf_class == 1:
+        formats = ('HHIIIIIHHHHHH', 'IIIIIIII', 'iI', 'IIIIIIIIII')
+    else:
+        return elf_class, None
+    return elf_class, tuple(struct.Struct(order + f) for f in formats)
+
+
+def _file_offset(segments, address):
+    """
+    Convert a virtual address to an offset in the file
+    """
+
+    for p_type, offset, vaddr, filesz in segments:
+        if p_type == _PT_LOAD and vaddr <= address < vaddr + filesz:
+            return address - vaddr + offset
+    return address
+
+
+def _decode(value):
+    return value.decode('utf-8', 'replace')
+
+
+class DependencyResolver(object):
+    """
+    Finds the shared libraries loaded by ELF binaries in the same way as the
+    dynamic linker.
+
+    Libraries are searched for in the ``DT_RPATH`` of the requesting object
+    and of the executable, unless the requesting object has a
+    ``DT_RUNPATH``, then in ``LD_LIBRARY_PATH``, the ``DT_RUNPATH``, the
+    directories in ``ld.so.conf`` and the default directories.  A library
+    is only used if it has the same ELF class and machine as the binary.
+    ``$ORIGIN``, ``$LIB`` and ``$PLATFORM`` are expanded in search paths.
+
+    Each file is only read once, so one resolver should be shared by all the
+    tools in a run.
+
+    Parameters
+    ----------
+    library_path : str or None
+        Used as ``LD_LIBRARY_PATH``, defaults to the environment variable
+    config : str
+        The dynamic linker's configuration file
+    """
+
+    def __init__(self, library_path=None, config='/etc/ld.so.conf'):
+        if library_path is None:
+            library_path = os.environ.get('LD_LIBRARY_PATH', '')
+        self.library_path = tuple(d for d in library_path.split(':') if d)
+        self.config = config
+        self._elf = SharedWork()
+        self._found = {}
+        self._system_dirs = None
+        self._lock = threading.Lock()
+
+    def elf_info(self, path):
+        """
+        Read the dynamic linking information of *path*, see
+        :func:`read_elf`.  None is returned for files which can't be read.
+        """
+
+        return self._elf.get(os.path.realpath(path), self._read, path)
+
+    @classmethod
+    def _read(cls, path):
+        try:
+            return read_elf(path)
+        except (IOError, OSError, struct.error):
+            return None
+
+    def closure(self, path):
+        """
+        Find all the libraries loaded when *path* is run
+
+        Parameters
+        ----------
+        path : str
+            An executable or shared library
+
+        Returns
+        -------
+        dependencies : tuple or None
+            (libraries, missing) where libraries is a sorted list of the
+            paths of the dynamic linker and every library loaded, directly
+            or indirectly, and missing is a sorted list of the names of
+            libraries which couldn't be found.  None if *path* isn't a
+            dynamically linked ELF file.
+        """
+
+        exe = self.elf_info(path)
+        if exe is None or (exe.interpreter is None and not exe.needed):
+            return None
+        found = set()
+        missing = set()
+        seen = set()
+        if exe.interpreter:
+            if os.path.exists(exe.interpreter):
+                found.add(exe.interpreter)
+            else:
+                missing.add(exe.interpreter)
+            # Libraries which need the dynamic linker get the loaded copy
+            seen.add(os.path.basename(exe.interpreter))
+        queue = [(os.path.abspath(path), exe)]
+        while queue:
+            obj_path, obj = queue.pop(0)
+            for name in obj.needed:
+                if name in seen:
+                    continue
+                seen.add(name)
+                lib = self._find(name, obj_path, obj, path, exe)
+                if lib is None:
+                    missing.add(name)
+                    continue
+                found.add(lib)
+                info = self.elf_info(lib)
+                if info is not None:
+                    queue.append((lib, info))
+        return sorted(found), sorted(missing)
+
+    def _find(self, name, obj_path, obj, exe_path, exe):
+        """
+        Find the library *name* needed by the object *obj*
+        """
+
+        if '/' in name:
+            candidates = [name]
+            dirs = ()
+        else:
+            candidates = None
+            dirs = []
+            if not obj.runpath:
+                dirs.extend(self._expand(obj.rpath, obj_path, obj))
+                if obj is not exe:
+                    dirs.extend(self._expand(exe.rpath, exe_path, exe))
+            dirs.extend(self.library_path)
+            dirs.extend(self._expand(obj.runpath, obj_path, obj))
+            dirs.extend(self.system_dirs())
+            dirs = tuple(dirs)
+        key = (name, dirs, obj.elf_class, obj.machine)
+        with self._lock:
+            if key in self._found:
+                return self._found[key]
+        if candidates is None:
+            candidates = [os.path.join(d, name) for d in dirs]
+        result = None
+        for candidate in candidates:
+            if not os.path.isfile(candidate):
+                continue
+            info = self.elf_info(candidate)
+            if info is not None and info.elf_class == obj.elf_class and \
+                    info.machine == obj.machine:
+                result = os.path.normpath(candidate)
+                break
+        with self._lock:
+            self._found[key] = result
+        return result
+
+    @classmethod
+    def _expand(cls, dirs, obj_path, obj):
+        """
+        Substitute the dynamic string tokens in search directories
+        """
+
+        origin = os.path.dirname(os.path.realpath(obj_path))
+        lib = 'lib64' if obj.elf_class == 2 else 'lib'
+        platform = os.uname()[4]
+        expanded = []
+        for d in dirs:
+            for token, value in (('ORIGIN', origin), ('LIB', lib),
+                                 ('PLATFORM', platform)):
+                d = d.replace('${' + token + '}', value)
+                d = d.replace('$' + token, value)
+            expanded.append(d)
+        return expanded
+
+    def system_dirs(self):
+        """
+        The directories listed in the dynamic linker's configuration
+        followed by :data:`DEFAULT_DIRS`
+        """
+
+        with self._lock:
+            if self._system_dirs is None:
+                dirs = _read_config(self.config, set())
+                dirs.extend(d for d in DEFAULT_DIRS if d not in dirs)
+                self._system_dirs = tuple(dirs)
+            return self._system_dirs
+
+
+def _read_config(path, visited):
+    """
+    Read the directories from an ``ld.so.conf`` file and those it includes
+    """
+
+    if path in visited:
+        return []
+    visited.add(path)
+    try:
+        with open(path) as f:
+            lines = f.readlines()
+    except (IOError, OSError):
+        return []
+    dirs = []
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line or line.startswith('hwcap '):
+            continue
+        if line.startswith('include '):
+            pattern = line.split(None, 1)[1]
+            if not os.path.isabs(pattern):
+                pattern = os.path.join(os.path.dirname(path), pattern)
+            for included in sorted(glob.glob(pattern)):
+                dirs.extend(
+                    d for d in _read_config(included, visited)
+                    if d not in dirs
+                )
+        elif line not in dirs:
+            dirs.append(line)
+    return dirs
@@ -0,0 +1,93 @@
+"""
+A persistent cache of file checksums keyed on file metadata
+"""
+
+import os
+import os.path
+import time
+from .cache import JsonCache
+from . import hashing
+from . import readers
+
+
+class HashCache(JsonCache):
+    """
+    Stores file checksums on disk so that unchanged files aren't re-read.
+
+    An entry is reused only while the device, inode, size, modification time
+    and change time of the file are the same as when it was hashed.  See
+    :class:`~toolaudit.cache.JsonCache` for the eviction policy.
+    """
+
+    FORMAT_VERSION = 2
+    FILE_NAME = 'hashes.db'
+
+    # Files modified this recently may be modified again without their mtime
+    # changing so their checksums aren't cached.
+    RACY_INTERVAL = 2.0
+
+    def checksum(self, path, algorithm=hashing.DEFAULT_ALGORITHM):
+        """
+        Get the checksum of the file at *path*, hashing it only if it has
+        changed since it was last hashed.
+
+        Parameters
+        ----------
+        path : str
+            The file to checksum
+        algorithm : str
+            One of :data:`toolaudit.hashing.ALGORITHMS`
+
+        Returns
+        -------
+        hexdigest : str
+            The checksum of the file
+        """
+
+        path = os.path.abspath(path)
+        key = stat_key(path)
+        with self._lock:
+            entry = self._get(path)
+            if entry is not None and entry['stat'] == key and \
+                    algorithm in entry['digests']:
+                self.hits += 1
+                self._touch(path, entry)
+                return entry['digests'][algorithm]
+            self.misses += 1
+        digest = readers.file_checksum(path, algorithm)
+        now = time.time()
+        if stat_key(path) == key and \
+                key[3] < (now - self.RACY_INTERVAL) * 1e9:
+            with self._lock:
+                entry = self._get(path)
+                if entry is None or entry['stat'] != key:
+                    entry = {'stat': key, 'digests': {}}
+                entry['digests'][algorithm] = digest
+                self._put(path, entry)
+        return digest
+
+
+def stat_key(path):
+    """
+    The metadata which identifies a particular version of a file
+
+    Parameters
+    ----------
+    path : str
+        The file to stat
+
+    Returns
+    -------
+    key : list of int
+        The device, inode, size, modification time and change time of the
+        file, times are in nanoseconds
+    """
+
+    st = os.stat(path)
+    return [
+        st.st_dev,
+        st.st_ino,
+        st.st_size,
+        getattr(st, 'st_mtime_ns', int(st.st_mtime * 1e9)),
+        getattr(st, 'st_ctime_ns', int(st.st_ctime * 1e9))
+    ]
@@ -0,0 +1,204 @@
+"""
+Functions for checksumming files and strings
+"""
+
+import hashlib
+import io
+import mmap
+import os
+import threading
+
+
+# The algorithms toolaudit can use, ALGORITHMS are those of them that
+# hashlib provides on this Python, blake2b needs Python 3.6.
+SUPPORTED_ALGORITHMS = ('sha1', 'sha256', 'sha512', 'blake2b', 'md5')
+ALGORITHMS = tuple(
+    a for a in SUPPORTED_ALGORITHMS
+    if a in getattr(hashlib, 'algorithms_available',
+                    ('md5', 'sha1', 'sha224', 'sha256', 'sha384', 'sha512'))
+)
+DEFAULT_ALGORITHM = 'sha1'
+
+# Files are read into a reusable buffer of this many bytes.
+BLOCK_SIZE = 2**20
+
+# Files at least this large are memory mapped instead of read.
+MMAP_THRESHOLD = 2**26
+
+
+def _cpu_count():
+    try:
+        return os.cpu_count() or 1
+    except AttributeError:  # Python 2, without importing multiprocessing
+        try:
+            return os.sysconf('SC_NPROCESSORS_ONLN') or 1
+        except (AttributeError, ValueError, OSError):
+            return 1
+
+
+# The number of files hashed at once.  Hashing mostly waits for the disk,
+# and hashlib releases the GIL while it works, so more threads than CPUs are
+# used.
+DEFAULT_HASH_JOBS = min(32, _cpu_count() * 4)
+
+_buffers = threading.local()
+
+
+def new(algorithm=DEFAULT_ALGORITHM):
+    """
+    Create a new hash object
+
+    Parameters
+    ----------
+    algorithm : str
+        One of :data:`ALGORITHMS`
+
+    Returns
+    -------
+    hash : hashlib hash object
+
+    Raises
+    ------
+    ValueError
+        If *algorithm* isn't supported
+    """
+
+    if algorithm not in ALGORITHMS:
+        raise ValueError(
+            "Unknown hash algorithm '{0}', expected one of: {1}".format(
+                algorithm, ', '.join(ALGORITHMS)
+            )
+        )
+    return hashlib.new(algorithm)
+
+
+def hash_file(path, algorithm=DEFAULT_ALGORITHM):
+    """
+    Calculate the checksum of a file.
+
+    Small files are read in :data:`BLOCK_SIZE` blocks into a buffer that is
+    reused between calls in the same thread, large files are memory mapped.
+
+    Parameters
+    ----------
+    path : str
+        The file to checksum
+    algorithm : str
+        One of :data:`ALGORITHMS`
+
+    Returns
+    -------
+    hexdigest : str
+        The checksum of the file
+    """
+
+    digest = new(algorithm)
+    with io.open(path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            _update_mapped(digest, f, size)
+        else:
+            _update_read(digest, f)
+    return digest.hexdigest()
+
+
+def hash_stream(stream, algorithm=DEFAULT_ALGORITHM):
+    """
+    Calculate the checksum of everything that can be read from a binary
+    stream, such as a pipe, without holding more than :data:`BLOCK_SIZE`
+    bytes of it in memory.
+
+    Parameters
+    ----------
+    stream : file object
+        A binary stream with a ``readinto`` method
+    algorithm : str
+        One of :data:`ALGORITHMS`
+
+    Returns
+    -------
+    hexdigest : str
+        The checksum of the data read
+    size : int
+        The number of bytes read
+    """
+
+    digest = new(algorithm)
+    size = _update_read(digest, stream)
+    return digest.hexdigest(), size
+
+
+def hash_string(text, algorithm=DEFAULT_ALGORITHM):
+    """
+    Calculate the checksum of a string
+
+    Parameters
+    ----------
+    text : bytes
+        The string to be checksummed
+    algorithm : str
+        One of :data:`ALGORITHMS`
+
+    Returns
+    -------
+    hexdigest : str
+        The checksum of the string
+    """
+
+    digest = new(algorithm)
+    digest.update(text)
+    return digest.hexdigest()
+
+
+def _get_buffer():
+    """
+    Get this thread's read buffer
+    """
+
+    buf = getattr(_buffers, 'buf', None)
+    if buf is None:
+        buf = bytearray(BLOCK_SIZE)
+        _buffers.buf = buf
+    return buf
+
+
+def _update_read(digest, f):
+    """
+    Update *digest* with the contents of the file *f* and return the number
+    of bytes read
+    """
+
+    buf = _get_buffer()
+    view = memoryview(buf)
+    size = 0
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+        digest.update(view[:n])
+        size += n
+    return size
+
+
+def _update_mapped(digest, f, size):
+    """
+    Update *digest* with the first *size* bytes of the file *f* by memory
+    mapping it
+    """
+
+    mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    try:
+        try:
+            view = memoryview(mapped)
+        except TypeError:
+            # On Python 2 mmaps only have the old buffer interface
+            for start in range(0, size, MMAP_THRESHOLD):
+                digest.update(buffer(mapped, start, MMAP_THRESHOLD))  # noqa
+            return
+        try:
+            for start in range(0, size, MMAP_THRESHOLD):
+                digest.update(view[start:start + MMAP_THRESHOLD])
+        finally:
+            view.release()
+    finally:
+        mapped.close()
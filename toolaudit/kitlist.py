@@ -4,14 +4,19 @@ Contains the KitList class
 
 from __future__ import print_function
 from collections import namedtuple
+import json
+import os.path
 import sys
 import yaml
 try:
     from yaml import CLoader as Loader, CDumper as Dumper
 except ImportError:
     from yaml import Loader, Dumper
-from . import readers
-from . import testers
+from . import hashing
+from . import ndjson
+from .probes import freeze
+from .registry import PluginRegistry
+from . import staging
 from six import iteritems
 
 
@@ -22,10 +27,23 @@ Tester = namedtuple('Tester', ['name', 'func', 'args'])
 class AuditJob(object):  # pylint: disable=R0903
     """
     The audit of a single tool
+
+    Attributes are slotted to keep KitLists of many thousands of tools
+    small, arbitrary attributes can't be added.
     """
 
+    __slots__ = (
+        'name', 'path', 'reader', 'tester', 'version', 'checksum',
+        'output_checksum', 'hash_algorithm', 'test_report', 'output_cached',
+        'file_stats', 'timeout', 'status', 'timings', 'dependency_checksum',
+        'resources'
+    )
+
     def __init__(self, name, path, reader, tester=None, version=None,
-                 checksum=None, output_checksum=None):
+                 checksum=None, output_checksum=None, hash_algorithm=None,
+                 test_report=None, output_cached=None, file_stats=None,
+                 timeout=None, status=None, timings=None,
+                 dependency_checksum=None, resources=None):
         self.name = name
         self.path = path
         self.reader = reader
@@ -33,9 +51,20 @@ class AuditJob(object):  # pylint: disable=R0903
         self.version = version
         self.checksum = checksum
         self.output_checksum = output_checksum
+        self.hash_algorithm = hash_algorithm
+        self.test_report = test_report
+        self.output_cached = output_cached
+        self.file_stats = file_stats
+        self.timeout = timeout
+        self.status = status
+        self.timings = timings
+        self.dependency_checksum = dependency_checksum
+        self.resources = resources
 
     def __repr__(self):
-        r = "{0}({1!r}, {2!r}, {3!r}, {4!r}, {5!r}, {6!r}, {7!r}, {8!r})"
+        r = "{0}({1!r}, {2!r}, {3!r}, {4!r}, {5!r}, {6!r}, {7!r}, {8!r}, " \
+            "{9!r}, {10!r}, {11!r}, {12!r}, {13!r}, {14!r}, {15!r}, {16!r}, " \
+            "{17!r})"
         return r.format(
             'AuditJob',
             self.name,
@@ -44,13 +73,27 @@ class AuditJob(object):  # pylint: disable=R0903
             self.tester,
             self.version,
             self.checksum,
-            self.output_checksum
+            self.output_checksum,
+            self.hash_algorithm,
+            self.test_report,
+            self.output_cached,
+            self.file_stats,
+            self.timeout,
+            self.status,
+            self.timings,
+            self.dependency_checksum,
+            self.resources
         )
 
     def as_dict(self):
         """
         Convert to a dict
 
+        Fields which are None are left out, as is ``output_cached`` unless
+        the result was cached.  ``file_stats`` is never included, it is saved
+        separately by :meth:`KitList.save_file_stats` so that identical
+        audits give identical output.
+
         Returns
         -------
         dict : AuditJob
@@ -65,36 +108,160 @@ class AuditJob(object):  # pylint: disable=R0903
                 tester_dict[k] = v
         else:
             tester_dict = None
-        return {
+        fields = {
             'name': self.name,
             'path': self.path,
             'reader': reader_dict,
             'tester': tester_dict,
             'version': self.version,
             'checksum': self.checksum,
-            'output_checksum': self.output_checksum
+            'output_checksum': self.output_checksum,
+            'hash_algorithm': self.hash_algorithm,
+            'test_report': self.test_report,
+            'output_cached': self.output_cached or None,
+            'timeout': self.timeout,
+            'status': self.status,
+            'timings': self.timings,
+            'dependency_checksum': self.dependency_checksum,
+            'resources': self.resources
         }
+        return dict((k, v) for k, v in iteritems(fields) if v is not None)
+
+
+def _read_yaml(f, convert):
+    """
+    Read a YAML KitList, converting each element of its ``tools`` sequence
+    as soon as it has been parsed so the whole document is never held in
+    memory.
+
+    Parameters
+    ----------
+    f : file object
+        The file to read
+    convert : callable
+        Called with each tool element, returns a list of tools
+
+    Returns
+    -------
+    data : object
+        The document, without its ``tools`` element if that was converted
+    tools : list or None
+        The tools returned by *convert*, None if the document isn't a
+        mapping with a ``tools`` sequence
+    """
+
+    loader = Loader(f)
+    try:
+        loader.get_event()
+        if loader.check_event(yaml.StreamEndEvent):
+            return None, None
+        loader.get_event()
+        anchors = {}
+        if not loader.check_event(yaml.MappingStartEvent):
+            return loader.construct_document(
+                _compose_node(loader, anchors)
+            ), None
+        loader.get_event()
+        data = {}
+        tools = None
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = loader.construct_document(_compose_node(loader, anchors))
+            if key == 'tools' and loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                tools = []
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    tools.extend(convert(loader.construct_document(
+                        _compose_node(loader, anchors)
+                    )))
+                loader.get_event()
+            else:
+                data[key] = loader.construct_document(
+                    _compose_node(loader, anchors)
+                )
+        return data, tools
+    finally:
+        loader.dispose()
+
+
+def _compose_node(loader, anchors):
+    """
+    Build the node of the next value from the events of *loader*, like
+    PyYAML's composer, which the libyaml loader doesn't expose
+    """
+
+    event = loader.get_event()
+    if isinstance(event, yaml.AliasEvent):
+        if event.anchor not in anchors:
+            raise yaml.composer.ComposerError(
+                None, None, "found undefined alias {0!r}".format(
+                    event.anchor
+                ), event.start_mark
+            )
+        return anchors[event.anchor]
+    if isinstance(event, yaml.ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.ScalarNode, event.value, event.implicit)
+        node = yaml.ScalarNode(tag, event.value, event.start_mark,
+                               event.end_mark, style=event.style)
+    elif isinstance(event, yaml.SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.SequenceNode, None, event.implicit)
+        node = yaml.SequenceNode(tag, [], event.start_mark, None,
+                                 flow_style=event.flow_style)
+    else:
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = loader.resolve(yaml.MappingNode, None, event.implicit)
+        node = yaml.MappingNode(tag, [], event.start_mark, None,
+                                flow_style=event.flow_style)
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    if isinstance(node, yaml.SequenceNode):
+        while not loader.check_event(yaml.SequenceEndEvent):
+            node.value.append(_compose_node(loader, anchors))
+        node.end_mark = loader.get_event().end_mark
+    elif isinstance(node, yaml.MappingNode):
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = _compose_node(loader, anchors)
+            node.value.append((key, _compose_node(loader, anchors)))
+        node.end_mark = loader.get_event().end_mark
+    return node
 
 
 class KitList(object):
     """
     Represents a list of applications used in a pipeline and the procedure
     used to check each applications version
+
+    Tools read together which have identical reader or tester definitions
+    share a single :class:`Reader` or :class:`Tester`, so their arguments
+    must not be modified in place.
     """
 
-    reader_functions = {
-        'command_line': readers.command_line,
-        'line_in_file': readers.line_in_file,
-        'manual': readers.manual
-    }
+    __slots__ = ('tools', 'staging', 'discovered', '_index', '_indexed')
+
+    reader_functions = PluginRegistry('toolaudit.readers', {
+        'binary_string': 'toolaudit.readers:binary_string',
+        'command_line': 'toolaudit.readers:command_line',
+        'line_in_file': 'toolaudit.readers:line_in_file',
+        'manual': 'toolaudit.readers:manual'
+    })
 
-    tester_functions = {
-        'stdout': testers.stdout,
-        'file': testers.fileout
-    }
+    tester_functions = PluginRegistry('toolaudit.testers', {
+        'benchmark': 'toolaudit.testers:benchmark',
+        'stdout': 'toolaudit.testers:stdout',
+        'file': 'toolaudit.testers:fileout',
+        'tree': 'toolaudit.testers:treeout'
+    })
 
     def __init__(self):
         self.tools = []
+        self.staging = None
+        self.discovered = False
+        self._index = None
+        self._indexed = None
 
     @classmethod
     def from_file(cls, path):
@@ -119,7 +286,8 @@ class KitList(object):
 
     def read(self, path):
         """
-        Read a saved KitList in YAML format
+        Read a saved KitList in YAML format, or in the NDJSON format written
+        by :class:`~toolaudit.ndjson.NdjsonWriter`
 
         Parameters
         ----------
@@ -128,31 +296,125 @@ class KitList(object):
         """
 
         with open(path, 'r') as f:
-            yaml_data = yaml.load(f, Loader=Loader)
-        if 'tools' not in yaml_data:
+            self.read_stream(f, os.path.dirname(os.path.abspath(path)))
+
+    def read_stream(self, f, base_dir=None):
+        """
+        Read a saved KitList from a seekable text file object, see
+        :meth:`read`
+
+        Parameters
+        ----------
+        f : file object
+            The file to read
+        base_dir : str or None
+            The directory relative paths in ``discover`` elements are
+            relative to, defaults to the working directory
+        """
+
+        specs = {}
+        self.discovered = False
+
+        def convert(tool):
+            if 'discover' in tool:
+                self.discovered = True
+                return self._discover_tools(tool, base_dir, specs)
+            return [self._parse_tool_element(tool, specs)]
+        first_line = f.readline()
+        f.seek(0)
+        if ndjson.is_ndjson(first_line):
+            yaml_data, tools = ndjson.load(f), None
+        else:
+            yaml_data, tools = _read_yaml(f, convert)
+        if tools is None and isinstance(yaml_data, dict) and \
+                'tools' in yaml_data:
+            tools = []
+            for tool in yaml_data['tools']:
+                tools.extend(convert(tool))
+        if tools is None:
             raise(KeyError(
                 'The kitlist provided does not contain a tools element'
             ))
-        tools = []
-        for tool in yaml_data['tools']:
-            tool_name = tool['name']
-            tool_path = tool['path']
-            reader = self._parse_reader_element(tool['reader'])
-            if 'test' in tool:
-                tester = self._parse_tester_element(tool['test'])
-            else:
-                tester = None
-            audit_job = AuditJob(
-                tool_name, tool_path,
-                reader,
-                tester,
-                tool.get('version', None),
-                tool.get('checksum', None),
-                tool.get('output_checksum', None)
-            )
-            tools.append(audit_job)
+        self.staging = yaml_data.get('staging', None)
+        staging.parse_staging(self.staging)
         self.tools = tools
 
+    @classmethod
+    def _parse_tool_element(cls, tool, specs=None):
+        """
+        Take a tool element read from a KitList file and convert it to an
+        AuditJob
+        """
+        reader = cls._intern(cls._parse_reader_element(tool['reader']), specs)
+        tester = cls._intern(cls._parse_optional_tester(tool), specs)
+        return AuditJob(
+            tool['name'], tool['path'],
+            reader,
+            tester,
+            tool.get('version', None),
+            tool.get('checksum', None),
+            tool.get('output_checksum', None),
+            cls._parse_hash_algorithm(tool),
+            tool.get('test_report', None),
+            tool.get('output_cached', None),
+            tool.get('file_stats', None),
+            tool.get('timeout', None),
+            tool.get('status', None),
+            tool.get('timings', None),
+            tool.get('dependency_checksum', None),
+            tool.get('resources', None)
+        )
+
+    @classmethod
+    def _intern(cls, spec, specs):
+        """
+        Get the :class:`Reader` or :class:`Tester` in *specs* defined in the
+        same way as *spec*, adding *spec* if there isn't one
+        """
+        if spec is None or specs is None:
+            return spec
+        # repr keeps values which compare equal, like 1 and True, apart
+        key = (type(spec), spec.name, repr(freeze(spec.args)))
+        return specs.setdefault(key, spec)
+
+    @classmethod
+    def _discover_tools(cls, element, base_dir=None, specs=None):
+        """
+        Make an AuditJob for each file found by a ``discover`` element, see
+        :func:`toolaudit.discovery.expand`.  The reader, test, hash algorithm
+        and timeout given with the element are used for every tool.
+        """
+        from . import discovery
+        reader = cls._intern(
+            cls._parse_reader_element(element['reader']), specs
+        )
+        tester = cls._intern(cls._parse_optional_tester(element), specs)
+        hash_algorithm = cls._parse_hash_algorithm(element)
+        return [
+            AuditJob(name, path, reader, tester,
+                     hash_algorithm=hash_algorithm,
+                     timeout=element.get('timeout', None))
+            for name, path in discovery.expand(element['discover'], base_dir)
+        ]
+
+    @classmethod
+    def _parse_optional_tester(cls, element):
+        # Saved KitLists call the test element 'tester'
+        test_element = element.get('test', element.get('tester', None))
+        if test_element:
+            return cls._parse_tester_element(test_element)
+        return None
+
+    @classmethod
+    def _parse_hash_algorithm(cls, element):
+        hash_algorithm = element.get('hash_algorithm', None)
+        if hash_algorithm is not None and \
+                hash_algorithm not in hashing.ALGORITHMS:
+            raise(KeyError(
+                'Unknown hash algorithm {}'.format(hash_algorithm)
+            ))
+        return hash_algorithm
+
     @classmethod
     def _parse_tester_element(cls, element):
         """
@@ -169,6 +431,8 @@ class KitList(object):
         ]
         tester_func = cls.tester_functions[tester_name]
         tester_args = dict(args)
+        if 'staging' in tester_args:
+            staging.parse_staging(tester_args['staging'])
         tester = Tester(tester_name, tester_func, tester_args)
         return tester
 
@@ -207,9 +471,28 @@ class KitList(object):
         tool : class:`AuditJob` or None
             The requested tool or None if not found
         """
-        for t in self.tools:
-            if t.name == tool_name:
-                return t
+        return self.index().get(tool_name)
+
+    def index(self):
+        """
+        Get the tools keyed by name.
+
+        The index is rebuilt when :attr:`tools` is replaced or its length
+        changes.  If several tools have the same name the first is indexed.
+
+        Returns
+        -------
+        index : dict
+            Maps tool names to :class:`AuditJob` instances
+        """
+        state = (id(self.tools), len(self.tools))
+        if self._index is None or self._indexed != state:
+            index = {}
+            for t in self.tools:
+                index.setdefault(t.name, t)
+            self._index = index
+            self._indexed = state
+        return self._index
 
     def save(self, path):
         """
@@ -221,20 +504,86 @@ class KitList(object):
             The path to write to
         """
 
-        to_save = {'tools': [t.as_dict() for t in self.tools]}
         with open(path, 'w') as f:
-            yaml.dump(to_save, f, explicit_start=True, Dumper=Dumper)
+            self.dump(f)
+
+    @staticmethod
+    def stats_path(path):
+        """
+        The file the ``file_stats`` of a KitList saved at *path* are kept in
+        """
+
+        return path + '.stats.json'
+
+    def save_file_stats(self, path):
+        """
+        Write the ``file_stats`` of each tool, which :meth:`read_file_stats`
+        adds back to the saved KitList so it can be used as the previous
+        audit by :class:`~toolaudit.session.AuditSession`.
+
+        Parameters
+        ----------
+        path : str
+            The path to write to, usually :meth:`stats_path` of the KitList
+        """
+
+        with open(path, 'w') as f:
+            json.dump(dict(
+                (t.name, t.file_stats) for t in self.tools
+                if t.file_stats is not None
+            ), f, sort_keys=True)
+
+    def read_file_stats(self, path):
+        """
+        Set the ``file_stats`` of each tool from a file written by
+        :meth:`save_file_stats`.  Nothing is changed if the file can't be
+        read.
+
+        Parameters
+        ----------
+        path : str
+            The path to read from
+        """
+
+        try:
+            with open(path, 'r') as f:
+                stats = json.load(f)
+        except (IOError, OSError, ValueError):
+            return
+        for t in self.tools:
+            t.file_stats = stats.get(t.name)
 
     def to_stdout(self):
         """
         Output the kitlist to stdout.
         """
 
-        to_save = {'tools': [t.as_dict() for t in self.tools]}
-        print(
-            yaml.dump(to_save, explicit_start=True, Dumper=Dumper),
-            file=sys.stdout
-        )
+        self.dump(sys.stdout)
+        print(file=sys.stdout)
+
+    def dump(self, f):
+        """
+        Write the kitlist to a text file object as a YAML document.
+
+        Each tool is converted and written in turn, so the whole document is
+        never held in memory.  The output is the same as dumping the
+        KitList in one go, apart from tools never sharing YAML anchors.
+
+        Parameters
+        ----------
+        f : file object
+            Where to write the document
+        """
+
+        f.write('---\n')
+        if self.staging is not None:
+            yaml.dump({'staging': self.staging}, f, Dumper=Dumper)
+        if not self.tools:
+            f.write('tools: []\n')
+            return
+        f.write('tools:\n')
+        for t in self.tools:
+            yaml.dump([t.as_dict()], f, Dumper=Dumper)
 
     @classmethod
     def _fixup_regex(cls, regex):
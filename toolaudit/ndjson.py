@@ -0,0 +1,119 @@
+"""
+Streaming KitList output as newline delimited JSON
+
+A stream starts with a ``kitlist`` record holding the KitList's own
+elements, followed by a ``tool`` record for each tool as soon as it has been
+audited and ends with a ``summary`` record of totals for the run.  Every
+record has a ``record`` key giving its type, the other keys of a ``tool``
+record are those of :meth:`~toolaudit.kitlist.AuditJob.as_dict`.
+"""
+
+import json
+import threading
+
+
+FORMATS = ('yaml', 'ndjson')
+
+
+class NdjsonWriter(object):
+    """
+    Writes records to a file object, flushing after each one.
+
+    Records may be written from several threads at once.
+
+    Parameters
+    ----------
+    f : file object
+        A text file to write to
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.tools_written = 0
+        self._lock = threading.Lock()
+
+    def header(self, kitlist):
+        """
+        Write the ``kitlist`` record for *kitlist*
+        """
+
+        record = {'record': 'kitlist'}
+        if kitlist.staging is not None:
+            record['staging'] = kitlist.staging
+        self._write(record)
+
+    def tool(self, audit_job):
+        """
+        Write a ``tool`` record for *audit_job*
+        """
+
+        record = audit_job.as_dict()
+        record['record'] = 'tool'
+        self._write(record)
+        with self._lock:
+            self.tools_written += 1
+
+    def trailer(self, totals):
+        """
+        Write the ``summary`` record
+
+        Parameters
+        ----------
+        totals : dict
+            Totals for the run, the number of tools written is added as
+            ``tools``
+        """
+
+        record = dict(totals)
+        record['record'] = 'summary'
+        record['tools'] = self.tools_written
+        self._write(record)
+
+    def _write(self, record):
+        line = json.dumps(record, sort_keys=True, default=str)
+        with self._lock:
+            self.f.write(line + '\n')
+            self.f.flush()
+
+
+def is_ndjson(first_line):
+    """
+    Whether a file starting with *first_line* is an NDJSON KitList
+    """
+
+    if not first_line.lstrip().startswith('{'):
+        return False
+    try:
+        record = json.loads(first_line)
+    except ValueError:
+        return False
+    return isinstance(record, dict) and record.get('record') == 'kitlist'
+
+
+def load(f):
+    """
+    Read an NDJSON KitList into the same structure as a YAML KitList.
+
+    Parameters
+    ----------
+    f : file object
+        The file to read
+
+    Returns
+    -------
+    data : dict
+        With a ``tools`` element and any other KitList elements, the
+        ``summary`` record is ignored
+    """
+
+    data = {'tools': []}
+    for line in f:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        record_type = record.pop('record', None)
+        if record_type == 'tool':
+            data['tools'].append(record)
+        elif record_type == 'kitlist':
+            data.update(record)
+    return data
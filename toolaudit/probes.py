@@ -0,0 +1,116 @@
+"""
+Sharing of reader results, and other work, between tools audited in the same
+run
+"""
+
+import os.path
+import threading
+from six import iteritems
+
+
+class SharedWork(object):
+    """
+    Memoizes calls by key so that work needed by several tools in a run is
+    only done once.
+
+    Concurrent requests for the same key wait for the first one to finish
+    rather than doing the work again.  If the work raises an exception it is
+    raised for every request for that key.
+    """
+
+    def __init__(self):
+        self._probes = {}
+        self._lock = threading.Lock()
+        self.run = 0
+        self.reused = 0
+
+    def get(self, key, func, *args, **kwargs):
+        """
+        Get the result of ``func(*args, **kwargs)``, calling it only if no
+        result has been stored for *key*.
+
+        Parameters
+        ----------
+        key : hashable
+            Identifies the work
+        func : callable
+            Does the work
+
+        Returns
+        -------
+        value
+            The value returned by *func*
+        """
+
+        with self._lock:
+            probe = self._probes.get(key)
+            owner = probe is None
+            if owner:
+                probe = _Probe()
+                self._probes[key] = probe
+                self.run += 1
+            else:
+                self.reused += 1
+        if owner:
+            try:
+                probe.value = func(*args, **kwargs)
+            except Exception as e:
+                probe.error = e
+                raise
+            finally:
+                probe.done.set()
+        else:
+            probe.done.wait()
+            if probe.error is not None:
+                raise probe.error
+        return probe.value
+
+
+class ProbeCache(SharedWork):
+    """
+    Memoizes reader calls so that tools which read their version in exactly
+    the same way, from the same path, only cause the reader to run once.
+    """
+
+    def read(self, reader, path):
+        """
+        Get the result of calling *reader* on *path*.
+
+        Parameters
+        ----------
+        reader : :class:`~toolaudit.kitlist.Reader`
+            The reader to call
+        path : str
+            The path to pass to the reader
+
+        Returns
+        -------
+        version : str
+            The value returned by the reader
+        """
+
+        key = (reader.name, os.path.abspath(path), freeze(reader.args))
+        return self.get(key, reader.func, path, **reader.args)
+
+
+class _Probe(object):  # pylint: disable=R0903
+    """
+    The result of a single call made by :class:`SharedWork`
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def freeze(value):
+    """
+    Convert arguments read from YAML into a hashable value
+    """
+
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in iteritems(value)))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
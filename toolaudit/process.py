@@ -0,0 +1,268 @@
+"""
+Running the programs being audited with a time limit and measuring the
+resources they use
+"""
+
+import contextlib
+import errno
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from . import timing
+
+
+class ToolTimeout(Exception):
+    """
+    Raised when a program runs for longer than its time limit
+    """
+    pass
+
+
+_limits = threading.local()
+
+_accounts = threading.local()
+
+
+class ResourceUsage(object):
+    """
+    The resources used by the programs run for a test.
+
+    Attributes
+    ----------
+    user : float
+        User CPU seconds
+    system : float
+        System CPU seconds
+    wall : float
+        Seconds from starting each program until it exited
+    max_rss : int
+        The largest resident set size of any of the programs, in KiB
+    blocks_in : int
+        The number of blocks read from disk
+    blocks_out : int
+        The number of blocks written to disk
+    processes : int
+        The number of programs measured
+
+    CPU time, memory and I/O include any children the programs waited for.
+    """
+
+    def __init__(self):
+        self.user = 0.0
+        self.system = 0.0
+        self.wall = 0.0
+        self.max_rss = 0
+        self.blocks_in = 0
+        self.blocks_out = 0
+        self.processes = 0
+
+    def add(self, rusage, wall):
+        """
+        Add the usage of a program, as returned by :func:`os.wait4`, which
+        ran for *wall* seconds
+        """
+
+        max_rss = rusage.ru_maxrss
+        if sys.platform == 'darwin':
+            # Reported in bytes rather than KiB
+            max_rss //= 1024
+        self.user += rusage.ru_utime
+        self.system += rusage.ru_stime
+        self.wall += wall
+        self.max_rss = max(self.max_rss, max_rss)
+        self.blocks_in += rusage.ru_inblock
+        self.blocks_out += rusage.ru_oublock
+        self.processes += 1
+
+    def as_dict(self):
+        """
+        Convert to a dict
+
+        Returns
+        -------
+        dict : dict or None
+            The attributes other than :attr:`processes`, None if no program
+            was measured
+        """
+
+        if not self.processes:
+            return None
+        return {
+            'user': round(self.user, 6),
+            'system': round(self.system, 6),
+            'wall': round(self.wall, 6),
+            'max_rss': self.max_rss,
+            'blocks_in': self.blocks_in,
+            'blocks_out': self.blocks_out
+        }
+
+
+@contextlib.contextmanager
+def accounting(usage):
+    """
+    Add the resources used by each program waited for by :func:`wait` in
+    this thread to *usage*.
+    """
+
+    previous = getattr(_accounts, 'usage', None)
+    _accounts.usage = usage
+    try:
+        yield usage
+    finally:
+        _accounts.usage = previous
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    """
+    Limit how long each program started by :func:`spawn` in this thread may
+    run for.
+
+    Parameters
+    ----------
+    seconds : float or None
+        The time limit, None for no limit
+    """
+
+    previous = getattr(_limits, 'seconds', None)
+    _limits.seconds = seconds
+    try:
+        yield
+    finally:
+        _limits.seconds = previous
+
+
+def current_limit():
+    """
+    The time limit set by :func:`time_limit` for this thread, or None
+    """
+
+    return getattr(_limits, 'seconds', None)
+
+
+def spawn(args, **kwargs):
+    """
+    Start a program, like :class:`subprocess.Popen`.
+
+    If a time limit is set the program is started in a new session so that
+    it and any processes it starts can be killed together.
+    """
+
+    if current_limit() is not None and os.name == 'posix':
+        if sys.version_info >= (3, 2):
+            kwargs['start_new_session'] = True
+        else:
+            kwargs['preexec_fn'] = os.setsid
+    started = time.time()
+    proc = subprocess.Popen(args, **kwargs)
+    proc.started = started
+    return proc
+
+
+def wait(proc):
+    """
+    Wait for a program started by :func:`spawn` to exit, like
+    :meth:`subprocess.Popen.wait`.
+
+    Where :func:`os.wait4` is available the program is reaped with it, the
+    resources it used are added to the :class:`ResourceUsage` set by
+    :func:`accounting`, if there is one, and its CPU time to the current
+    :func:`~toolaudit.timing.phase`.
+
+    Returns
+    -------
+    returncode : int
+    """
+
+    if not hasattr(os, 'wait4') or proc.returncode is not None:
+        return proc.wait()
+    while True:
+        try:
+            _, status, rusage = os.wait4(proc.pid, 0)
+            break
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                continue
+            if e.errno == errno.ECHILD:
+                # Already reaped, by a time limit checking on it
+                return proc.wait()
+            raise
+    usage = getattr(_accounts, 'usage', None)
+    if usage is not None:
+        usage.add(
+            rusage, time.time() - getattr(proc, 'started', time.time())
+        )
+    timing.add_child_cpu(rusage.ru_utime + rusage.ru_stime)
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    return proc.returncode
+
+
+class supervise(object):  # pylint: disable=C0103
+    """
+    Context manager which kills the process group of *proc* if it is still
+    running when the time limit expires.
+
+    Killing the program closes its pipes, so reads of its output inside the
+    context return.  On leaving the context :class:`ToolTimeout` is raised if
+    the program was killed.
+
+    Parameters
+    ----------
+    proc : :class:`subprocess.Popen`
+        A program started by :func:`spawn`
+    seconds : float or None
+        The time limit, defaults to :func:`current_limit`
+    """
+
+    def __init__(self, proc, seconds=None):
+        self.proc = proc
+        self.seconds = current_limit() if seconds is None else seconds
+        self.expired = False
+        self._timer = None
+
+    def __enter__(self):
+        if self.seconds is not None:
+            self._timer = threading.Timer(self.seconds, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self.expired:
+            self.proc.wait()
+            raise ToolTimeout(
+                "{0} was killed after {1} seconds".format(
+                    self.proc.args if hasattr(self.proc, 'args')
+                    else self.proc.pid,
+                    self.seconds
+                )
+            )
+        return False
+
+    def _expire(self):
+        if self.proc.poll() is not None:
+            return
+        self.expired = True
+        kill_group(self.proc)
+
+
+def kill_group(proc):
+    """
+    Kill *proc* and the other processes in its group
+    """
+
+    try:
+        if os.name == 'posix' and os.getpgid(proc.pid) == proc.pid:
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except OSError:
+        pass
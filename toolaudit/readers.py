@@ -2,9 +2,14 @@
 Methods to read the version number from various things
 """
 
-import hashlib
+import io
+import mmap
+import os
 import re
+import struct
 import subprocess
+from . import hashing
+from . import process
 
 
 class InputError(Exception):
@@ -40,13 +45,19 @@ def command_line(path, option=None, regex=None):
     call = [path]
     if option:
         call.append(option)
-    response = subprocess.Popen(
+    proc = process.spawn(
         call,
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
         universal_newlines=True,
-    ).communicate()
-    response = response[0].strip()
+    )
+    with process.supervise(proc):
+        try:
+            response = proc.stdout.read()
+        finally:
+            proc.stdout.close()
+            process.wait(proc)
+    response = response.strip()
     version = None
     if regex:
         for line in response.split('\n'):
@@ -129,6 +140,77 @@ def line_in_file(path, line_no=None, regex=None):
     return version
 
 
+def binary_string(path, regex, offset=0, length=None, section=None):
+    """
+    Search the contents of a file, such as an executable, for a version
+    string without running it.
+
+    The file is memory mapped and searched with *regex* as a byte pattern
+    so large binaries are scanned at disk speed without being copied into
+    memory.  The search can be limited to *length* bytes from *offset* or to
+    a section of an ELF file, *offset* and *length* are then relative to the
+    start of the section.
+
+    Parameters
+    ----------
+    path : str
+        The file to search
+    regex : str
+        A regular expression, if it has groups group 1 is returned otherwise
+        the whole match is
+    offset : int
+        Where to start searching
+    length : int or None
+        How many bytes to search, defaults to the rest of the file or
+        section
+    section : str or None
+        The name of an ELF section to search, for example ``.rodata``
+
+    Returns
+    -------
+    version : str
+        The first match decoded as UTF-8
+
+    Raises
+    ------
+    InputError
+        If the section doesn't exist, the file isn't a valid ELF file or the
+        pattern isn't found
+    """
+
+    pattern = re.compile(regex.encode('utf-8'))
+    with io.open(path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        start, end = 0, size
+        if section is not None:
+            from . import elfdeps
+            try:
+                location = elfdeps.find_section(path, section)
+            except struct.error as e:
+                raise InputError({'message': "Malformed ELF file",
+                                  'error': str(e)})
+            if location is None:
+                raise InputError({'message': "Section not found",
+                                  'section': section})
+            start, end = location[0], location[0] + location[1]
+        start = min(start + offset, end)
+        if length is not None:
+            end = min(start + length, end)
+        m = None
+        if start < end:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                m = pattern.search(mapped, start, end)
+                if m:
+                    value = m.group(1) if pattern.groups else m.group(0)
+            finally:
+                mapped.close()
+    if not m:
+        raise InputError({'message': "Pattern not found",
+                          'regex': regex})
+    return value.decode('utf-8', 'replace')
+
+
 def manual(path, value):  # pylint: disable=W0613
     """
     Dummy function that returns it's input
@@ -156,11 +238,29 @@ def sha1_file(path):
     """
     Calculate the SHA-1 checksum of a file.
     """
-    sha = hashlib.sha1()  # pylint: disable=E1101
-    with open(path, 'rb') as hashfile:
-        while True:
-            block = hashfile.read(2**10)  # Magic number: one-megabyte blocks.
-            if not block:
-                break
-            sha.update(block)
-    return sha.hexdigest()
+    return hashing.hash_file(path, 'sha1')
+
+
+def file_checksum(path, algorithm=hashing.DEFAULT_ALGORITHM):
+    """
+    Calculate the checksum of a file using any of
+    :data:`toolaudit.hashing.ALGORITHMS`.
+
+    SHA-1 checksums are calculated by :func:`sha1_file`.
+
+    Parameters
+    ----------
+    path : str
+        The file to checksum
+    algorithm : str
+        The hash algorithm to use
+
+    Returns
+    -------
+    hexdigest : str
+        The checksum of the file
+    """
+
+    if algorithm == 'sha1':
+        return sha1_file(path)
+    return hashing.hash_file(path, algorithm)
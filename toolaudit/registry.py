@@ -0,0 +1,154 @@
+"""
+Lazily loaded registries of reader and tester functions
+"""
+
+import inspect
+import sys
+import threading
+
+
+class PluginRegistry(object):
+    """
+    Maps names used in KitLists to functions, importing each function only
+    when it is first looked up.
+
+    Built in functions are given as ``'module:attribute'`` strings.  Other
+    packages can add functions by declaring entry points in *group*, these
+    are only searched for when a name isn't built in.  Functions can also be
+    registered directly by assigning to the registry.
+
+    Parameters
+    ----------
+    group : str
+        The entry point group plugins are declared in
+    builtins : dict
+        Maps names to ``'module:attribute'`` strings or functions
+    """
+
+    def __init__(self, group, builtins):
+        self.group = group
+        self._specs = dict(builtins)
+        self._loaded = {}
+        self._discovered = False
+        self._lock = threading.RLock()
+
+    def __contains__(self, name):
+        with self._lock:
+            return self._spec(name) is not None
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+            spec = self._spec(name)
+            if spec is None:
+                raise KeyError(name)
+            func = _load(spec)
+            self._loaded[name] = func
+            return func
+
+    def __setitem__(self, name, func):
+        with self._lock:
+            self._specs[name] = func
+            self._loaded[name] = func
+
+    def __delitem__(self, name):
+        with self._lock:
+            del self._specs[name]
+            self._loaded.pop(name, None)
+
+    def names(self):
+        """
+        Get the names of all the available functions, including plugins
+
+        Returns
+        -------
+        names : list of str
+        """
+
+        with self._lock:
+            self._discover()
+            return sorted(self._specs)
+
+    def _spec(self, name):
+        if name not in self._specs:
+            self._discover()
+        return self._specs.get(name)
+
+    def _discover(self):
+        """
+        Add the entry points declared in :attr:`group`, built in names take
+        precedence
+        """
+
+        if self._discovered:
+            return
+        self._discovered = True
+        for entry_point in _entry_points(self.group):
+            self._specs.setdefault(entry_point.name, entry_point)
+
+
+def _load(spec):
+    """
+    Import the function described by *spec*
+    """
+
+    if callable(spec):
+        return spec
+    if hasattr(spec, 'load'):
+        return spec.load()
+    module_name, attribute = spec.split(':')
+    __import__(module_name)
+    return getattr(sys.modules[module_name], attribute)
+
+
+def supported_kwargs(func, kwargs):
+    """
+    Select the keyword arguments which *func* accepts
+
+    Used for the optional arguments toolaudit passes to readers and testers
+    so that plugins only need to declare the ones they use.
+
+    Parameters
+    ----------
+    func : callable
+        The function to be called
+    kwargs : dict
+        The optional keyword arguments
+
+    Returns
+    -------
+    kwargs : dict
+        The items of *kwargs* named in *func*'s signature, or all of them if
+        it takes ``**kwargs`` or its signature can't be found
+    """
+
+    try:
+        getargspec = getattr(inspect, 'getfullargspec', None) or \
+            inspect.getargspec
+        spec = getargspec(func)
+    except TypeError:
+        return dict(kwargs)
+    if spec[2] is not None:
+        return dict(kwargs)
+    names = set(spec[0]) | set(getattr(spec, 'kwonlyargs', ()))
+    return dict((k, v) for k, v in kwargs.items() if k in names)
+
+
+def _entry_points(group):
+    """
+    Get the entry points installed in *group*
+    """
+
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        try:
+            import pkg_resources
+        except ImportError:
+            return []
+        return list(pkg_resources.iter_entry_points(group))
+    installed = entry_points()
+    if hasattr(installed, 'select'):
+        return list(installed.select(group=group))
+    return list(installed.get(group, []))
@@ -0,0 +1,98 @@
+"""
+A persistent cache of tester results keyed on everything that affects them
+"""
+
+import hashlib
+import json
+from .cache import JsonCache
+
+
+class ResultCache(JsonCache):
+    """
+    Stores the output checksums of testers so that a test isn't run again
+    unless the tool, the test or its inputs have changed.
+
+    See :class:`~toolaudit.cache.JsonCache` for the eviction policy.
+    """
+
+    FILE_NAME = 'results.db'
+
+    # Tester arguments which can't change the result of a test.
+    IGNORED_ARGS = ('staging',)
+
+    # Testers which measure the system they run on, such as how long a
+    # program takes, so their results are never reused from earlier runs.
+    UNCACHEABLE_TESTERS = ('benchmark',)
+
+    @classmethod
+    def key(cls, tool, input_checksums):
+        """
+        Make the cache key for the test of *tool*.
+
+        The key covers the tool's path and checksum, the tester name and
+        arguments, which include the command and the names of the inputs, the
+        checksums of the input files and the hash algorithm.  If the tool's
+        shared libraries were hashed their checksum is included too.
+
+        Parameters
+        ----------
+        tool : :class:`~toolaudit.kitlist.AuditJob`
+            A tool with its checksum already calculated
+        input_checksums : dict
+            Maps input names to the checksums of the input files
+
+        Returns
+        -------
+        key : str
+        """
+
+        args = dict(
+            (k, v) for k, v in tool.tester.args.items()
+            if k not in cls.IGNORED_ARGS
+        )
+        parts = {
+            'path': tool.path,
+            'checksum': tool.checksum,
+            'tester': tool.tester.name,
+            'args': args,
+            'inputs': input_checksums,
+            'hash_algorithm': tool.hash_algorithm,
+        }
+        if tool.dependency_checksum is not None:
+            parts['dependencies'] = tool.dependency_checksum
+        encoded = json.dumps(parts, sort_keys=True, default=repr)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def lookup(self, key):
+        """
+        Get the cached result for *key*
+
+        Returns
+        -------
+        result : tuple or None
+            The (output_checksum, test_report, resources) stored for *key*
+            or None if there isn't one
+        """
+
+        with self._lock:
+            entry = self._get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key, entry)
+            return (entry['output_checksum'], entry['test_report'],
+                    entry.get('resources'))
+
+    def store(self, key, output_checksum, test_report, resources=None):
+        """
+        Save the result of a test under *key*, with the resources used to
+        run it
+        """
+
+        with self._lock:
+            self._put(key, {
+                'output_checksum': output_checksum,
+                'test_report': test_report,
+                'resources': resources
+            })
@@ -0,0 +1,173 @@
+"""
+Ordering tools so that a run finishes as early as possible, using how long
+each tool took to audit in earlier runs
+"""
+
+import hashlib
+import heapq
+import json
+import os.path
+from .cache import JsonCache
+from .resultcache import ResultCache
+
+
+class DurationHistory(JsonCache):
+    """
+    Stores the wall clock time each phase of a tool's audit took in earlier
+    runs, see :data:`~toolaudit.timing.PHASES`.
+
+    Each new measurement is averaged with the stored time, weighted by
+    :attr:`SMOOTHING`, so one unusually slow or fast run doesn't change the
+    expected time too much.
+
+    See :class:`~toolaudit.cache.JsonCache` for the eviction policy.
+    """
+
+    FILE_NAME = 'durations.db'
+
+    # The weight given to the latest measurement of a phase.
+    SMOOTHING = 0.5
+
+    @classmethod
+    def key(cls, tool, base_dir=None):
+        """
+        Make the key for *tool*, which covers the absolute path of its
+        binary and the definitions of its reader and tester.
+
+        Parameters
+        ----------
+        tool : :class:`~toolaudit.kitlist.AuditJob`
+        base_dir : str or None
+            The directory a relative tool path is relative to, defaults to
+            the working directory
+
+        Returns
+        -------
+        key : str
+        """
+
+        parts = {
+            'path': os.path.abspath(os.path.join(base_dir or '', tool.path)),
+            'reader': [tool.reader.name, tool.reader.args],
+        }
+        if tool.tester is not None:
+            parts['tester'] = [tool.tester.name, dict(
+                (k, v) for k, v in tool.tester.args.items()
+                if k not in ResultCache.IGNORED_ARGS
+            )]
+        encoded = json.dumps(parts, sort_keys=True, default=repr)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def expected(self, tool, skip_tests, base_dir=None):
+        """
+        Get how long auditing *tool* is expected to take
+
+        Parameters
+        ----------
+        tool : :class:`~toolaudit.kitlist.AuditJob`
+            The tool to be audited
+        skip_tests : bool
+            Whether the tool's test will be skipped, the time taken by
+            earlier tests isn't counted if so
+        base_dir : str or None
+            See :meth:`key`
+
+        Returns
+        -------
+        seconds : float or None
+            None if the tool hasn't been audited before
+        """
+
+        with self._lock:
+            key = self.key(tool, base_dir)
+            entry = self._get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touch(key, entry)
+            return sum(
+                seconds for phase, seconds in entry['wall'].items()
+                if not (skip_tests and phase in ('staging', 'tester'))
+            )
+
+    def record(self, tool, timings, base_dir=None, phases=None):
+        """
+        Store the times measured while auditing *tool*.  Phases that weren't
+        run, such as the test of a tool audited with tests skipped, or
+        aren't in *phases* keep their earlier times.
+
+        Parameters
+        ----------
+        tool : :class:`~toolaudit.kitlist.AuditJob`
+            The tool that was audited
+        timings : :class:`~toolaudit.timing.Timings`
+            The times taken by each phase
+        base_dir : str or None
+            See :meth:`key`
+        phases : iterable of str or None
+            The phases to store, such as all but the test when its result
+            was cached, defaults to all of them
+        """
+
+        key = self.key(tool, base_dir)
+        with self._lock:
+            entry = self._get(key) or {'wall': {}}
+            wall = entry['wall']
+            for phase, seconds in timings.wall.items():
+                if phases is not None and phase not in phases:
+                    continue
+                if phase in wall:
+                    seconds = self.SMOOTHING * seconds + \
+                        (1 - self.SMOOTHING) * wall[phase]
+                wall[phase] = round(seconds, 6)
+            self._put(key, entry)
+
+
+def longest_first(expected):
+    """
+    Order jobs for a pool of workers, longest expected first.
+
+    Handing the longest jobs out first (LPT scheduling) stops a long job
+    that starts near the end of a run from leaving the other workers idle.
+    Jobs without an expected time come first, in their original order,
+    because any of them could be the longest.
+
+    Parameters
+    ----------
+    expected : list of float or None
+        The expected duration of each job
+
+    Returns
+    -------
+    order : list of int
+        Indices into *expected* in the order the jobs should be started
+    """
+
+    unknown = [i for i, e in enumerate(expected) if e is None]
+    known = [i for i, e in enumerate(expected) if e is not None]
+    known.sort(key=lambda i: expected[i], reverse=True)
+    return unknown + known
+
+
+def makespan(durations, jobs):
+    """
+    Predict how long a pool of *jobs* workers will take to run jobs, each
+    taken by the first free worker in the order given.
+
+    Parameters
+    ----------
+    durations : list of float
+        The duration of each job in the order they are started
+    jobs : int
+        The number of workers
+
+    Returns
+    -------
+    seconds : float
+    """
+
+    finish = [0.0] * max(1, min(jobs, len(durations)))
+    for duration in durations:
+        heapq.heappush(finish, heapq.heappop(finish) + duration)
+    return max(finish)
@@ -0,0 +1,579 @@
+"""
+The work done to audit each tool and the state shared between tools in a run
+"""
+
+import logging
+import os.path
+import threading
+from . import hashing
+from .hashcache import stat_key
+from .probes import ProbeCache, SharedWork, freeze
+from . import process
+from . import readers
+from .registry import supported_kwargs
+from .resultcache import ResultCache
+from . import schedule
+from . import timing
+
+
+class AuditSession(object):
+    """
+    Audits tools, sharing reader results and caches between them.
+
+    Within a session each reader call, file checksum and test is only done
+    once, tools which need the same one share the result.
+
+    Parameters
+    ----------
+    hash_cache : :class:`~toolaudit.hashcache.HashCache` or None
+        A cache to look up file checksums in
+    result_cache : :class:`~toolaudit.resultcache.ResultCache` or None
+        A cache of tester results, tests are only run if their result isn't
+        found in it
+    force_tests : bool
+        Run every test even if its result is in *result_cache*, the new
+        results are still stored
+    previous : :class:`~toolaudit.kitlist.KitList` or None
+        The output of an earlier audit, results are copied from it for tools
+        which haven't changed since
+    timeout : float or None
+        How many seconds a tool's reader or tester may run for, unless the
+        tool sets its own timeout
+    record_timings : bool
+        Store the time taken by each phase of a tool's audit in its
+        ``timings`` attribute
+    record_resources : bool
+        Store the resources used by each tool's test in its ``resources``
+        attribute, see :meth:`test`
+    hash_dependencies : bool
+        Find the shared libraries each tool loads and store a checksum of
+        them in its ``dependency_checksum`` attribute, see
+        :meth:`dependency_checksum`
+    durations : :class:`~toolaudit.schedule.DurationHistory` or None
+        The times taken to audit tools in earlier runs, used by
+        :meth:`schedule` and updated as each tool is audited
+
+    Attributes
+    ----------
+    tool_timings : list of tuple
+        (tool name, :class:`~toolaudit.timing.Timings`) for each tool audited
+    predicted_makespan : float or None
+        The time the tools were expected to take to audit, set by
+        :meth:`schedule` if any of them have been audited before
+    makespan : float or None
+        The time the tools took to audit, set by whoever runs them
+    """
+
+    def __init__(self, hash_cache=None, result_cache=None, force_tests=False,
+                 previous=None, timeout=None, record_timings=False,
+                 hash_dependencies=False, durations=None,
+                 record_resources=False):
+        self.hash_cache = hash_cache
+        self.result_cache = result_cache
+        self.force_tests = force_tests
+        self.previous = previous
+        self.timeout = timeout
+        self.record_timings = record_timings
+        self.record_resources = record_resources
+        self.durations = durations
+        self.predicted_makespan = None
+        self.makespan = None
+        self.tools_with_history = 0
+        if hash_dependencies:
+            from .elfdeps import DependencyResolver
+            self.dependency_resolver = DependencyResolver()
+        else:
+            self.dependency_resolver = None
+        self.libraries = set()
+        self.tool_timings = []
+        self.probe_cache = ProbeCache()
+        self.shared_checksums = SharedWork()
+        self.shared_tests = SharedWork()
+        self._lock = threading.Lock()
+        self.tests_run = 0
+        self.tests_cached = 0
+        self.tools_unchanged = 0
+        self.tools_timed_out = 0
+
+    def audit(self, tool, skip_tests, staging=None, base_dir=None):
+        """
+        Run the reader, tester and checksum for a single tool, storing the
+        results on *tool*.
+
+        If the reader or tester runs for longer than the tool's timeout it is
+        killed, its result is None and the tool's status is ``'timeout'``.
+
+        Parameters
+        ----------
+        tool : :class:`~toolaudit.kitlist.AuditJob`
+            The tool to audit, its hash algorithm must be set
+        skip_tests : bool
+            Don't run the tool's tester
+        staging : str, dict or None
+            Used for testers that don't set their own staging
+        base_dir : str or None
+            The directory relative paths of the tool and its test inputs are
+            relative to, defaults to the working directory.  It is only used
+            to find the files, the tool and its results keep the paths as
+            written so they are the same as when auditing from *base_dir*.
+        """
+
+        logging.getLogger().info("Testing {0}".format(tool.name))
+        with timing.recording(timing.Timings()) as timings:
+            measured = self._audit(tool, skip_tests, staging, base_dir)
+        with self._lock:
+            self.tool_timings.append((tool.name, timings))
+        if self.durations is not None and measured:
+            self.durations.record(tool, timings, base_dir, measured)
+        if self.record_timings:
+            tool.timings = timings.as_dict()
+        else:
+            tool.timings = None
+
+    def schedule(self, tools, skip_tests, jobs, base_dirs=None):
+        """
+        Choose the order to audit *tools* in so that *jobs* workers finish
+        as early as possible, see :func:`~toolaudit.schedule.longest_first`.
+        The tools are left in order if there's no duration history or only
+        one worker, when the order makes no difference.
+
+        Parameters
+        ----------
+        base_dirs : list of str or None
+            The base directory of each tool, see :meth:`audit`
+
+        Returns
+        -------
+        order : list of int
+            Indices into *tools* in the order they should be audited
+        """
+
+        if self.durations is None:
+            return list(range(len(tools)))
+        if base_dirs is None:
+            base_dirs = [None] * len(tools)
+        expected = [
+            self.durations.expected(t, skip_tests, d)
+            for t, d in zip(tools, base_dirs)
+        ]
+        if jobs > 1:
+            order = schedule.longest_first(expected)
+        else:
+            order = list(range(len(tools)))
+        known = [expected[i] for i in order if expected[i] is not None]
+        self.tools_with_history = len(known)
+        if known:
+            self.predicted_makespan = schedule.makespan(
+                [expected[i] or 0.0 for i in order], jobs
+            )
+        return order
+
+    def _audit(self, tool, skip_tests, staging, base_dir):
+        """
+        Audit *tool*, see :meth:`audit`
+
+        Returns
+        -------
+        measured : tuple of str
+            The phases whose times are those of the tool's own work.  The
+            test phases are left out if its result was cached or shared with
+            another tool, and none are measured if the results were copied
+            from the previous audit.
+        """
+
+        path = _resolve(tool.path, base_dir)
+        if not os.path.exists(path):
+            err_msg = "The path for '{0}' does not exist: {1}".format(
+                tool.name, path
+            )
+            raise IOError(err_msg)
+        file_stats = self.file_stats(tool, base_dir)
+        if self.previous is not None and \
+                self.reuse_previous(tool, file_stats, skip_tests):
+            return ()
+        tool.file_stats = file_stats
+        tool.status = None
+        if tool.timeout is not None:
+            timeout = tool.timeout
+        else:
+            timeout = self.timeout
+        try:
+            with process.time_limit(timeout), timing.phase('reader'):
+                tool.version = self.probe_cache.read(tool.reader, path)
+        except process.ToolTimeout as e:
+            self._timed_out(tool, e)
+            tool.version = None
+        tool.checksum = self.checksum(path, tool.hash_algorithm)
+        tool.dependency_checksum = self.dependency_checksum(tool, base_dir)
+        tool.output_checksum = None
+        tool.test_report = None
+        tool.output_cached = None
+        tool.resources = None
+        measured = timing.PHASES
+        if tool.tester and not skip_tests:
+            try:
+                with process.time_limit(timeout), timing.phase('tester'):
+                    tested = self.test(tool, staging, base_dir)
+            except process.ToolTimeout as e:
+                self._timed_out(tool, e)
+                tested = True
+            if not tested:
+                measured = ('reader', 'hashing')
+        return measured
+
+    def _timed_out(self, tool, error):
+        """
+        Record that part of the audit of *tool* took too long
+        """
+
+        logging.getLogger(__name__).warning(
+            "Timed out auditing {0}: {1}".format(tool.name, error)
+        )
+        with self._lock:
+            if tool.status != 'timeout':
+                self.tools_timed_out += 1
+        tool.status = 'timeout'
+
+    def file_stats(self, tool, base_dir=None):
+        """
+        Get the metadata of the tool's binary and test inputs, and of its
+        shared libraries if they are hashed
+
+        Returns
+        -------
+        file_stats : dict
+            Maps each path, as written in the tool, to its
+            :func:`~toolaudit.hashcache.stat_key`, or None if the file
+            doesn't exist
+        """
+
+        paths = [tool.path]
+        if tool.tester:
+            paths.extend((tool.tester.args.get('inputs') or {}).values())
+        if self.dependency_resolver is not None:
+            dependencies = self.dependency_resolver.closure(
+                _resolve(tool.path, base_dir)
+            )
+            if dependencies is not None:
+                paths.extend(dependencies[0])
+        file_stats = {}
+        for p in paths:
+            try:
+                file_stats[p] = stat_key(_resolve(p, base_dir))
+            except OSError:
+                file_stats[p] = None
+        return file_stats
+
+    def reuse_previous(self, tool, file_stats, skip_tests):
+        """
+        Copy the results for *tool* from the previous audit if the tool is
+        provably unchanged since.
+
+        A tool is unchanged if its path, reader, tester and hash algorithm
+        are the same as in the previous audit and its binary and test inputs
+        have the same metadata.  If the test is to be run the previous audit
+        must have run it too, and it mustn't be one of
+        :attr:`~toolaudit.resultcache.ResultCache.UNCACHEABLE_TESTERS`.
+
+        Returns
+        -------
+        reused : bool
+            True if the previous results were copied to *tool*
+        """
+
+        prev = self.previous.get_tool(tool.name)
+        if prev is None or prev.file_stats != file_stats:
+            return False
+        same_definition = (
+            prev.path == tool.path and
+            prev.hash_algorithm == tool.hash_algorithm and
+            prev.reader.name == tool.reader.name and
+            prev.reader.args == tool.reader.args and
+            _same_tester(prev.tester, tool.tester)
+        )
+        if not same_definition:
+            return False
+        run_test = tool.tester is not None and not skip_tests
+        if run_test and (prev.output_checksum is None or
+                         tool.tester.name in ResultCache.UNCACHEABLE_TESTERS):
+            return False
+        if prev.status is not None:
+            return False
+        tool.version = prev.version
+        tool.checksum = prev.checksum
+        if self.dependency_resolver is not None:
+            tool.dependency_checksum = prev.dependency_checksum
+        else:
+            tool.dependency_checksum = None
+        tool.file_stats = file_stats
+        tool.status = None
+        if run_test:
+            tool.output_checksum = prev.output_checksum
+            tool.test_report = prev.test_report
+            tool.output_cached = True
+            tool.resources = prev.resources if self.record_resources \
+                else None
+        else:
+            tool.output_checksum = None
+            tool.test_report = None
+            tool.output_cached = None
+            tool.resources = None
+        with self._lock:
+            self.tools_unchanged += 1
+        return True
+
+    def checksum(self, path, algorithm):
+        """
+        Get the checksum of the file at *path*, using the hash cache if there
+        is one.
+        """
+
+        with timing.phase('hashing'):
+            return self.shared_checksums.get(
+                (os.path.abspath(path), algorithm),
+                self._checksum, path, algorithm
+            )
+
+    def dependency_checksum(self, tool, base_dir=None):
+        """
+        Get a checksum of the shared libraries loaded by the tool.
+
+        The checksum covers the path and checksum of the dynamic linker and
+        every library loaded, directly or indirectly, and the names of any
+        libraries which can't be found.  Each library is only hashed once
+        in a session.
+
+        Returns
+        -------
+        hexdigest : str or None
+            None if libraries aren't being hashed or the tool isn't a
+            dynamically linked ELF file
+        """
+
+        if self.dependency_resolver is None:
+            return None
+        dependencies = self.dependency_resolver.closure(
+            _resolve(tool.path, base_dir)
+        )
+        if dependencies is None:
+            return None
+        libraries, missing = dependencies
+        digest = hashing.new(tool.hash_algorithm)
+        for lib in libraries:
+            digest.update('{0}\0{1}\n'.format(
+                lib, self.checksum(lib, tool.hash_algorithm)
+            ).encode('utf-8'))
+        for name in missing:
+            digest.update('{0}\0missing\n'.format(name).encode('utf-8'))
+        with self._lock:
+            self.libraries.update(libraries)
+        return digest.hexdigest()
+
+    def _checksum(self, path, algorithm):
+        if self.hash_cache:
+            return self.hash_cache.checksum(path, algorithm)
+        return readers.file_checksum(path, algorithm)
+
+    def test(self, tool, staging=None, base_dir=None):
+        """
+        Set the output checksum of *tool* from the result cache or by running
+        its tester.  With :attr:`record_resources` the resources used by the
+        programs the tester runs are stored in the tool's ``resources``
+        attribute, see :class:`~toolaudit.process.ResourceUsage`, a cached
+        result keeps those measured when the test was run.
+
+        Returns
+        -------
+        tested : bool
+            True if the test was run for *tool*, False if the result was
+            cached or shared with another tool
+        """
+
+        ran = []
+
+        def run(*args):
+            ran.append(True)
+            return self._test(*args)
+        output_checksum, test_report, output_cached, resources = \
+            self.shared_tests.get(
+                self._test_key(tool, base_dir), run, tool, staging, base_dir
+            )
+        tool.output_checksum = output_checksum
+        tool.test_report = dict(test_report) if test_report else None
+        tool.output_cached = output_cached
+        if self.record_resources and resources:
+            tool.resources = dict(resources)
+        else:
+            tool.resources = None
+        return bool(ran) and not output_cached
+
+    @classmethod
+    def _test_key(cls, tool, base_dir=None):
+        """
+        Identifies tests which must give the same result within a session
+        """
+
+        args = dict(
+            (k, v) for k, v in tool.tester.args.items()
+            if k not in ResultCache.IGNORED_ARGS
+        )
+        inputs = dict(
+            (k, os.path.abspath(_resolve(v, base_dir)))
+            for k, v in (tool.tester.args.get('inputs') or {}).items()
+        )
+        return (
+            os.path.abspath(_resolve(tool.path, base_dir)),
+            tool.hash_algorithm, tool.tester.name, freeze(args),
+            freeze(inputs)
+        )
+
+    def _test(self, tool, staging, base_dir):
+        """
+        Get the result of the test of *tool* from the result cache or by
+        running it
+
+        Returns
+        -------
+        result : tuple
+            (output checksum, test report, whether the result was cached,
+            resources used)
+        """
+
+        key = None
+        if self.result_cache is not None and \
+                tool.tester.name not in ResultCache.UNCACHEABLE_TESTERS:
+            inputs = tool.tester.args.get('inputs') or {}
+            input_checksums = dict(
+                (name, self.checksum(
+                    _resolve(path, base_dir), tool.hash_algorithm
+                ))
+                for name, path in inputs.items()
+            )
+            key = self.result_cache.key(tool, input_checksums)
+            if not self.force_tests:
+                result = self.result_cache.lookup(key)
+                if result is not None:
+                    with self._lock:
+                        self.tests_cached += 1
+                    return result[0], result[1], True, result[2]
+        report = {}
+        optional = {
+            'hash_algorithm': tool.hash_algorithm, 'report': report
+        }
+        if staging is not None:
+            optional['staging'] = staging
+        if base_dir is not None:
+            optional['base_dir'] = base_dir
+        tester_args = supported_kwargs(tool.tester.func, optional)
+        tester_args.update(tool.tester.args)
+        with process.accounting(process.ResourceUsage()) as usage:
+            output_checksum = tool.tester.func(
+                _resolve(tool.path, base_dir), **tester_args
+            )
+        resources = usage.as_dict()
+        with self._lock:
+            self.tests_run += 1
+        if key is not None:
+            self.result_cache.store(
+                key, output_checksum, report or None, resources
+            )
+        return output_checksum, report or None, False, resources
+
+    def totals(self):
+        """
+        Count the work done and avoided in this session
+
+        Returns
+        -------
+        totals : dict
+        """
+
+        totals = {
+            'probes_run': self.probe_cache.run,
+            'probes_reused': self.probe_cache.reused,
+            'checksums_shared': self.shared_checksums.reused,
+            'tests_shared': self.shared_tests.reused,
+        }
+        if self.previous is not None:
+            totals['tools_unchanged'] = self.tools_unchanged
+        if self.tools_timed_out:
+            totals['tools_timed_out'] = self.tools_timed_out
+        if self.dependency_resolver is not None:
+            totals['libraries'] = len(self.libraries)
+        if self.predicted_makespan is not None:
+            totals['makespan_predicted'] = round(self.predicted_makespan, 3)
+        if self.makespan is not None:
+            totals['makespan'] = round(self.makespan, 3)
+        if self.hash_cache:
+            totals['checksum_cache_hits'] = self.hash_cache.hits
+            totals['checksum_cache_misses'] = self.hash_cache.misses
+        if self.result_cache is not None:
+            totals['tests_run'] = self.tests_run
+            totals['tests_cached'] = self.tests_cached
+        return totals
+
+    def summary(self):
+        """
+        Describe the work done and avoided in this session
+
+        Returns
+        -------
+        lines : list of str
+        """
+
+        lines = [
+            "Reader probes: {0} run, {1} reused".format(
+                self.probe_cache.run, self.probe_cache.reused
+            ),
+        ]
+        if self.shared_checksums.reused or self.shared_tests.reused:
+            lines.append(
+                "Shared between tools: {0} checksums, {1} tests".format(
+                    self.shared_checksums.reused, self.shared_tests.reused
+                )
+            )
+        if self.previous is not None:
+            lines.append("Unchanged since previous audit: {0} tools".format(
+                self.tools_unchanged
+            ))
+        if self.tools_timed_out:
+            lines.append("Timed out: {0} tools".format(self.tools_timed_out))
+        if self.dependency_resolver is not None:
+            lines.append("Shared libraries: {0}".format(len(self.libraries)))
+        if self.predicted_makespan is not None and self.makespan is not None:
+            lines.append(
+                "Makespan: {0:.2f}s predicted from {1} tools' history, "
+                "{2:.2f}s actual".format(
+                    self.predicted_makespan, self.tools_with_history,
+                    self.makespan
+                )
+            )
+        if self.hash_cache:
+            lines.append("Checksum cache: {0} hits, {1} misses".format(
+                self.hash_cache.hits, self.hash_cache.misses
+            ))
+        if self.result_cache is not None:
+            lines.append("Tests: {0} run, {1} from cache".format(
+                self.tests_run, self.tests_cached
+            ))
+        return lines
+
+
+def _resolve(path, base_dir):
+    """
+    Find *path*, which is relative to *base_dir* unless that is None
+    """
+
+    if base_dir is None:
+        return path
+    return os.path.join(base_dir, path)
+
+
+def _same_tester(a, b):
+    """
+    Whether two testers are defined the same way
+    """
+
+    if a is None or b is None:
+        return a is b
+    return a.name == b.name and a.args == b.args
@@ -0,0 +1,156 @@
+"""
+Methods for placing test input files in a tester's working directory
+"""
+
+import errno
+import logging
+import os
+import os.path
+import shutil
+import tempfile
+from six import string_types
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+# The Linux ioctl which clones a file's extents into another file.
+FICLONE = 0x40049409
+
+DEFAULT_STRATEGY = 'copy'
+
+# The strategies to try, in order, for each configured strategy.
+FALLBACKS = {
+    'copy': ('copy',),
+    'reflink': ('reflink', 'copy'),
+    'hardlink': ('hardlink', 'reflink', 'copy'),
+    'symlink': ('symlink', 'copy'),
+}
+
+STRATEGIES = tuple(sorted(FALLBACKS))
+
+
+def parse_staging(element):
+    """
+    Convert a staging element from a KitList into a (strategy, root) tuple.
+
+    The element may be the name of a strategy or a dict with ``strategy``
+    and ``root`` keys, either of which may be omitted.
+
+    Raises
+    ------
+    KeyError
+        If the strategy isn't known
+    """
+
+    if element is None:
+        return DEFAULT_STRATEGY, None
+    if isinstance(element, string_types):
+        element = {'strategy': element}
+    strategy = element.get('strategy') or DEFAULT_STRATEGY
+    if strategy not in FALLBACKS:
+        raise(KeyError(
+            'Unknown staging strategy {}'.format(strategy)
+        ))
+    return strategy, element.get('root')
+
+
+def stage_inputs(input_files, strategy=DEFAULT_STRATEGY, root=None):
+    """
+    Make a temporary directory and place each of *input_files* in it.
+
+    Hard links and symbolic links avoid copying large inputs but the program
+    under test must not modify them, otherwise the originals change too.  If
+    a strategy can't be used for a file, for example hard linking across
+    filesystems, the next strategy in :data:`FALLBACKS` is tried.
+
+    Parameters
+    ----------
+    input_files : iterable of str
+        The files to stage
+    strategy : str
+        One of :data:`STRATEGIES`
+    root : str or None
+        The directory to make the temporary directory in, such as
+        ``/dev/shm``.  The system default is used if None or if *root* isn't
+        usable.
+
+    Returns
+    -------
+    temp_dir : str
+        The new directory
+    """
+
+    temp_dir = _make_temp_dir(root)
+    try:
+        for f in input_files:
+            dest = os.path.join(temp_dir, os.path.basename(f))
+            _stage_file(f, dest, FALLBACKS[strategy])
+    except Exception:
+        shutil.rmtree(temp_dir)
+        raise
+    return temp_dir
+
+
+def _make_temp_dir(root):
+    """
+    Make a temporary directory in *root* falling back to the default location
+    """
+
+    if root is not None:
+        try:
+            return tempfile.mkdtemp(dir=root)
+        except OSError as e:
+            logging.getLogger(__name__).warning(
+                "Can't stage inputs in {0}: {1}".format(root, e)
+            )
+    return tempfile.mkdtemp()
+
+
+def _stage_file(source, dest, strategies):
+    """
+    Place *source* at *dest* using the first of *strategies* that works
+    """
+
+    for strategy in strategies[:-1]:
+        try:
+            _STAGERS[strategy](source, dest)
+            return
+        except (OSError, IOError) as e:
+            if os.path.lexists(dest):
+                os.remove(dest)
+            logging.getLogger(__name__).debug(
+                "Staging {0} by {1} failed: {2}".format(source, strategy, e)
+            )
+    _STAGERS[strategies[-1]](source, dest)
+
+
+def _copy(source, dest):
+    shutil.copy(source, dest)
+
+
+def _hardlink(source, dest):
+    os.link(source, dest)
+
+
+def _symlink(source, dest):
+    os.symlink(os.path.abspath(source), dest)
+
+
+def _reflink(source, dest):
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'reflinks are not supported')
+    with open(source, 'rb') as src:
+        with open(dest, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copymode(source, dest)
+
+
+_STAGERS = {
+    'copy': _copy,
+    'hardlink': _hardlink,
+    'reflink': _reflink,
+    'symlink': _symlink,
+}
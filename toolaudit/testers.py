@@ -2,52 +2,83 @@
 Methods to validate the output of various things
 """
 
-import hashlib
+import fnmatch
+import functools
+import math
+import os
 import os.path
+import stat
+from timeit import default_timer
+from six import string_types
+from . import hashing
+from . import process
 from . import readers
+from . import staging
+from . import timing
 import shlex
 import shutil
 import subprocess
-import tempfile
+
+
+# Two sided 95% critical values of Student's t distribution for 1 to 30
+# degrees of freedom, the normal value is used for more.
+_T_95 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042
+)
 
 
 def test(func):
     """
     Decorator which handles test setup
 
-    Makes a temporary directory, copies all files specified by the inputs
-    argument to that directory, sets the temporary directory as working
-    directory, passes control to the test, deletes the temporary directory.
+    Makes a temporary directory, stages all files specified by the inputs
+    argument in that directory, passes control to the test with the temporary
+    directory as *work_dir*, deletes the temporary directory.
+
+    The process working directory is never changed so that tests can be run
+    from several threads at once.  How the inputs are staged is set by the
+    optional *staging* argument, see
+    :func:`toolaudit.staging.parse_staging`.  Relative input paths are
+    relative to the optional *base_dir* argument, or the working directory,
+    but are passed to the test unchanged.
     """
+    @functools.wraps(func)
     def prepare_and_cleanup(*args, **kwargs):
-        orig_dir, temp_dir = _prepare(kwargs['inputs'])
-        ret = func(*args, **kwargs)
-        _cleanup(orig_dir, temp_dir)
-        return ret
+        strategy, root = staging.parse_staging(kwargs.pop('staging', None))
+        base_dir = kwargs.pop('base_dir', None)
+        with timing.phase('staging'):
+            temp_dir = _prepare(kwargs['inputs'], strategy, root, base_dir)
+        try:
+            return func(*args, work_dir=temp_dir, **kwargs)
+        finally:
+            with timing.phase('staging'):
+                _cleanup(temp_dir)
     return prepare_and_cleanup
 
 
-def _prepare(input_files):
-    temp_dir = tempfile.mkdtemp()
-    cwd = os.getcwd()
-
-    for f in input_files.values():
-        shutil.copy(f, temp_dir)
+def _prepare(input_files, strategy=staging.DEFAULT_STRATEGY, root=None,
+             base_dir=None):
+    paths = list(input_files.values())
+    if base_dir is not None:
+        paths = [os.path.join(base_dir, p) for p in paths]
+    return staging.stage_inputs(paths, strategy, root)
 
-    os.chdir(temp_dir)
-    return cwd, temp_dir
 
-
-def _cleanup(original_directory, temp_dir):
-    os.chdir(original_directory)
+def _cleanup(temp_dir):
     shutil.rmtree(temp_dir)
 
 
 @test
-def stdout(executable_path, command, inputs):
+def stdout(executable_path, command, inputs, work_dir=None,
+           hash_algorithm=hashing.DEFAULT_ALGORITHM, report_size=False,
+           report=None):
     """
     Execute a program with some inputs and hash what it prints to stdout.
 
+    The output is hashed as it is read so it is never held in memory.
+
     Parameters
     ----------
     command : str
@@ -57,24 +88,182 @@ def stdout(executable_path, command, inputs):
         The full path to the executable being tested
     inputs : list of str
         A list of input files used by the program under test
+    work_dir : str or None
+        The directory to run the program in
+    hash_algorithm : str
+        The algorithm used to hash the output
+    report_size : bool
+        Record the number of bytes output as ``output_bytes`` in *report*
+    report : dict or None
+        Additional results of the test are stored in this dict
 
     Returns
     -------
     hexdigest : str
-        The SHA-1 hash of the program's output
+        The hash of the program's output
     """
 
     cmd = command.format(exe=executable_path, **inputs)
-    response = subprocess.Popen(
+    hexdigest, size = _hash_stdout(cmd, work_dir, hash_algorithm)
+    if report_size and report is not None:
+        report['output_bytes'] = size
+    return hexdigest
+
+
+def _hash_stdout(cmd, work_dir, hash_algorithm):
+    """
+    Run the command line *cmd* and hash what it prints
+
+    Returns
+    -------
+    hexdigest : str
+    size : int
+        The number of bytes printed
+    """
+
+    proc = process.spawn(
         shlex.split(cmd),
         stdout=subprocess.PIPE,
         stderr=subprocess.STDOUT,
-    ).communicate()
-    return sha1_string(response[0])
+        cwd=work_dir,
+    )
+    with process.supervise(proc):
+        try:
+            return hashing.hash_stream(proc.stdout, hash_algorithm)
+        finally:
+            proc.stdout.close()
+            process.wait(proc)
+
+
+@test
+def benchmark(executable_path, command, inputs, runs=5, warmup=1,
+              work_dir=None, hash_algorithm=hashing.DEFAULT_ALGORITHM,
+              report=None):
+    """
+    Time a program over several runs and hash what it prints to stdout.
+
+    The program is run *warmup* times, to fill caches, then *runs* times
+    while its wall clock time is measured.  Every run must print the same
+    output.
+
+    Parameters
+    ----------
+    command : str
+        A string which will be formatted with the given executable path and
+        inputs
+    executable_path : str
+        The full path to the executable being tested
+    inputs : list of str
+        A list of input files used by the program under test
+    runs : int
+        The number of timed runs
+    warmup : int
+        The number of untimed runs first
+    work_dir : str or None
+        The directory to run the program in
+    hash_algorithm : str
+        The algorithm used to hash the output
+    report : dict or None
+        The timings are stored under ``benchmark`` in this dict, see
+        :func:`summarise_times`
+
+    Returns
+    -------
+    hexdigest : str
+        The hash of the program's output
+
+    Raises
+    ------
+    InputError
+        If the output of a run differs from the first
+    """
+
+    if runs < 1 or warmup < 0:
+        raise ValueError("A benchmark needs at least one run")
+    cmd = command.format(exe=executable_path, **inputs)
+    expected = None
+    times = []
+    for i in range(warmup + runs):
+        started = default_timer()
+        hexdigest, _ = _hash_stdout(cmd, work_dir, hash_algorithm)
+        elapsed = default_timer() - started
+        if expected is None:
+            expected = hexdigest
+        elif hexdigest != expected:
+            raise readers.InputError(
+                "Output of run {0} of '{1}' differs from the first".format(
+                    i + 1, cmd
+                )
+            )
+        if i >= warmup:
+            times.append(elapsed)
+    if report is not None:
+        summary = summarise_times(times)
+        summary['warmup'] = warmup
+        report['benchmark'] = summary
+    return expected
+
+
+def summarise_times(times):
+    """
+    Describe the times taken by the runs of a benchmark
+
+    Parameters
+    ----------
+    times : list of float
+        Wall clock seconds taken by each run
+
+    Returns
+    -------
+    summary : dict
+        With keys ``runs``, ``min``, ``median``, ``p90``, ``mean`` and
+        ``times``, and ``ci_low`` and ``ci_high``, the 95% confidence
+        interval of the mean, which are None with fewer than two runs
+    """
+
+    ordered = sorted(times)
+    n = len(ordered)
+    mean = sum(ordered) / n
+    if n > 1:
+        stdev = math.sqrt(
+            sum((t - mean) ** 2 for t in ordered) / (n - 1)
+        )
+        t_value = _T_95[n - 2] if n - 1 <= len(_T_95) else 1.96
+        half_width = t_value * stdev / math.sqrt(n)
+        ci_low, ci_high = mean - half_width, mean + half_width
+    else:
+        ci_low = ci_high = None
+
+    def rounded(value):
+        return None if value is None else round(value, 6)
+    return {
+        'runs': n,
+        'min': rounded(ordered[0]),
+        'median': rounded(_percentile(ordered, 0.5)),
+        'p90': rounded(_percentile(ordered, 0.9)),
+        'mean': rounded(mean),
+        'ci_low': rounded(ci_low),
+        'ci_high': rounded(ci_high),
+        'times': [rounded(t) for t in times]
+    }
+
+
+def _percentile(ordered, fraction):
+    """
+    Interpolate the *fraction* percentile of the sorted values *ordered*
+    """
+
+    position = (len(ordered) - 1) * fraction
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(ordered) - 1)
+    weight = position - lower
+    return ordered[lower] * (1 - weight) + ordered[upper] * weight
 
 
 @test
-def fileout(executable_path, command, inputs, output_path, allow_non_zero=False):
+def fileout(executable_path, command, inputs, output_path,
+            allow_non_zero=False, work_dir=None,
+            hash_algorithm=hashing.DEFAULT_ALGORITHM, report=None):
     """
     Execute a program with some inputs and hash the file created at
     output_path.
@@ -89,29 +278,220 @@ def fileout(executable_path, command, inputs, output_path, allow_non_zero=False)
     inputs : list of str
         A list of input files used by the program under test
     output_path : str
-        The full path of the output file to be hashed
+        The path of the output file to be hashed, relative to *work_dir*
+    allow_non_zero : bool
+        Don't raise an error if the program returns a non-zero exit code
+    work_dir : str or None
+        The directory to run the program in
+    hash_algorithm : str
+        The algorithm used to hash the output file
+    report : dict or None
+        Additional results of the test are stored in this dict
 
     Returns
     -------
     hexdigest : str
-        The SHA-1 hash of the program's output
+        The hash of the program's output
+    """
+
+    _run_quietly(executable_path, command, inputs, allow_non_zero, work_dir)
+    if work_dir:
+        output_path = os.path.join(work_dir, output_path)
+    if not os.path.exists(output_path):
+        err_msg = "Output file from '{0}' not found ({1})".format(
+            executable_path, output_path
+        )
+        raise(readers.InputError(err_msg))
+    return readers.file_checksum(output_path, hash_algorithm)
+
+
+@test
+def treeout(executable_path, command, inputs, output_path, include='*',
+            exclude=(), allow_non_zero=False, work_dir=None,
+            hash_algorithm=hashing.DEFAULT_ALGORITHM,
+            jobs=hashing.DEFAULT_HASH_JOBS, report=None):
+    """
+    Execute a program with some inputs and hash the directory tree created
+    at output_path.
+
+    The tree is hashed as a Merkle tree so the result only depends on the
+    names, types, permissions and contents of the files, not the order they
+    were written in.  Each regular file is described by ``file``, its
+    permission bits in octal and the checksum of its contents, and each
+    symbolic link by ``link`` and the checksum of its target.  Each
+    directory is hashed from the sorted names and descriptions of its
+    entries, subdirectories being described by ``dir``, their permission
+    bits and their own hash.  Directories without any files are left out.
+
+    Parameters
+    ----------
+    command : str
+        A string which will be formatted with the given executable path and
+        inputs
+    executable_path : str
+        The full path to the executable being tested
+    inputs : list of str
+        A list of input files used by the program under test
+    output_path : str
+        The directory to be hashed, relative to *work_dir*
+    include : str or list of str
+        Glob patterns for the files to hash, matched against their paths
+        relative to *output_path*
+    exclude : str or list of str
+        Glob patterns for the files and directories to leave out
+    allow_non_zero : bool
+        Don't raise an error if the program returns a non-zero exit code
+    work_dir : str or None
+        The directory to run the program in
+    hash_algorithm : str
+        The algorithm used to hash the files and the tree
+    jobs : int
+        The number of files hashed at once
+    report : dict or None
+        The description of each file hashed is stored under ``files`` in
+        this dict, keyed on its relative path, so that a changed tree can be
+        traced to the files that changed
+
+    Returns
+    -------
+    hexdigest : str
+        The hash of the tree
+    """
+
+    _run_quietly(executable_path, command, inputs, allow_non_zero, work_dir)
+    if work_dir:
+        output_path = os.path.join(work_dir, output_path)
+    if not os.path.isdir(output_path):
+        err_msg = "Output directory from '{0}' not found ({1})".format(
+            executable_path, output_path
+        )
+        raise(readers.InputError(err_msg))
+    files, dir_modes = _list_tree(
+        output_path, _patterns(include), _patterns(exclude)
+    )
+
+    def describe(entry):
+        rel_path, mode = entry
+        full_path = os.path.join(output_path, rel_path)
+        if stat.S_ISLNK(mode):
+            target = os.readlink(full_path).encode('utf-8', 'replace')
+            return 'link ' + hashing.hash_string(target, hash_algorithm)
+        return 'file {0:04o} {1}'.format(
+            stat.S_IMODE(mode),
+            readers.file_checksum(full_path, hash_algorithm)
+        )
+    if jobs <= 1 or len(files) <= 1:
+        descriptions = [describe(f) for f in files]
+    else:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(jobs, len(files)))
+        try:
+            descriptions = pool.map(describe, files, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    described = dict(
+        (rel_path, d) for (rel_path, _), d in zip(files, descriptions)
+    )
+    if report is not None:
+        report['files'] = described
+    return _merkle_digest(described, hash_algorithm, dir_modes)
+
+
+def _run_quietly(executable_path, command, inputs, allow_non_zero, work_dir):
+    """
+    Run the command of a test, discarding its output
     """
 
     cmd = shlex.split(command.format(exe=executable_path, **inputs))
     with open(os.devnull, 'w') as f:
-        return_code = subprocess.call(
+        proc = process.spawn(
             cmd,
             stdout=f,
-            stderr=f
+            stderr=f,
+            cwd=work_dir
         )
+        with process.supervise(proc):
+            return_code = process.wait(proc)
         if return_code != 0 and not allow_non_zero:
             raise subprocess.CalledProcessError(return_code, cmd)
-    if not os.path.exists(output_path):
-        err_msg = "Output file from '{0}' not found ({1})".format(
-            executable_path, output_path
-        )
-        raise(readers.InputError(err_msg))
-    return readers.sha1_file(output_path)
+
+
+def _patterns(value):
+    if isinstance(value, string_types):
+        return [value]
+    return list(value)
+
+
+def _list_tree(top, include, exclude):
+    """
+    Find the files under *top* to hash
+
+    Returns
+    -------
+    files : list of tuple
+        (path relative to *top* using ``/``, mode) for each regular file or
+        symbolic link, sorted by path
+    dir_modes : dict
+        Maps the relative path of each directory below *top* to its
+        permission bits
+    """
+
+    def matches(rel_path, patterns):
+        return any(fnmatch.fnmatchcase(rel_path, p) for p in patterns)
+    files = []
+    dir_modes = {}
+    for root, dirs, names in os.walk(top):
+        rel_root = os.path.relpath(root, top).replace(os.sep, '/')
+        prefix = '' if rel_root == '.' else rel_root + '/'
+        if prefix:
+            dir_modes[rel_root] = stat.S_IMODE(os.stat(root).st_mode)
+        # Links to directories are recorded as links, not followed
+        links = [d for d in dirs if os.path.islink(os.path.join(root, d))]
+        dirs[:] = [
+            d for d in dirs
+            if d not in links and not matches(prefix + d, exclude)
+        ]
+        for name in names + links:
+            rel_path = prefix + name
+            if not matches(rel_path, include) or matches(rel_path, exclude):
+                continue
+            mode = os.lstat(os.path.join(root, name)).st_mode
+            if stat.S_ISLNK(mode) or stat.S_ISREG(mode):
+                files.append((rel_path, mode))
+    files.sort()
+    return files, dir_modes
+
+
+def _merkle_digest(described, hash_algorithm, dir_modes=None):
+    """
+    Hash a tree from the descriptions of its files, keyed on their
+    relative paths, and the permission bits of its directories in
+    *dir_modes*, keyed in the same way
+    """
+
+    dir_modes = dir_modes or {}
+
+    tree = {}
+    for rel_path, description in described.items():
+        node = tree
+        parts = rel_path.split('/')
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = description
+
+    def digest(node, prefix):
+        h = hashing.new(hash_algorithm)
+        for name in sorted(node):
+            entry = node[name]
+            if isinstance(entry, dict):
+                rel_path = prefix + name
+                entry = 'dir {0:04o} {1}'.format(
+                    dir_modes.get(rel_path, 0), digest(entry, rel_path + '/')
+                )
+            h.update('{0}\0{1}\n'.format(name, entry).encode('utf-8'))
+        return h.hexdigest()
+    return digest(tree, '')
 
 
 def sha1_string(text):
@@ -129,6 +509,4 @@ def sha1_string(text):
         The SHA-1 has of the string
     """
 
-    sha = hashlib.sha1()
-    sha.update(text)
-    return sha.hexdigest()
+    return hashing.hash_string(text, 'sha1')
@@ -0,0 +1,177 @@
+"""
+Measuring where the time auditing each tool goes
+"""
+
+from __future__ import print_function
+import contextlib
+import threading
+import time
+
+
+# The phases of a tool's audit that are timed.  ``hashing`` is checksumming
+# the tool's binary and test inputs, ``staging`` is preparing and removing
+# the test's working directory.
+PHASES = ('reader', 'hashing', 'staging', 'tester')
+
+# The phases that run the tool, their CPU time is that used by the programs
+# run, as reported when each exits, not that of toolaudit's own thread.
+CHILD_PHASES = ('reader', 'tester')
+
+if hasattr(time, 'thread_time'):
+    thread_cpu_time = time.thread_time
+else:  # Python < 3.7
+    thread_cpu_time = getattr(time, 'process_time', time.clock)
+
+_state = threading.local()
+
+
+class Timings(object):
+    """
+    The wall clock and CPU time spent in each phase of a tool's audit.
+
+    Times are exclusive, the time spent in a phase started while another
+    phase is running is only counted once, against the inner phase.  The
+    CPU time of the :data:`CHILD_PHASES` is that used by the programs they
+    ran, the CPU time of the other phases is that used by toolaudit itself
+    in the auditing thread.
+    """
+
+    def __init__(self):
+        self.wall = {}
+        self.cpu = {}
+
+    def add(self, phase, wall, cpu):
+        """
+        Add *wall* and *cpu* seconds to *phase*
+        """
+
+        self.wall[phase] = self.wall.get(phase, 0.0) + wall
+        self.cpu[phase] = self.cpu.get(phase, 0.0) + cpu
+
+    def total_wall(self):
+        """
+        The wall clock time spent in every phase
+        """
+
+        return sum(self.wall.values())
+
+    def as_dict(self):
+        """
+        Convert to a dict
+
+        Returns
+        -------
+        dict : dict
+            Maps each phase that was run to a dict with ``wall`` and ``cpu``
+            keys, in seconds
+        """
+
+        return dict(
+            (p, {'wall': round(self.wall[p], 6), 'cpu': round(self.cpu[p], 6)})
+            for p in self.wall
+        )
+
+
+@contextlib.contextmanager
+def recording(timings):
+    """
+    Add the time spent in each :func:`phase` entered in this thread to
+    *timings*.
+    """
+
+    previous = getattr(_state, 'stack', None)
+    _state.timings = timings
+    _state.stack = []
+    try:
+        yield timings
+    finally:
+        _state.timings = None
+        _state.stack = previous
+
+
+@contextlib.contextmanager
+def phase(name):
+    """
+    Time a phase of the current tool's audit, does nothing unless called
+    inside :func:`recording`.
+    """
+
+    timings = getattr(_state, 'timings', None)
+    if timings is None:
+        yield
+        return
+    # Each stack entry is [inner wall time, inner thread CPU time, CPU time
+    # of the programs run]
+    stack = _state.stack
+    stack.append([0.0, 0.0, 0.0])
+    wall_start = time.time()
+    cpu_start = thread_cpu_time()
+    try:
+        yield
+    finally:
+        wall = time.time() - wall_start
+        cpu = thread_cpu_time() - cpu_start
+        inner_wall, inner_cpu, child_cpu = stack.pop()
+        if name in CHILD_PHASES:
+            timings.add(name, wall - inner_wall, child_cpu)
+        else:
+            timings.add(name, wall - inner_wall, cpu - inner_cpu)
+        if stack:
+            stack[-1][0] += wall
+            stack[-1][1] += cpu
+
+
+def add_child_cpu(seconds):
+    """
+    Add the CPU time used by a program which has exited to the current
+    phase, does nothing unless called inside :func:`phase`.
+    """
+
+    stack = getattr(_state, 'stack', None)
+    if stack:
+        stack[-1][2] += seconds
+
+
+def print_slowest(tool_timings, top, f):
+    """
+    Print a table of the tools that took longest to audit.
+
+    Parameters
+    ----------
+    tool_timings : list of tuple
+        (tool name, :class:`Timings`) pairs
+    top : int
+        The number of tools to print
+    f : file object
+        Where to print the table
+    """
+
+    ordered = sorted(
+        tool_timings, key=lambda nt: nt[1].total_wall(), reverse=True
+    )
+    print("Slowest tools (wall clock seconds):", file=f)
+    header = ['tool', 'total'] + list(PHASES)
+    widths = [max([4] + [len(n) for n, _ in ordered[:top]])] + \
+        [9] * (len(header) - 1)
+    print(_row(header, widths), file=f)
+    for name, timings in ordered[:top]:
+        cells = [name, '{0:.3f}'.format(timings.total_wall())] + [
+            '{0:.3f}'.format(timings.wall.get(p, 0.0)) for p in PHASES
+        ]
+        print(_row(cells, widths), file=f)
+    totals = Timings()
+    for _, timings in tool_timings:
+        for p in timings.wall:
+            totals.add(p, timings.wall[p], timings.cpu[p])
+    print("Total for {0} tools: {1}".format(len(tool_timings), ', '.join(
+        '{0} {1:.3f}s wall {2:.3f}s CPU'.format(
+            p, totals.wall[p], totals.cpu[p]
+        ) for p in PHASES if p in totals.wall
+    )), file=f)
+
+
+def _row(cells, widths):
+    return '  '.join(
+        c.ljust(w) if i == 0 else c.rjust(w)
+        for i, (c, w) in enumerate(zip(cells, widths))
+    )
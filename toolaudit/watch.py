@@ -0,0 +1,300 @@
+"""
+Keeping the audit of a KitList up to date as its tools change
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import os.path
+import select
+import time
+from . import hashing
+from .hashcache import stat_key
+from .session import AuditSession
+
+
+# inotify events which mean a file in a watched directory may have changed
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+            _IN_MOVED_TO | _IN_CREATE | _IN_DELETE)
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+class KitListWatcher(object):
+    """
+    Audits a KitList, then re-audits it whenever a tool's binary, a test
+    input or the KitList itself changes and rewrites the output.
+
+    The checked KitList is kept between audits and used as the previous
+    audit of an :class:`~toolaudit.session.AuditSession`, so only the tools
+    which have changed have their readers and testers run again.
+
+    Parameters
+    ----------
+    kitlist_path : str
+        The KitList to audit
+    output_path : str
+        Where to write the checked KitList, it is replaced atomically after
+        each audit
+    skip_tests : bool
+        Only read versions and checksums, don't run the testers
+    jobs : int
+        The number of tools to audit concurrently
+    hash_algorithm : str
+        The algorithm used for tools that don't specify one
+    hash_cache : :class:`~toolaudit.hashcache.HashCache` or None
+        A cache of file checksums, saved after each audit
+    result_cache : :class:`~toolaudit.resultcache.ResultCache` or None
+        A cache of test results, saved after each audit
+    timeout : float or None
+        How many seconds a tool's reader or tester may run for, unless the
+        tool sets its own timeout
+    interval : float
+        How often, in seconds, files are checked for changes when inotify
+        isn't available
+    hash_dependencies : bool
+        Record a checksum of the shared libraries loaded by each tool, the
+        libraries are watched too
+
+    Attributes
+    ----------
+    checked : :class:`~toolaudit.kitlist.KitList` or None
+        The result of the last successful audit
+    audits : int
+        The number of successful audits
+    tools_audited : int
+        The number of tools audited again by the last successful audit
+    """
+
+    # With inotify files are still checked this often in case an event was
+    # missed, for example because a new directory needed watching.
+    RESCAN_INTERVAL = 60.0
+
+    def __init__(self, kitlist_path, output_path, skip_tests=False, jobs=1,
+                 hash_algorithm=hashing.DEFAULT_ALGORITHM, hash_cache=None,
+                 result_cache=None, timeout=None, interval=2.0,
+                 hash_dependencies=False):
+        self.kitlist_path = os.path.abspath(kitlist_path)
+        self.output_path = os.path.abspath(output_path)
+        self.skip_tests = skip_tests
+        self.jobs = jobs
+        self.hash_algorithm = hash_algorithm
+        self.hash_cache = hash_cache
+        self.result_cache = result_cache
+        self.timeout = timeout
+        self.interval = interval
+        self.hash_dependencies = hash_dependencies
+        self.checked = None
+        self.audits = 0
+        self.tools_audited = 0
+        self._snapshot = {}
+        self._notifier = None
+        self._use_inotify = True
+
+    def audit(self):
+        """
+        Audit the KitList, re-auditing only the tools which have changed
+        since the last audit, and write the output.
+
+        Returns
+        -------
+        audited : bool
+            False if the KitList couldn't be read or a tool couldn't be
+            audited, in which case the output isn't changed
+        """
+
+        from .application import ToolauditApp
+        log = logging.getLogger(__name__)
+        # Changes made while the audit runs are found by the next call to
+        # changed_paths because file metadata is recorded before each tool
+        # is audited.
+        snapshot = dict(self._snapshot)
+        snapshot.update(self._stat_all([self.kitlist_path]))
+        self._snapshot = snapshot
+        session = AuditSession(
+            hash_cache=self.hash_cache,
+            result_cache=self.result_cache,
+            previous=self.checked,
+            timeout=self.timeout,
+            hash_dependencies=self.hash_dependencies
+        )
+        try:
+            checked = ToolauditApp.check(
+                self.kitlist_path, self.skip_tests, jobs=self.jobs,
+                hash_algorithm=self.hash_algorithm, session=session
+            )
+        except Exception as e:  # pylint: disable=W0703
+            log.error("Can't audit {0}: {1}".format(self.kitlist_path, e))
+            return False
+        self.checked = checked
+        snapshot = {}
+        snapshot[self.kitlist_path] = self._snapshot[self.kitlist_path]
+        for tool in checked.tools:
+            for p, stats in (tool.file_stats or {}).items():
+                snapshot[os.path.abspath(p)] = stats
+        self._snapshot = snapshot
+        self._write(checked)
+        if self.hash_cache:
+            self.hash_cache.save()
+        if self.result_cache:
+            self.result_cache.save()
+        self.audits += 1
+        self.tools_audited = len(checked.tools) - session.tools_unchanged
+        log.info("Audited {0} of {1} tools".format(
+            self.tools_audited, len(checked.tools)
+        ))
+        return True
+
+    def changed_paths(self):
+        """
+        Find the watched files which have changed since the last audit
+
+        Returns
+        -------
+        paths : list of str
+        """
+
+        current = self._stat_all(self._snapshot)
+        return sorted(p for p in current if current[p] != self._snapshot[p])
+
+    def wait(self):
+        """
+        Block until a watched file may have changed
+        """
+
+        directories = set(os.path.dirname(p) for p in self._snapshot)
+        if self._notifier is not None and \
+                self._notifier.directories != directories:
+            self._close_notifier()
+        if self._notifier is None and self._use_inotify:
+            self._notifier = _InotifyNotifier.create(directories)
+            self._use_inotify = self._notifier is not None
+        if self._notifier is None:
+            time.sleep(self.interval)
+        else:
+            self._notifier.wait(self.RESCAN_INTERVAL)
+
+    def run(self):
+        """
+        Audit the KitList then keep re-auditing it as it changes, until
+        interrupted.
+        """
+
+        log = logging.getLogger(__name__)
+        self.audit()
+        try:
+            while True:
+                self.wait()
+                changed = self.changed_paths()
+                if not changed:
+                    continue
+                for p in changed:
+                    log.info("Changed: {0}".format(p))
+                self.audit()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._close_notifier()
+
+    def _close_notifier(self):
+        if self._notifier is not None:
+            self._notifier.close()
+            self._notifier = None
+
+    @classmethod
+    def _stat_all(cls, paths):
+        """
+        Get the :func:`~toolaudit.hashcache.stat_key` of each of *paths*,
+        None for those that don't exist
+        """
+
+        stats = {}
+        for p in paths:
+            try:
+                stats[p] = stat_key(p)
+            except OSError:
+                stats[p] = None
+        return stats
+
+    def _write(self, kitlist):
+        """
+        Replace the output with *kitlist* atomically
+        """
+
+        temp_path = '{0}.{1}.tmp'.format(self.output_path, os.getpid())
+        try:
+            kitlist.save(temp_path)
+            os.rename(temp_path, self.output_path)
+        except Exception:
+            os.remove(temp_path)
+            raise
+
+
+class _InotifyNotifier(object):
+    """
+    Waits for changes to files in a set of directories using Linux's inotify
+    """
+
+    def __init__(self, fd, directories):
+        self.fd = fd
+        self.directories = directories
+
+    @classmethod
+    def create(cls, directories):
+        """
+        Watch *directories*, returning None if inotify isn't available
+        """
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            init = libc.inotify_init1
+            add_watch = libc.inotify_add_watch
+        except (OSError, AttributeError, TypeError):
+            return None
+        fd = init(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            return None
+        notifier = cls(fd, set(directories))
+        for d in directories:
+            if add_watch(fd, d.encode('utf-8'), _IN_MASK) < 0:
+                logging.getLogger(__name__).warning(
+                    "Can't watch {0}: {1}".format(
+                        d, os.strerror(ctypes.get_errno())
+                    )
+                )
+        return notifier
+
+    def wait(self, timeout):
+        """
+        Block until an event arrives or *timeout* seconds have passed.
+
+        Events usually come in bursts while a file is replaced so after the
+        first one events are drained until there's a short pause.
+        """
+
+        readable = select.select([self.fd], [], [], timeout)[0]
+        while readable:
+            self._drain()
+            readable = select.select([self.fd], [], [], 0.2)[0]
+
+    def _drain(self):
+        while True:
+            try:
+                if not os.read(self.fd, 65536):
+                    return
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+
+    def close(self):
+        os.close(self.fd)